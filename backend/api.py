@@ -1,16 +1,36 @@
+import asyncio
+import os
 import uvicorn
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+import metrics
 from rag_service import AsyncRAG
 from database import init_db
-from schemas import ChatRequest
+from schemas import ChatRequest, SearchRequest
 
 
 rag_service: AsyncRAG | None = None
 
+
+async def startup() -> None:
+    """
+    Создаёт таблицы и инициализирует RAG.
+    Выполняется в фоне, чтобы /health отвечал уже во время загрузки моделей.
+    """
+
+    try:
+        await init_db()
+    except Exception as e:
+        print(f"Error creating database tables: {e}")
+
+    try:
+        await rag_service.initialize()
+    except Exception as e:
+        print(f"RAG initialization error: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -22,17 +42,14 @@ async def lifespan(app: FastAPI):
     global rag_service
     print("Starting API...")
 
-    try:
-        await init_db()
-    except Exception as e:
-        print(f"Error creating database tables: {e}")
-
     rag_service = AsyncRAG()
-    await rag_service.initialize()
+    startup_task = asyncio.create_task(startup())
 
     yield
 
     print("Stopping API...")
+    if not startup_task.done():
+        startup_task.cancel()
     if rag_service:
         await rag_service.close()
 
@@ -44,38 +61,101 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+app.add_middleware(metrics.ServerTimingMiddleware)
+
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     """
     Основной эндпоинт для чата с поиском документов.
 
-    Принимает JSON с запросом и историей чата (TODO).
+    Принимает JSON с запросом, историей чата и ID диалога.
     Возвращает поток NDJSON.
+    Клиент для лимитов определяется по заголовку X-Client-Id или по IP.
     """
 
-    if not rag_service:
-        return {"error": "Service not initialized"}
-    
-    stream_gen = rag_service.chat_stream(request.query)
+    if not rag_service or not rag_service.ready:
+        return JSONResponse({"error": "Service not initialized"}, status_code=503)
+
+    client_id = http_request.headers.get("X-Client-Id")
+    if not client_id and http_request.client:
+        client_id = http_request.client.host
+
+    stream_gen = rag_service.chat_stream(request.query,
+                                         client_id=client_id,
+                                         stream_options=request.stream_options,
+                                         session_id=request.session_id,
+                                         history=[m.model_dump() for m in request.history])
 
     return StreamingResponse(
         stream_gen,
         media_type="application/x-ndjson"
     )
 
+@app.post("/api/search")
+async def search_endpoint(request: SearchRequest):
+    """
+    Пакетный поиск документов без генерации ответа.
+
+    Принимает список запросов, возвращает поток NDJSON:
+    по событию 'result' на каждый запрос в порядке их следования.
+    """
+
+    if not rag_service or not rag_service.ready:
+        return JSONResponse({"error": "Service not initialized"}, status_code=503)
+
+    stream_gen = rag_service.search_stream(request.queries,
+                                           limit=request.limit,
+                                           with_texts=request.with_texts)
+
+    return StreamingResponse(
+        stream_gen,
+        media_type="application/x-ndjson"
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Метрики в текстовом формате Prometheus.
+    """
+
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """
-    Проверка активности сервиса.
+    Проверка активности сервиса (liveness).
+    Отвечает, даже если модели ещё загружаются.
     """
 
     return {
         "status": "active",
-        "rag_ready": rag_service is not None
+        "rag_ready": bool(rag_service and rag_service.ready)
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Готовность сервиса (readiness).
+    Возвращает состояние и время инициализации каждого компонента,
+    пока сервис не готов, отвечает 503.
+    """
+
+    if not rag_service:
+        return JSONResponse({"ready": False, "components": {}}, status_code=503)
+
+    readiness = rag_service.readiness()
+
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
 
 if __name__ == "__main__":
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=False)
+    # Несколько воркеров имеет смысл только вместе с EMBEDDING_SERVICE_ADDRESS,
+    # иначе каждый воркер загрузит свою копию BGE-M3.
+    # Лимиты очереди генерации (LLM_MAX_CONCURRENT и т.д.) действуют на каждый воркер отдельно,
+    # а сессии диалогов (SessionStore) у каждого воркера свои: при нескольких воркерах
+    # уточняющий вопрос может попасть в другой воркер и начать диалог заново.
+    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=False,
+                workers=int(os.getenv("API_WORKERS", 1)))
@@ -0,0 +1,234 @@
+"""
+Нагрузочный тест стриминга /api/chat.
+
+Открывает потоковые запросы к API с заданной интенсивностью
+(пуассоновский поток, --rate) или фиксированным числом одновременных
+клиентов (--rate 0), разбирает NDJSON и меряет для каждого запроса:
+время до источников, до первого токена (TTFT), между токенами
+и полное время ответа.
+
+Без --url сам поднимает benchmarks.chat_stack (API с заменителями
+и фейковым Ollama) в отдельном процессе.
+
+Запуск из каталога backend:
+    python -m benchmarks.chat_load --requests 100 --rate 5 --concurrency 32
+    python -m benchmarks.chat_load --url http://localhost:8000 --requests 20 --rate 0 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import print_stages, save_results, summarize
+from benchmarks.corpus import FASCorpusGenerator
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def run_request(client: httpx.AsyncClient, url: str, query: str,
+                      client_id: str, coalesce_ms: Optional[float]) -> Dict[str, Any]:
+    body: Dict[str, Any] = {"query": query}
+    if coalesce_ms is not None:
+        body["stream_options"] = {"coalesce_ms": coalesce_ms}
+
+    result: Dict[str, Any] = {"status": None, "error": None, "sources": None,
+                              "first_token": None, "token_gaps": [], "tokens": 0,
+                              "queued": 0, "total": None, "stats": None}
+    start_time = time.perf_counter()
+    last_token = None
+
+    try:
+        async with client.stream("POST", f"{url}/api/chat", json=body,
+                                 headers={"X-Client-Id": client_id}) as response:
+            result["status"] = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                result["error"] = f"HTTP {response.status_code}"
+                return result
+
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                now = time.perf_counter()
+                event = json.loads(line)
+
+                if event["type"] == "sources":
+                    result["sources"] = now - start_time
+                elif event["type"] == "token":
+                    if last_token is None:
+                        result["first_token"] = now - start_time
+                    else:
+                        result["token_gaps"].append(now - last_token)
+                    last_token = now
+                    result["tokens"] += 1
+                elif event["type"] == "queued":
+                    result["queued"] += 1
+                elif event["type"] == "error":
+                    result["error"] = event["data"]
+                elif event["type"] == "stats":
+                    result["stats"] = event["data"]
+
+    except httpx.HTTPError as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    finally:
+        result["total"] = time.perf_counter() - start_time
+
+    return result
+
+
+async def run_load(args: argparse.Namespace, url: str) -> Dict[str, Any]:
+    queries = FASCorpusGenerator(seed=args.seed).make_queries(args.requests)
+    rng = random.Random(args.seed)
+    slots = asyncio.Semaphore(args.concurrency)
+    results: List[Dict[str, Any]] = []
+    delayed = 0
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+
+        async def one(i: int) -> None:
+            async with slots:
+                results.append(await run_request(client, url, queries[i],
+                                                 f"load-{i}", args.coalesce_ms))
+
+        start_time = time.perf_counter()
+        tasks = []
+
+        for i in range(args.requests):
+            if args.rate > 0:
+                # Открытая модель: запросы приходят независимо от того,
+                # успевает ли сервер отвечать.
+                if i:
+                    await asyncio.sleep(rng.expovariate(args.rate))
+                if slots.locked():
+                    delayed += 1
+            tasks.append(asyncio.create_task(one(i)))
+
+        await asyncio.gather(*tasks)
+        wall_time = time.perf_counter() - start_time
+
+    ok = [r for r in results if r["error"] is None]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r["error"] is not None:
+            key = r["error"] if r["status"] != 200 else "stream error"
+            errors[key] = errors.get(key, 0) + 1
+
+    stages = {
+        "sources": summarize([r["sources"] for r in ok if r["sources"] is not None]),
+        "ttft": summarize([r["first_token"] for r in ok if r["first_token"] is not None]),
+        "inter_token": summarize([gap for r in ok for gap in r["token_gaps"]]),
+        "total": summarize([r["total"] for r in ok]),
+    }
+
+    prefill = [r["stats"]["prompt_eval_ms"] / 1000 for r in ok
+               if r["stats"] and r["stats"].get("prompt_eval_ms") is not None]
+    if prefill:
+        stages["prefill"] = summarize(prefill)
+
+    return {
+        "requests": args.requests,
+        "succeeded": len(ok),
+        "errors": errors,
+        "delayed_by_concurrency_limit": delayed,
+        "queued_responses": sum(1 for r in results if r["queued"]),
+        "wall_seconds": round(wall_time, 3),
+        "achieved_rps": round(len(results) / wall_time, 3),
+        "token_events_per_sec": round(sum(r["tokens"] for r in ok) / wall_time, 1),
+        "stages": stages,
+    }
+
+
+async def wait_ready(url: str, process: Optional[subprocess.Popen], timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError("Chat stack exited before becoming ready")
+            try:
+                if (await client.get(f"{url}/ready")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+
+    raise TimeoutError(f"{url} is not ready after {timeout} s")
+
+
+def start_stack(args: argparse.Namespace) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.chat_stack",
+               "--port", str(args.stack_port),
+               "--ollama-backends", str(args.ollama_backends),
+               "--ollama-parallel", str(args.ollama_parallel),
+               "--tokens-per-second", str(args.tokens_per_second),
+               "--prefill-ms", str(args.prefill_ms),
+               "--reply-words", str(args.reply_words),
+               "--docs", str(args.docs)]
+
+    return subprocess.Popen(command, cwd=BACKEND_DIR)
+
+
+async def main(args: argparse.Namespace) -> None:
+    process = None
+    url = args.url
+
+    if url is None:
+        url = f"http://127.0.0.1:{args.stack_port}"
+        process = start_stack(args)
+
+    try:
+        await wait_ready(url, process, args.ready_timeout)
+        results = await run_load(args, url)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(f"{results['succeeded']}/{results['requests']} ok in {results['wall_seconds']} s, "
+          f"{results['achieved_rps']} req/s, {results['token_events_per_sec']} token events/s")
+    if results["errors"]:
+        print(f"Errors: {results['errors']}")
+    print_stages(results["stages"])
+
+    output = save_results("chat_load", vars(args), results, args.output)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Streaming /api/chat load test")
+    arg_parser.add_argument("--url", default=None,
+                            help="Адрес API; без него поднимается benchmarks.chat_stack")
+    arg_parser.add_argument("--requests", type=int, default=50)
+    arg_parser.add_argument("--rate", type=float, default=2.0,
+                            help="Запросов в секунду; 0 - закрытая модель с --concurrency клиентами")
+    arg_parser.add_argument("--concurrency", type=int, default=16,
+                            help="Максимум одновременно открытых стримов")
+    arg_parser.add_argument("--coalesce-ms", type=float, default=None,
+                            help="stream_options.coalesce_ms; 0 - токены без склейки")
+    arg_parser.add_argument("--timeout", type=float, default=300.0)
+    arg_parser.add_argument("--ready-timeout", type=float, default=120.0)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+
+    stack = arg_parser.add_argument_group("local stack (без --url)")
+    stack.add_argument("--stack-port", type=int, default=8001)
+    stack.add_argument("--docs", type=int, default=300)
+    stack.add_argument("--ollama-backends", type=int, default=1)
+    stack.add_argument("--ollama-parallel", type=int, default=1)
+    stack.add_argument("--tokens-per-second", type=float, default=40.0)
+    stack.add_argument("--prefill-ms", type=float, default=200.0)
+    stack.add_argument("--reply-words", type=int, default=150)
+
+    asyncio.run(main(arg_parser.parse_args()))
@@ -0,0 +1,103 @@
+"""
+Общие функции бенчмарков: перцентили, сводки и сохранение результатов.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Перцентиль с линейной интерполяцией, q от 0 до 100.
+    """
+
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(seconds: Sequence[float]) -> Dict[str, float]:
+    """
+    Сводка по задержкам в миллисекундах.
+    """
+
+    values = [value * 1000 for value in seconds]
+
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(max(values), 3) if values else 0.0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(name: str, args: Dict[str, Any], results: Dict[str, Any],
+                 output: Optional[str] = None) -> str:
+    """
+    Сохраняет результаты в JSON вместе с коммитом и параметрами запуска,
+    чтобы прогоны на разных коммитах можно было сравнить.
+    """
+
+    revision = git_revision()
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{revision or 'unknown'}-{timestamp}.json")
+
+    payload = {
+        "benchmark": name,
+        "git_commit": revision,
+        "timestamp": timestamp,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "args": args,
+        "results": results,
+    }
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+    return output
+
+
+def print_stages(stages: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'stage':<14}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  ms")
+    for stage, stats in stages.items():
+        print(f"{stage:<14}{stats['count']:>8}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+def print_rows(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+
+    columns = list(rows[0].keys())
+    widths = [max(len(str(column)), *(len(str(row[column])) for row in rows)) for column in columns]
+    print("  ".join(str(column).ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
@@ -0,0 +1,172 @@
+"""
+Генератор синтетических решений ФАС для бенчмарков.
+
+Тексты не имеют юридического смысла, но похожи на настоящие
+по словарю, длине предложений и структуре документа.
+"""
+
+import math
+import random
+from typing import Dict, Iterator, List
+
+ORGANIZATIONS = [
+    "ООО «Ромашка»", "АО «Стройинвест»", "ПАО «Энергосбыт»", "ООО «ТоргСервис»",
+    "МУП «Водоканал»", "ГБУ «Дирекция заказчика»", "ООО «МедТехника»",
+    "АО «Региональная сетевая компания»", "ИП Иванов И.И.", "ООО «Альфа-Логистик»",
+]
+
+AUTHORITIES = [
+    "Управление Федеральной антимонопольной службы по г. Москве",
+    "Московское областное УФАС России",
+    "Санкт-Петербургское УФАС России",
+    "ФАС России",
+]
+
+LAWS = [
+    "Федерального закона от 26.07.2006 № 135-ФЗ «О защите конкуренции»",
+    "Федерального закона от 05.04.2013 № 44-ФЗ «О контрактной системе»",
+    "Федерального закона от 18.07.2011 № 223-ФЗ «О закупках товаров, работ, услуг»",
+    "Федерального закона от 13.03.2006 № 38-ФЗ «О рекламе»",
+    "КоАП РФ",
+]
+
+SUBJECTS = [
+    "установление дискриминационных условий в договоре поставки",
+    "необоснованное ограничение количества участников закупки",
+    "злоупотребление доминирующим положением на товарном рынке",
+    "недобросовестная конкуренция путём введения в заблуждение",
+    "ненадлежащая реклама финансовых услуг",
+    "антиконкурентное соглашение при проведении торгов",
+    "навязывание контрагенту невыгодных условий договора",
+    "нарушение порядка определения победителя аукциона",
+]
+
+SENTENCE_TEMPLATES = [
+    "Комиссия {authority} рассмотрела жалобу {org} на действия {org2} при проведении закупки № {number}.",
+    "Согласно ч. {part} ст. {article} {law} заказчик обязан установить требования к участникам.",
+    "В ходе рассмотрения дела № {case} установлено следующее: {subject}.",
+    "Заявитель указывает, что в действиях заказчика содержатся признаки нарушения п. {part} ч. {part2} ст. {article} {law}.",
+    "На заседании комиссии представитель {org} пояснил, что с доводами жалобы не согласен.",
+    "Начальная (максимальная) цена контракта составила {amount} руб., в т. ч. НДС.",
+    "Изучив представленные материалы, комиссия пришла к выводу, что жалоба является обоснованной.",
+    "Согласно документации о закупке срок поставки товара составляет {days} календарных дней с даты заключения контракта.",
+    "Комиссия отмечает, что указанные действия приводят или могут привести к недопущению, ограничению или устранению конкуренции.",
+    "Руководствуясь ст. {article} {law}, комиссия решила выдать {org2} обязательное для исполнения предписание.",
+    "Протокол рассмотрения заявок от {date} подписан всеми членами комиссии.",
+    "Ответчик ссылается на письмо Минэкономразвития России от {date} № Д28и-{number}.",
+    "Решение может быть обжаловано в арбитражный суд в течение трёх месяцев со дня его принятия.",
+    "Доказательств обратного в материалы дела не представлено.",
+    "Заказчик — {org2} (г. Москва, ул. Тверская, д. {part}, стр. {part2}) — представил письменные возражения.",
+    "Как следует из пп. «{letter}» п. {part} ч. {part2} ст. {article} {law}, т. е. в соответствии с требованиями закона, заявка подлежит отклонению.",
+    "Председатель комиссии — зам. руководителя управления {initials} {surname}, члены комиссии — {initials2} {surname2} и др.",
+    "Штраф по ч. {part} ст. 14.{part2} КоАП РФ составляет от {amount} руб. до {amount2} руб. (см. разд. {part} документации).",
+    "В т. ч. заявитель ссылается на постановление АС МО от {date} по делу № А40-{number}/{part}.",
+]
+
+SURNAMES = ["Иванов", "Петрова", "Сидоров", "Кузнецова", "Смирнов", "Волкова", "Фёдоров"]
+
+# Распределения числа предложений в документе.
+LENGTH_DISTRIBUTIONS = ("uniform", "fixed", "lognormal")
+
+
+class FASCorpusGenerator:
+    """
+    Детерминированно (по seed) генерирует документы в формате,
+    в котором их хранит парсер: doc_id, url и full_text.
+    """
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+
+    def _fill(self, rng: random.Random, template: str) -> str:
+        return template.format(
+            authority=rng.choice(AUTHORITIES),
+            org=rng.choice(ORGANIZATIONS),
+            org2=rng.choice(ORGANIZATIONS),
+            law=rng.choice(LAWS),
+            subject=rng.choice(SUBJECTS),
+            number=rng.randint(10 ** 17, 10 ** 18 - 1),
+            case=f"{rng.randint(1, 99):02d}/{rng.randint(1, 99999):05d}/{rng.randint(19, 25)}",
+            part=rng.randint(1, 12),
+            part2=rng.randint(1, 8),
+            article=rng.randint(1, 99),
+            amount=f"{rng.randint(10_000, 90_000_000):,}".replace(",", " "),
+            days=rng.randint(5, 120),
+            date=f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.20{rng.randint(18, 25)}",
+            amount2=f"{rng.randint(100_000, 900_000_000):,}".replace(",", " "),
+            letter=rng.choice("абвгд"),
+            initials=f"{rng.choice('АБВГДЕИКМНОПС')}.{rng.choice('АБВГДЕИКМНОПС')}.",
+            initials2=f"{rng.choice('АБВГДЕИКМНОПС')}.{rng.choice('АБВГДЕИКМНОПС')}.",
+            surname=rng.choice(SURNAMES),
+            surname2=rng.choice(SURNAMES),
+        )
+
+    def make_document(self, index: int, n_sentences: int) -> Dict[str, str]:
+        rng = random.Random(f"{self.seed}:{index}")
+
+        paragraphs = []
+        sentences = []
+        for _ in range(n_sentences):
+            sentences.append(self._fill(rng, rng.choice(SENTENCE_TEMPLATES)))
+            if rng.random() < 0.2:
+                paragraphs.append(" ".join(sentences))
+                sentences = []
+        if sentences:
+            paragraphs.append(" ".join(sentences))
+
+        header = f"РЕШЕНИЕ по делу № {self._fill(rng, '{case}')}\n{rng.choice(SUBJECTS).capitalize()}."
+
+        return {
+            "doc_id": f"doc-{self.seed}-{index}",
+            "url": f"https://br.fas.gov.ru/ct/synthetic/{self.seed}-{index}/",
+            "full_text": header + "\n\n" + "\n\n".join(paragraphs),
+        }
+
+    def iter_corpus(self, n_docs: int, min_sentences: int = 20,
+                    max_sentences: int = 80,
+                    distribution: str = "uniform") -> Iterator[Dict[str, str]]:
+        """
+        Генерирует документы по одному, не держа корпус в памяти.
+
+        distribution задаёт распределение длины документа в предложениях:
+        uniform - равномерно от min до max, fixed - всегда max,
+        lognormal - большинство документов короткие, немногие очень длинные
+        (как у настоящих решений), с обрезкой по min/max.
+        """
+
+        if distribution not in LENGTH_DISTRIBUTIONS:
+            raise ValueError(f"Unknown length distribution: {distribution}")
+
+        rng = random.Random(self.seed)
+        median = (min_sentences + max_sentences) / 4
+
+        for i in range(n_docs):
+            if distribution == "fixed":
+                n_sentences = max_sentences
+            elif distribution == "lognormal":
+                n_sentences = int(min(max(rng.lognormvariate(math.log(median), 0.8),
+                                          min_sentences), max_sentences))
+            else:
+                n_sentences = rng.randint(min_sentences, max_sentences)
+
+            yield self.make_document(i, n_sentences)
+
+    def make_corpus(self, n_docs: int, min_sentences: int = 20,
+                    max_sentences: int = 80,
+                    distribution: str = "uniform") -> List[Dict[str, str]]:
+        return list(self.iter_corpus(n_docs, min_sentences, max_sentences, distribution))
+
+    def make_queries(self, n_queries: int) -> List[str]:
+        """
+        Запросы в стиле пользователей: тема дела и, иногда, закон.
+        """
+
+        rng = random.Random(f"{self.seed}:queries")
+        queries = []
+        for _ in range(n_queries):
+            query = rng.choice(SUBJECTS)
+            if rng.random() < 0.5:
+                query += " " + rng.choice(LAWS)
+            queries.append(query)
+
+        return queries
@@ -0,0 +1,215 @@
+"""
+Бенчмарк пропускной способности ингеста.
+
+Прогоняет синтетические решения ФАС через этапы ингеста:
+SentenceChunker.chunk, TokenChunker.chunk_tokens_by_size,
+Embedder.generate_chunk_embeddings и Embedder.insert_to_qdrant.
+Работает на CPU: модель заменена FakeBGEM3, Qdrant - локальный
+в памяти, токенизатор можно заменить StubTokenizer (--tokenizer stub).
+Чтобы увидеть регрессии чанкера отдельно, запускайте --stages chunk,
+масштабирование чанкинга по ядрам - с --chunk-workers,
+потоковый ингест чанков пачками (память на длинных документах) - с --streaming.
+
+Запуск из каталога backend:
+    python -m benchmarks.ingestion --docs 200 --tokenizer stub
+    python -m benchmarks.ingestion --docs 500 --stages chunk --length-dist lognormal
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+from qdrant_client import QdrantClient
+
+from benchmarks.common import print_rows, save_results, summarize
+from benchmarks.corpus import LENGTH_DISTRIBUTIONS, FASCorpusGenerator
+from benchmarks.stubs import FakeBGEM3, load_tokenizer
+from chunkers.sentence_chunker import SentenceChunker
+from chunkers.token_chunker import TokenChunker
+from constants import QDRANT_COLLECTION_NAME
+from embedder import Embedder
+
+STAGES = ("chunk", "token_chunk", "embed", "qdrant")
+
+
+def peak_rss_mb() -> float:
+    """
+    Пиковый RSS процесса в мегабайтах.
+    """
+
+    try:
+        import resource
+    except ImportError:
+        import psutil
+
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / 2 ** 20
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты.
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+    if "qdrant" in stages and "embed" not in stages:
+        raise ValueError("Stage 'qdrant' requires 'embed'")
+    if args.streaming:
+        if args.chunk_workers > 1:
+            raise ValueError("--streaming chunks in the main process, use --chunk-workers 1")
+        stages = ["embed"]
+
+    tokenizer = load_tokenizer(args.tokenizer)
+    sentence_chunker = SentenceChunker(tokenizer, single_pass=not args.legacy_tokenization)
+    token_chunker = TokenChunker(tokenizer)
+
+    embedder = None
+    if "embed" in stages:
+        model = FakeBGEM3(latency_ms=args.encode_ms, per_text_ms=args.per_text_ms)
+        embedder = Embedder(client=QdrantClient(":memory:"), model=model, tokenizer=tokenizer)
+        embedder.create_qdrant_collection(QDRANT_COLLECTION_NAME)
+
+    generator = FASCorpusGenerator(seed=args.seed)
+    documents = generator.iter_corpus(args.docs, args.min_sentences,
+                                      args.max_sentences, args.length_dist)
+
+    chunked = None
+    if args.chunk_workers > 1 and ("chunk" in stages or embedder):
+        documents, to_chunk = itertools.tee(documents)
+        chunked = sentence_chunker.chunk_many(((doc["full_text"], doc["doc_id"]) for doc in to_chunk),
+                                              workers=args.chunk_workers)
+
+    stage_seconds: Dict[str, List[float]] = {stage: [] for stage in stages}
+    totals = {"docs": 0, "chars": 0, "tokens": 0, "chunks": 0}
+    rss_before = peak_rss_mb()
+    start_time = time.perf_counter()
+
+    # Embedder печатает прогресс на каждый документ.
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+
+    with quiet:
+        for doc in documents:
+            text = doc["full_text"]
+            totals["docs"] += 1
+            totals["chars"] += len(text)
+            totals["tokens"] += len(tokenizer.encode(text, add_special_tokens=False))
+
+            if args.streaming:
+                # Чанки генерируются по ходу загрузки, этапы chunk, embed
+                # и qdrant не разделяются и записываются в embed.
+                stage_start = time.perf_counter()
+                stream = ({**chunk, "url": doc["url"]}
+                          for chunk in sentence_chunker.iter_chunks(text, doc_id=doc["doc_id"]))
+                totals["chunks"] += embedder.insert_chunks(stream, collection_name=QDRANT_COLLECTION_NAME,
+                                                           batch_size=args.batch_size)
+                stage_seconds["embed"].append(time.perf_counter() - stage_start)
+                continue
+
+            chunks = None
+            if "chunk" in stages or embedder:
+                stage_start = time.perf_counter()
+                if chunked is not None:
+                    # С пулом этап - это ожидание готовых чанков очередного документа.
+                    chunks = next(chunked)
+                else:
+                    chunks = sentence_chunker.chunk(text, doc_id=doc["doc_id"])
+                if "chunk" in stages:
+                    stage_seconds["chunk"].append(time.perf_counter() - stage_start)
+                for chunk in chunks:
+                    chunk["url"] = doc["url"]
+                totals["chunks"] += len(chunks)
+
+            if "token_chunk" in stages:
+                stage_start = time.perf_counter()
+                token_chunker.chunk_tokens_by_size(text)
+                stage_seconds["token_chunk"].append(time.perf_counter() - stage_start)
+
+            if embedder:
+                stage_start = time.perf_counter()
+                embeddings = embedder.generate_chunk_embeddings(chunks)
+                stage_seconds["embed"].append(time.perf_counter() - stage_start)
+
+                if "qdrant" in stages:
+                    stage_start = time.perf_counter()
+                    embedder.insert_to_qdrant(embeddings, collection_name=QDRANT_COLLECTION_NAME)
+                    stage_seconds["qdrant"].append(time.perf_counter() - stage_start)
+
+    wall_time = time.perf_counter() - start_time
+    sentence_chunker.close()
+    staged_time = sum(sum(seconds) for seconds in stage_seconds.values())
+
+    breakdown = {}
+    for stage, seconds in stage_seconds.items():
+        total = sum(seconds)
+        breakdown[stage] = {
+            "seconds": round(total, 3),
+            "share": round(total / staged_time, 3) if staged_time else 0.0,
+            "docs_per_sec": round(totals["docs"] / total, 2) if total else None,
+            "chunks_per_sec": round(totals["chunks"] / total, 2) if total and totals["chunks"] else None,
+            "tokens_per_sec": round(totals["tokens"] / total, 1) if total else None,
+            "per_doc": summarize(seconds),
+        }
+
+    return {
+        **totals,
+        "wall_seconds": round(wall_time, 3),
+        "docs_per_sec": round(totals["docs"] / wall_time, 2),
+        "chunks_per_sec": round(totals["chunks"] / wall_time, 2),
+        "tokens_per_sec": round(totals["tokens"] / wall_time, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_before_mb": round(rss_before, 1),
+        "stages": breakdown,
+    }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Ingestion throughput benchmark")
+    arg_parser.add_argument("--docs", type=int, default=200)
+    arg_parser.add_argument("--stages", default=",".join(STAGES),
+                            help=f"Этапы через запятую из: {', '.join(STAGES)}")
+    arg_parser.add_argument("--tokenizer", default="bge", choices=("bge", "stub"))
+    arg_parser.add_argument("--legacy-tokenization", action="store_true",
+                            help="Токенизировать каждое предложение и чанк отдельно, как до single_pass")
+    arg_parser.add_argument("--chunk-workers", type=int, default=1,
+                            help="Процессов для SentenceChunker.chunk_many, 1 - чанкинг в основном процессе")
+    arg_parser.add_argument("--streaming", action="store_true",
+                            help="SentenceChunker.iter_chunks + Embedder.insert_chunks вместо списков чанков и эмбеддингов")
+    arg_parser.add_argument("--batch-size", type=int, default=25,
+                            help="Размер пачки Embedder.insert_chunks")
+    arg_parser.add_argument("--length-dist", default="lognormal", choices=LENGTH_DISTRIBUTIONS)
+    arg_parser.add_argument("--min-sentences", type=int, default=10)
+    arg_parser.add_argument("--max-sentences", type=int, default=400)
+    arg_parser.add_argument("--encode-ms", type=float, default=0.0,
+                            help="Имитация задержки модели на вызов")
+    arg_parser.add_argument("--per-text-ms", type=float, default=0.0,
+                            help="Имитация задержки модели на текст")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--verbose", action="store_true", help="Не глушить вывод Embedder")
+    arg_parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = arg_parser.parse_args()
+
+    results = run(args)
+
+    print(f"{results['docs']} docs, {results['chunks']} chunks, {results['tokens']} tokens "
+          f"in {results['wall_seconds']} s: {results['docs_per_sec']} docs/s, "
+          f"{results['chunks_per_sec']} chunks/s, {results['tokens_per_sec']} tokens/s")
+    print(f"Peak RSS: {results['peak_rss_mb']} MB (before run: {results['peak_rss_before_mb']} MB)")
+    print_rows([
+        {"stage": stage, "seconds": stats["seconds"], "share": stats["share"],
+         "docs/s": stats["docs_per_sec"], "chunks/s": stats["chunks_per_sec"],
+         "tokens/s": stats["tokens_per_sec"], "p95 ms/doc": stats["per_doc"]["p95_ms"]}
+        for stage, stats in results["stages"].items()
+    ])
+
+    output = save_results("ingestion", vars(args), results, args.output)
+    print(f"Results saved to {output}")
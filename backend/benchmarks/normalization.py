@@ -0,0 +1,112 @@
+"""
+Бенчмарк нормализации текста перед чанкингом.
+
+Сравнивает TextNormalizer (BaseChunker.normalize_text) с прежней
+пошаговой нормализацией BaseChunker._normalize_legacy: проверяет
+побайтное совпадение результатов на синтетических решениях ФАС
+с HTML-мусором, ссылками, телефонами и почтами и на случайных
+строках из «трудных» символов, затем печатает MB/s обоих вариантов.
+
+Запуск из каталога backend:
+    python -m benchmarks.normalization --docs 200
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import print_rows, save_results
+from benchmarks.corpus import FASCorpusGenerator
+from chunkers.text_normalizer import TextNormalizer
+from chunkers.token_chunker import TokenChunker
+from benchmarks.stubs import StubTokenizer
+
+# Фрагменты, которые встречаются в выгрузке с сайта ФАС и в почте.
+NOISE = [
+    "<p>", "</p>", "<br/>", "<span class=\"x\">", "&nbsp;", "&laquo;", "&raquo;", "&amp;",
+    "&#8212;", " ", " ", "\t", "\r\n", "\n \n\n", "  ", " — ", "–", "——",
+    "«", "»", "“", "”", "„", "‘", "’", "é",
+    "https://br.fas.gov.ru/ct/", "тел.: +7 (495) 755-23-23", "Тел 8 800 100-00-00",
+    "info@fas.gov.ru", "a@b", "@", "x@@y", "ᲄел 8(495)1234567", "<", ">", "e\u0301",
+]
+
+
+def add_noise(text: str, rng: random.Random, rate: float) -> str:
+    words = text.split(" ")
+    for i in range(len(words)):
+        if rng.random() < rate:
+            words[i] = rng.choice(NOISE) + words[i] + rng.choice(NOISE)
+    return " ".join(words)
+
+
+def random_texts(rng: random.Random, n: int) -> List[str]:
+    alphabet = NOISE + list("аб <>\n\t .@:/-тел12345")
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(n)]
+
+
+def throughput(normalize: Callable[[str], str], texts: List[str], repeat: int) -> float:
+    n_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for text in texts:
+            normalize(text)
+        best = min(best, time.perf_counter() - start_time)
+    return n_bytes / 2 ** 20 / best
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    chunker = TokenChunker(StubTokenizer())
+    normalizer = TextNormalizer(max_cached=0)
+    documents = FASCorpusGenerator(seed=args.seed).make_corpus(args.docs, 20, 400, "lognormal")
+
+    mismatches = sum(normalizer.normalize(text) != chunker._normalize_legacy(text)
+                     for text in random_texts(rng, args.random_texts))
+    rows = []
+
+    for noise_rate in [float(rate) for rate in args.noise_rates.split(",")]:
+        texts = [add_noise(doc["full_text"], rng, noise_rate) for doc in documents]
+        mismatches += sum(normalizer.normalize(text) != chunker._normalize_legacy(text)
+                          for text in texts)
+
+        legacy = throughput(chunker._normalize_legacy, texts, args.repeat)
+        new = throughput(normalizer.normalize, texts, args.repeat)
+
+        # Повторная нормализация тех же документов идёт из кэша по хэшу.
+        cached = TextNormalizer(max_cached=len(texts))
+        for text in texts:
+            cached.normalize(text)
+        cached_mb_s = throughput(cached.normalize, texts, args.repeat)
+
+        for name, mb_per_sec in (("legacy", legacy), ("TextNormalizer", new),
+                                 ("TextNormalizer (cached)", cached_mb_s)):
+            rows.append({"noise_rate": noise_rate, "normalizer": name,
+                         "mb_per_sec": round(mb_per_sec, 1),
+                         "speedup": round(mb_per_sec / legacy, 2)})
+
+    if mismatches:
+        raise AssertionError(f"{mismatches} texts normalize differently")
+
+    return {"rows": rows}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Text normalization benchmark")
+    arg_parser.add_argument("--docs", type=int, default=200)
+    arg_parser.add_argument("--noise-rates", default="0,0.05",
+                            help="Доли слов, обрамляемых HTML, кавычками, пробелами и т.п., через запятую")
+    arg_parser.add_argument("--random-texts", type=int, default=20000,
+                            help="Случайных коротких строк для проверки совпадения")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = arg_parser.parse_args()
+
+    results = run(args)
+    print("Outputs identical")
+    print_rows(results["rows"])
+
+    output = save_results("normalization", vars(args), results, args.output)
+    print(f"Results saved to {output}")
@@ -0,0 +1,173 @@
+"""
+Бенчмарк AsyncRetriever.search без GPU, Qdrant-сервера и Postgres.
+
+Модель заменена детерминированным FakeBGEM3, Qdrant работает
+в локальном режиме в памяти, тексты отдаёт FakeDocumentFetcher.
+Абсолютные цифры не совпадут с продом (локальный Qdrant ищет перебором),
+но позволяют сравнивать изменения в коде поиска между коммитами.
+Локальный Qdrant выполняет поиск прямо в event loop, поэтому при
+concurrency > 1 его время попадает и в задержки соседних этапов:
+для чистой разбивки по этапам запускайте с --concurrency 1.
+
+Запуск из каталога backend:
+    python -m benchmarks.retrieval --docs 500 --queries 200 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+from uuid import uuid4
+
+from qdrant_client import AsyncQdrantClient, models
+
+from benchmarks.common import print_stages, save_results, summarize
+from benchmarks.corpus import FASCorpusGenerator
+from benchmarks.stubs import FakeBGEM3, FakeDocumentFetcher, split_into_chunks
+from constants import QDRANT_COLLECTION_NAME
+from retriever import AsyncRetriever
+
+
+async def build_index(client: AsyncQdrantClient, model: FakeBGEM3,
+                      corpus: List[Dict[str, str]], chunk_chars: int,
+                      batch_size: int = 64) -> int:
+    """
+    Создаёт коллекцию с той же схемой векторов, что и Embedder,
+    и загружает в неё чанки корпуса.
+    """
+
+    await client.create_collection(
+        collection_name=QDRANT_COLLECTION_NAME,
+        vectors_config={
+            "dense": models.VectorParams(size=model.dim, distance=models.Distance.COSINE),
+            "colbert": models.VectorParams(
+                size=model.dim,
+                distance=models.Distance.COSINE,
+                multivector_config=models.MultiVectorConfig(
+                    comparator=models.MultiVectorComparator.MAX_SIM
+                )
+            )
+        },
+        sparse_vectors_config={"sparse": models.SparseVectorParams()},
+    )
+
+    payloads = []
+    for doc in corpus:
+        for chunk in split_into_chunks(doc["full_text"], max_chars=chunk_chars):
+            payloads.append({**chunk, "doc_id": doc["doc_id"], "url": doc["url"]})
+
+    # Конвертация sparse-весов та же, что и при поиске.
+    converter = AsyncRetriever(client, model, None)
+
+    for start in range(0, len(payloads), batch_size):
+        batch = payloads[start:start + batch_size]
+        output = model.encode([payload["text"] for payload in batch],
+                              return_dense=True, return_sparse=True, return_colbert_vecs=True)
+
+        points = [
+            models.PointStruct(
+                id=str(uuid4()),
+                payload=payload,
+                vector={
+                    "dense": output["dense_vecs"][i].tolist(),
+                    "sparse": converter._convert_sparse_vector(output["lexical_weights"][i]),
+                    "colbert": output["colbert_vecs"][i].tolist(),
+                }
+            )
+            for i, payload in enumerate(batch)
+        ]
+        await client.upsert(collection_name=QDRANT_COLLECTION_NAME, points=points)
+
+    return len(payloads)
+
+
+async def run_queries(retriever: AsyncRetriever, queries: List[str],
+                      concurrency: int, limit: int) -> Dict[str, Any]:
+    stage_seconds: Dict[str, List[float]] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for query in queries:
+        queue.put_nowait(query)
+
+    async def worker() -> None:
+        while not queue.empty():
+            query = queue.get_nowait()
+            timings: Dict[str, float] = {}
+            start_time = time.perf_counter()
+            await retriever.search(query, limit=limit, timings=timings)
+            timings["total"] = time.perf_counter() - start_time
+
+            for stage, seconds in timings.items():
+                stage_seconds.setdefault(stage, []).append(seconds)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - start_time
+
+    stages = {}
+    for stage, seconds in stage_seconds.items():
+        stages[stage] = summarize(seconds)
+        # Пропускная способность этапа, если бы он выполнялся последовательно.
+        stages[stage]["serial_qps"] = round(len(seconds) / sum(seconds), 2) if sum(seconds) else None
+
+    return {
+        "queries": len(queries),
+        "wall_seconds": round(wall_time, 3),
+        "qps": round(len(queries) / wall_time, 2),
+        "stages": stages,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    generator = FASCorpusGenerator(seed=args.seed)
+    corpus = generator.make_corpus(args.docs)
+    queries = generator.make_queries(args.queries)
+
+    model = FakeBGEM3(dim=args.dim, latency_ms=args.encode_ms, per_text_ms=args.per_text_ms)
+    doc_fetcher = FakeDocumentFetcher(corpus, latency_ms=args.fetch_ms)
+    client = AsyncQdrantClient(":memory:")
+
+    try:
+        print(f"Indexing {len(corpus)} documents...")
+        start_time = time.perf_counter()
+        n_chunks = await build_index(client, model, corpus, args.chunk_chars)
+        print(f"Indexed {n_chunks} chunks in {time.perf_counter() - start_time:.2f} s")
+
+        retriever = AsyncRetriever(client, model, doc_fetcher)
+
+        if args.warmup:
+            await run_queries(retriever, queries[:args.warmup], 1, args.limit)
+
+        results = await run_queries(retriever, queries, args.concurrency, args.limit)
+        results["chunks"] = n_chunks
+        results["postgres_queries"] = doc_fetcher.queries
+
+    finally:
+        await client.close()
+
+    print(f"{results['queries']} queries, concurrency {args.concurrency}: "
+          f"{results['qps']} QPS, wall {results['wall_seconds']} s")
+    print_stages(results["stages"])
+
+    output = save_results("retrieval", vars(args), results, args.output)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="AsyncRetriever.search benchmark")
+    arg_parser.add_argument("--docs", type=int, default=500, help="Размер синтетического корпуса")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--limit", type=int, default=5)
+    arg_parser.add_argument("--dim", type=int, default=1024)
+    arg_parser.add_argument("--chunk-chars", type=int, default=1000)
+    arg_parser.add_argument("--encode-ms", type=float, default=0.0,
+                            help="Имитация задержки модели на вызов")
+    arg_parser.add_argument("--per-text-ms", type=float, default=0.0,
+                            help="Имитация задержки модели на текст")
+    arg_parser.add_argument("--fetch-ms", type=float, default=0.0,
+                            help="Имитация задержки запроса к Postgres")
+    arg_parser.add_argument("--warmup", type=int, default=10)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+
+    asyncio.run(main(arg_parser.parse_args()))
@@ -0,0 +1,94 @@
+"""
+Бенчмарк разбиения на предложения в SentenceChunker.
+
+Сравнивает _split_by_sentences с прежним _split_by_sentences_legacy
+на документах от сотен килобайт до нескольких мегабайт: проверяет,
+что результаты совпадают, и печатает время на мегабайт, которое
+при линейной сложности не должно расти с размером документа.
+Вариант boilerplate склеивает документ из одинаковых абзацев.
+
+Запуск из каталога backend:
+    python -m benchmarks.segmentation --sizes-mb 0.25,0.5,1,2,4
+"""
+
+import argparse
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import print_rows, save_results
+from benchmarks.corpus import FASCorpusGenerator
+from benchmarks.stubs import StubTokenizer
+from chunkers.sentence_chunker import SentenceChunker
+
+# Средняя длина синтетического предложения, символов.
+CHARS_PER_SENTENCE = 110
+
+
+def make_text(generator: FASCorpusGenerator, size_mb: float, variant: str) -> str:
+    n_chars = int(size_mb * 2 ** 20)
+
+    if variant == "boilerplate":
+        paragraph = generator.make_document(0, 20)["full_text"]
+        text = "\n\n".join([paragraph] * (n_chars // len(paragraph) + 1))
+    else:
+        text = generator.make_document(0, n_chars // CHARS_PER_SENTENCE + 1)["full_text"]
+
+    return text[:n_chars]
+
+
+def best_time(split: Callable[[str], List[Dict[str, Any]]], text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        split(text)
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    chunker = SentenceChunker(StubTokenizer())
+    generator = FASCorpusGenerator(seed=args.seed)
+    rows = []
+
+    for variant in args.variants.split(","):
+        for size_mb in [float(size) for size in args.sizes_mb.split(",")]:
+            text = chunker.normalize_text(make_text(generator, size_mb, variant))
+            mb = len(text) / 2 ** 20
+
+            sentences = chunker._split_by_sentences(text)
+            if sentences != chunker._split_by_sentences_legacy(text):
+                raise AssertionError(f"Segmenters disagree on {variant} {size_mb} MB")
+
+            new_time = best_time(chunker._split_by_sentences, text, args.repeat)
+            legacy_time = best_time(chunker._split_by_sentences_legacy, text, args.repeat)
+
+            rows.append({
+                "variant": variant,
+                "mb": round(mb, 2),
+                "sentences": len(sentences),
+                "new_s": round(new_time, 3),
+                "legacy_s": round(legacy_time, 3),
+                "new_s_per_mb": round(new_time / mb, 3),
+                "legacy_s_per_mb": round(legacy_time / mb, 3),
+            })
+
+    return rows
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Sentence segmentation benchmark")
+    arg_parser.add_argument("--sizes-mb", default="0.25,0.5,1,2,4")
+    arg_parser.add_argument("--variants", default="corpus,boilerplate",
+                            help="corpus - сплошной синтетический документ, "
+                                 "boilerplate - повторяющиеся абзацы")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--output", default=None, help="Путь к JSON с результатами")
+    args = arg_parser.parse_args()
+
+    rows = run(args)
+    print("Segmenters agree on all documents")
+    print_rows(rows)
+
+    output = save_results("segmentation", vars(args), {"rows": rows}, args.output)
+    print(f"Results saved to {output}")
@@ -0,0 +1,226 @@
+"""
+Локальные заменители внешних зависимостей для бенчмарков:
+модели BGE-M3, токенизатора и хранилища документов.
+"""
+
+import asyncio
+import re
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+
+class FakeBGEM3:
+    """
+    Детерминированная замена BGEM3FlagModel без GPU.
+
+    Вектор слова получается из генератора случайных чисел с seed
+    по хэшу слова, поэтому тексты с общими словами близки и по dense,
+    и по sparse, и по colbert. Задержки latency_ms (на вызов)
+    и per_text_ms (на текст) имитируют время работы настоящей модели.
+    """
+
+    def __init__(self, dim: int = 1024, vocab_size: int = 250002,
+                 max_colbert_vectors: int = 64,
+                 latency_ms: float = 0.0, per_text_ms: float = 0.0):
+        self.dim = dim
+        self.vocab_size = vocab_size
+        self.max_colbert_vectors = max_colbert_vectors
+        self.latency = latency_ms / 1000
+        self.per_text = per_text_ms / 1000
+        self._vectors: Dict[int, np.ndarray] = {}
+
+    def _token_ids(self, text: str) -> List[int]:
+        return [zlib.crc32(word.encode("utf-8")) % self.vocab_size
+                for word in re.findall(r"\w+", text.lower())]
+
+    def _vector(self, token_id: int) -> np.ndarray:
+        vector = self._vectors.get(token_id)
+        if vector is None:
+            vector = np.random.default_rng(token_id).standard_normal(self.dim).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            self._vectors[token_id] = vector
+        return vector
+
+    def _encode_one(self, text: str) -> Dict[str, Any]:
+        token_ids = self._token_ids(text) or [0]
+        vectors = np.stack([self._vector(token_id) for token_id in token_ids])
+
+        dense = vectors.mean(axis=0)
+        dense /= np.linalg.norm(dense) or 1.0
+
+        counts: Dict[int, int] = defaultdict(int)
+        for token_id in token_ids:
+            counts[token_id] += 1
+        top = max(counts.values())
+        lexical_weights = defaultdict(int, {str(token_id): round(count / top * 0.3, 4)
+                                            for token_id, count in counts.items()})
+
+        return {
+            "dense_vecs": dense,
+            "lexical_weights": lexical_weights,
+            "colbert_vecs": vectors[:self.max_colbert_vectors],
+        }
+
+    def encode(self,
+               sentences: Union[str, List[str]],
+               batch_size: int = 256,
+               max_length: int = 8192,
+               return_dense: bool = True,
+               return_sparse: bool = False,
+               return_colbert_vecs: bool = False) -> Dict[str, Any]:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else sentences
+
+        outputs = [self._encode_one(text) for text in texts]
+
+        delay = self.latency + self.per_text * len(texts)
+        if delay:
+            time.sleep(delay)
+
+        def collect(key: str, requested: bool):
+            if not requested:
+                return None
+            values = [output[key] for output in outputs]
+            if single:
+                return values[0]
+            return np.stack(values) if key == "dense_vecs" else values
+
+        return {
+            "dense_vecs": collect("dense_vecs", return_dense),
+            "lexical_weights": collect("lexical_weights", return_sparse),
+            "colbert_vecs": collect("colbert_vecs", return_colbert_vecs),
+        }
+
+
+class StubTokenizer:
+    """
+    Заменитель токенизатора HuggingFace для запуска без transformers.
+
+    Слова режутся на куски до 4 символов, пробелы перед куском входят
+    в него, поэтому decode(encode(text)) восстанавливает текст.
+    По числу токенов на русском тексте близок к BGE-M3.
+    """
+
+    is_fast = True
+
+    def __init__(self):
+        self._pattern = re.compile(r"\s*(?:\w{1,4}|[^\w\s])")
+        self._ids: Dict[str, int] = {}
+        self._pieces: List[str] = []
+
+    def _piece_id(self, piece: str) -> int:
+        piece_id = self._ids.get(piece)
+        if piece_id is None:
+            piece_id = len(self._pieces)
+            self._ids[piece] = piece_id
+            self._pieces.append(piece)
+        return piece_id
+
+    def encode(self, text: str, add_special_tokens: bool = False) -> List[int]:
+        return [self._piece_id(piece) for piece in self._pattern.findall(text)]
+
+    def decode(self, token_ids: List[int], clean_up_tokenization_spaces: bool = True) -> str:
+        return "".join(self._pieces[token_id] for token_id in token_ids).strip()
+
+    def __call__(self, text: str, add_special_tokens: bool = False,
+                 return_offsets_mapping: bool = False) -> Dict[str, List]:
+        input_ids = []
+        offsets = []
+        for match in self._pattern.finditer(text):
+            piece = match.group()
+            input_ids.append(self._piece_id(piece))
+            offsets.append((match.end() - len(piece.lstrip()), match.end()))
+
+        encoding: Dict[str, List] = {"input_ids": input_ids}
+        if return_offsets_mapping:
+            encoding["offset_mapping"] = offsets
+        return encoding
+
+    def apply_chat_template(self, messages: List[Dict[str, str]], tokenize: bool = True,
+                            add_generation_prompt: bool = True):
+        text = "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in messages)
+        if add_generation_prompt:
+            text += "<|assistant|>\n"
+        return self.encode(text) if tokenize else text
+
+
+def load_tokenizer(name: str):
+    """
+    stub - StubTokenizer, иначе токенизатор BGE-M3 из transformers.
+    """
+
+    if name == "stub":
+        return StubTokenizer()
+
+    from transformers import AutoTokenizer
+    from constants import TOKENIZER_NAME
+
+    return AutoTokenizer.from_pretrained(TOKENIZER_NAME, trust_remote_code=True)
+
+
+class FakeDocumentFetcher:
+    """
+    Замена AsyncDocumentFetcher поверх словаря в памяти.
+    latency_ms имитирует время одного запроса к Postgres.
+    """
+
+    def __init__(self, documents: List[Dict[str, str]], latency_ms: float = 0.0):
+        self.documents = {doc["doc_id"]: doc for doc in documents}
+        self.latency = latency_ms / 1000
+        self.queries = 0
+
+    async def _query(self) -> None:
+        self.queries += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_texts_by_ids(self, doc_ids: List[str]) -> Dict[str, str]:
+        await self._query()
+        return {doc_id: self.documents[doc_id]["full_text"]
+                for doc_id in doc_ids if doc_id in self.documents}
+
+    async def get_urls_by_ids(self, doc_ids: List[str]) -> Dict[str, str]:
+        await self._query()
+        return {doc_id: self.documents[doc_id]["url"]
+                for doc_id in doc_ids if doc_id in self.documents}
+
+    async def get_texts_and_urls_by_ids(self, doc_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        await self._query()
+        return {doc_id: {"full_text": self.documents[doc_id]["full_text"],
+                         "url": self.documents[doc_id]["url"]}
+                for doc_id in doc_ids if doc_id in self.documents}
+
+    async def close(self) -> None:
+        pass
+
+
+def split_into_chunks(text: str, max_chars: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Простая нарезка по предложениям без токенизатора.
+    Даёт чанки в том же формате, что и чанкеры: text, index, start_char, end_char.
+    """
+
+    chunks = []
+    start: Optional[int] = None
+    end = 0
+
+    for match in re.finditer(r"[^.!?\n]+[.!?]?", text):
+        if not match.group().strip():
+            continue
+        if start is not None and match.end() - start > max_chars:
+            chunks.append({"text": text[start:end], "index": len(chunks),
+                           "start_char": start, "end_char": end})
+            start = None
+        if start is None:
+            start = match.start() + len(match.group()) - len(match.group().lstrip())
+        end = match.end()
+
+    if start is not None:
+        chunks.append({"text": text[start:end], "index": len(chunks),
+                       "start_char": start, "end_char": end})
+
+    return chunks
@@ -1,12 +1,18 @@
-from transformers import AutoTokenizer
+from typing import TYPE_CHECKING
 import unicodedata
 import html
 import re
 
+from chunkers.text_normalizer import TextNormalizer
+
+if TYPE_CHECKING:
+    from transformers import AutoTokenizer
+
 
 class BaseChunker:
-    def __init__(self, tokenizer: AutoTokenizer):
+    def __init__(self, tokenizer: "AutoTokenizer"):
         self.tokenizer = tokenizer
+        self.normalizer = TextNormalizer()
 
     def tokenize(self, text: str) -> list[int]:
         return self.tokenizer.encode(text, add_special_tokens=False)
@@ -19,6 +25,13 @@ class BaseChunker:
         Нормализует текст.
         """
 
+        return self.normalizer.normalize(text)
+
+    def _normalize_legacy(self, text: str) -> str:
+        """
+        Прежняя нормализация по шагам, эталон для TextNormalizer.
+        """
+
         text = self._normalize_base(text)
         text = self._normalize_personal(text)
 
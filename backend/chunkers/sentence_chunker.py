@@ -1,25 +1,75 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from chunkers.base_chunker import BaseChunker
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import bisect
+import multiprocessing
+import os
 import re
 
+# Копия чанкера в процессе пула, создаётся один раз при старте процесса.
+_worker_chunker = None
+
+
+def _init_worker(chunker: "SentenceChunker") -> None:
+    global _worker_chunker
+    _worker_chunker = chunker
+
+
+def _chunk_in_worker(text: str, doc_id: Optional[str], chunk_size: int,
+                     overlap: int) -> List[Dict[str, Any]]:
+    return _worker_chunker.chunk(text, doc_id=doc_id, chunk_size=chunk_size, overlap=overlap)
+
 
 class SentenceChunker(BaseChunker):
     RUSSIAN_ABBREVS = ["г", "гг", "ул", "д", "стр", "ст", "п", "ч", "т", "пп", "см", "рис", "т.д", "и др",
                        "пр", "ст", "ч", "п", "с", "инд", "ФЗ", "РФ", "КоАП", "ИП", "ООО", "ЗАО", "ОАО"]
     DOT_MASK = "‹DOT›"
+    # Маска той же длины, что и точка: смещения в маскированном тексте совпадают с исходными.
+    DOT_MASK_CHAR = "\ue000"
 
-    def __init__(self, tokenizer):
+    def __init__(self, tokenizer, single_pass: bool = False):
         super().__init__(tokenizer)
 
+        # Однопроходный режим требует offset mapping, он есть только у fast-токенизаторов.
+        self.single_pass = single_pass and getattr(tokenizer, "is_fast", False)
+        self._pool = None
+        self._pool_workers = 0
+
         clean = [re.escape(a.rstrip('.')) for a in self.RUSSIAN_ABBREVS]
         self._abbrev_re = re.compile(
             r"\b(?:" + "|".join(clean) + r")\.(?=\s|$)", flags=re.IGNORECASE)
         self._initials_re = re.compile(
             r"\b(?:[A-ZА-ЯЁ]\.){1,3}(?=\s|[A-ZА-ЯЁ])")
+        self._sentence_re = re.compile(
+            r'(?P<end>[\.\!\?\…]{1,3}["\)\]\»\']{0,1})(?=\s+|$)', flags=re.UNICODE)
 
     def get_token_count(self, text: str) -> int:
         return len(self.tokenize(text))
 
+    def _span_token_counter(self, text: str,
+                            sentences: List[Dict[str, Any]]) -> Callable[[int, int], int]:
+        """
+        Токенизирует документ один раз и возвращает функцию,
+        считающую токены в предложениях с i по j - 1 по offset mapping.
+
+        Токен относится к диапазону, если пересекается с ним или целиком
+        лежит в пробелах перед первым предложением: отдельно токенизированный
+        фрагмент начинается с такого же токена-пробела.
+        """
+
+        offsets = self.tokenizer(text, add_special_tokens=False,
+                                 return_offsets_mapping=True)["offset_mapping"]
+        starts = [start for start, _ in offsets]
+        ends = [end for _, end in offsets]
+        gap_starts = [0] + [s["end"] for s in sentences[:-1]]
+
+        def count(i: int, j: int) -> int:
+            return (bisect.bisect_left(starts, sentences[j - 1]["end"])
+                    - bisect.bisect_right(ends, gap_starts[i]))
+
+        return count
+
     def _mask_abbr(self, text: str) -> str:
         text = self._abbrev_re.sub(
             lambda m: m.group(0)[:-1] + self.DOT_MASK, text)
@@ -30,15 +80,66 @@ class SentenceChunker(BaseChunker):
     def _unmask_abbr(self, text: str) -> str:
         return text.replace(self.DOT_MASK, ".")
 
-    def _split_by_sentences(self, text: str) -> List[str]:
+    def _mask_abbr_inplace(self, text: str) -> str:
+        """
+        Маскирует точки сокращений и инициалов символом DOT_MASK_CHAR,
+        не меняя длину текста.
+        """
+
+        text = self._abbrev_re.sub(
+            lambda m: m.group(0)[:-1] + self.DOT_MASK_CHAR, text)
+        text = self._initials_re.sub(lambda m: m.group(
+            0).replace('.', self.DOT_MASK_CHAR), text)
+        return text
+
+    def _split_by_sentences(self, text: str) -> List[Dict[str, Any]]:
         """
         Разбивает текст на фрагменты по предложениям.
+
+        Маска сокращений не сдвигает позиции, поэтому границы предложений
+        в маскированном тексте сразу являются смещениями в исходном.
+        """
+
+        if self.DOT_MASK_CHAR in text:
+            return self._split_by_sentences_legacy(text)
+
+        masked_text = self._mask_abbr_inplace(text)
+
+        sentences = []
+        masked_pos = 0
+
+        for m in self._sentence_re.finditer(masked_text):
+            end_of_sentence = m.end(1)
+            self._append_sentence(text, masked_text, masked_pos, end_of_sentence, sentences)
+            masked_pos = m.end()
+
+        if masked_pos < len(masked_text):
+            self._append_sentence(text, masked_text, masked_pos, len(masked_text), sentences)
+
+        return sentences
+
+    @staticmethod
+    def _append_sentence(text: str, masked_text: str, start: int, end: int,
+                         sentences: List[Dict[str, Any]]) -> None:
+        fragment = masked_text[start:end]
+        stripped = fragment.strip()
+        if not stripped:
+            return
+
+        start += len(fragment) - len(fragment.lstrip())
+        end = start + len(stripped)
+        sentences.append({"text": text[start:end], "start": start, "end": end})
+
+    def _split_by_sentences_legacy(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Прежний вариант разбиения: маска длиннее точки, поэтому
+        смещения предложений восстанавливаются поиском по исходному тексту.
+        Используется, если в тексте уже встречается DOT_MASK_CHAR.
         """
 
         masked_text = self._mask_abbr(text)
 
-        sentence_re = re.compile(
-            r'(?P<end>[\.\!\?\…]{1,3}["\)\]\»\']{0,1})(?=\s+|$)', flags=re.UNICODE)
+        sentence_re = self._sentence_re
 
         sentences = []
         masked_pos = 0
@@ -78,13 +179,34 @@ class SentenceChunker(BaseChunker):
                               chunk_size: int = 600,
                               overlap: int = 90) -> List[Dict[str, Any]]:
 
+        return list(self._iter_sliding_window(text, doc_id, chunk_size, overlap))
+
+    def _iter_sliding_window(self, text: str, doc_id: Optional[str] = None,
+                             chunk_size: int = 600,
+                             overlap: int = 90) -> Iterator[Dict[str, Any]]:
+        """
+        Генератор чанков скользящим окном по предложениям.
+
+        Короткий хвост документа склеивается с предыдущими чанками,
+        поэтому чанк отдаётся только после того, как за ним появился
+        чанк не короче min_tail_tokens: склейка до него уже не дойдёт.
+        """
+
         sentences = self._split_by_sentences(text)
 
-        token_counts = [self.get_token_count(s["text"]) for s in sentences]
+        if self.single_pass and sentences:
+            count_span = self._span_token_counter(text, sentences)
+            token_counts = [count_span(k, k + 1) for k in range(len(sentences))]
+        else:
+            count_span = None
+            token_counts = [self.get_token_count(s["text"]) for s in sentences]
         min_tail_tokens = max(int(0.25*chunk_size), 150)
         n = len(sentences)
 
-        chunks = []
+        # Ещё не отданные чанки и диапазоны их предложений,
+        # по диапазонам считаются токены склеенного хвоста.
+        pending = []
+        spans = []
         i = 0
         chunk_num = 0
         while i < n:
@@ -98,14 +220,23 @@ class SentenceChunker(BaseChunker):
             end_char = sentences[j - 1]["end"]
 
             chunk_text = text[start_char:end_char]
-            chunk_tokens = self.get_token_count(chunk_text)
+            if count_span:
+                chunk_tokens = count_span(i, j)
+            else:
+                chunk_tokens = self.get_token_count(chunk_text)
+
+            if chunk_tokens >= min_tail_tokens:
+                yield from pending
+                pending.clear()
+                spans.clear()
 
-            chunks.append({"index": chunk_num,
-                           "doc_id": doc_id,
-                           "text": chunk_text,
-                           "start_char": start_char,
-                           "end_char": end_char,
-                           "token_count": chunk_tokens})
+            spans.append((i, j))
+            pending.append({"index": chunk_num,
+                            "doc_id": doc_id,
+                            "text": chunk_text,
+                            "start_char": start_char,
+                            "end_char": end_char,
+                            "token_count": chunk_tokens})
 
             chunk_num += 1
 
@@ -122,27 +253,126 @@ class SentenceChunker(BaseChunker):
                 next_i = max(i + 1, back + 1)
                 i = next_i
 
-        while len(chunks) > 1 and chunks[-1]["token_count"] < min_tail_tokens:
-            tail = chunks.pop()
-            prev = chunks[-1]
+        while len(pending) > 1 and pending[-1]["token_count"] < min_tail_tokens:
+            tail = pending.pop()
+            prev = pending[-1]
             merged_start = prev["start_char"]
             merged_end = tail["end_char"]
             merged_text = text[merged_start:merged_end]
-            merged_tokens = self.get_token_count(merged_text)
+
+            _, tail_j = spans.pop()
+            prev_i, _ = spans[-1]
+            spans[-1] = (prev_i, tail_j)
+            if count_span:
+                merged_tokens = count_span(prev_i, tail_j)
+            else:
+                merged_tokens = self.get_token_count(merged_text)
 
             prev["text"] = merged_text
             prev["start_char"] = merged_start
             prev["end_char"] = merged_end
             prev["token_count"] = merged_tokens
 
-        return chunks
+        yield from pending
 
     def chunk(self, text: str, doc_id: Optional[str] = None,
               chunk_size: int = 800,
-              overlap: int = 100) -> List[Dict[str, Any]]:
+              overlap: int = 100,
+              normalized: bool = False) -> List[Dict[str, Any]]:
+
+        return list(self.iter_chunks(text, doc_id=doc_id, chunk_size=chunk_size,
+                                     overlap=overlap, normalized=normalized))
+
+    def iter_chunks(self, text: str, doc_id: Optional[str] = None,
+                    chunk_size: int = 800,
+                    overlap: int = 100,
+                    normalized: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        То же, что chunk, но отдаёт чанки по мере нарезки,
+        не собирая список чанков всего документа.
+        normalized=True - текст уже прошёл normalize_text.
+        """
 
-        text = self.normalize_text(text)
-        chunks = self._sliding_window_chunk(
+        if not normalized:
+            text = self.normalize_text(text)
+        yield from self._iter_sliding_window(
             text=text, doc_id=doc_id, chunk_size=chunk_size, overlap=overlap)
 
-        return chunks
+    def chunk_many(self, documents: Iterable[Tuple[str, Optional[str]]],
+                   chunk_size: int = 800,
+                   overlap: int = 100,
+                   workers: Optional[int] = None,
+                   max_pending: Optional[int] = None,
+                   return_exceptions: bool = False
+                   ) -> Iterator[Union[List[Dict[str, Any]], Exception]]:
+        """
+        Чанкует документы (пары text, doc_id) в пуле процессов
+        и отдаёт списки чанков в порядке входных документов.
+
+        Документы читаются из итератора лениво: в работе одновременно
+        не больше max_pending (по умолчанию 2 * workers), поэтому память
+        не растёт с размером выборки. При return_exceptions ошибка
+        документа отдаётся на его месте вместо чанков, иначе пробрасывается.
+        При workers <= 1 чанкует в текущем процессе.
+        """
+
+        workers = workers or os.cpu_count() or 1
+        max_pending = max_pending or 2 * workers
+
+        if workers <= 1:
+            for text, doc_id in documents:
+                try:
+                    yield self.chunk(text, doc_id=doc_id, chunk_size=chunk_size, overlap=overlap)
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    yield e
+            return
+
+        pool = self._get_pool(workers)
+        pending = deque()
+
+        def next_result():
+            try:
+                return pending.popleft().result()
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        for text, doc_id in documents:
+            if len(pending) >= max_pending:
+                yield next_result()
+            pending.append(pool.submit(_chunk_in_worker, text, doc_id, chunk_size, overlap))
+
+        while pending:
+            yield next_result()
+
+    def _get_pool(self, workers: int) -> ProcessPoolExecutor:
+        if self._pool is None or self._pool_workers != workers:
+            self.close()
+            # spawn вместо fork: родитель может держать потоки и CUDA-контекст
+            # модели эмбеддингов, и форк такого процесса может зависнуть.
+            self._pool = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker,
+                                             initargs=(self,))
+            self._pool_workers = workers
+        return self._pool
+
+    def close(self) -> None:
+        """
+        Останавливает пул процессов chunk_many.
+        """
+
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+            self._pool_workers = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Пул не передаётся в процессы-воркеры.
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        state["_pool_workers"] = 0
+        return state
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import html
+import re
+import unicodedata
+
+
+class TextNormalizer:
+    """
+    Нормализация текста документа, построенная один раз на чанкер.
+
+    Результат побайтно совпадает с BaseChunker._normalize_base
+    и _normalize_personal, но регулярные выражения скомпилированы
+    заранее, а каждый шаг пропускается, если в тексте нет символов,
+    без которых он ничего не меняет: тегов, тире, лишних пробелов,
+    ссылок, телефонов, почт.
+
+    Последние нормализованные документы кэшируются по хэшу исходного
+    текста, поэтому повторная нарезка того же документа не нормализует
+    его заново.
+    """
+
+    QUOTES = [('«', '"'), ('»', '"'), ('“', '"'), ('”', '"'), ('„', '"'), ("‘", "'"), ("’", "'")]
+
+    TAG_RE = re.compile(r"<[^>]+>")
+    DASH_RE = re.compile(r"[—–]+")
+    # Пробельный символ, отличный от пробела, \n и \t.
+    ODD_SPACE_RE = re.compile(r"[^\S\n\t ]")
+    NEWLINES_RE = re.compile(r"\n\s*\n+")
+
+    URL_RE = re.compile(r'https?://\S+')
+    PHONE_RE = re.compile(r'\bтел[:\.]?\s*\+?\d[\d\-\s\(\)]{5,}', flags=re.I)
+    # Все написания "тел", которые находит PHONE_RE с re.I (включая старославянские т).
+    PHONE_MARKERS = [a + b + c for a in "тТᲄᲅ" for b in "еЕ" for c in "лЛ"]
+    # Совпадения \S+@\S+ всегда начинаются с начала слова, а проверка
+    # (?<!\S) не даёт начинать перебор с каждого символа внутри слова.
+    EMAIL_RE = re.compile(r'(?<!\S)\S+@\S+')
+
+    def __init__(self, max_cached: int = 16):
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def normalize(self, text: str) -> str:
+        """
+        Нормализует текст, используя кэш по хэшу исходного текста.
+        """
+
+        if not self.max_cached:
+            return self.normalize_uncached(text)
+
+        key = self.digest(text)
+        normalized: Optional[str] = self._cache.get(key)
+        if normalized is not None:
+            self._cache.move_to_end(key)
+            return normalized
+
+        normalized = self.normalize_uncached(text)
+        self._cache[key] = normalized
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+        return normalized
+
+    def normalize_uncached(self, text: str) -> str:
+        text = self.normalize_base(text)
+        text = self.normalize_personal(text)
+
+        return text
+
+    def normalize_base(self, text: str) -> str:
+        if not text.isascii():
+            text = unicodedata.normalize("NFC", text)
+        text = html.unescape(text)
+        if "<" in text:
+            text = self.TAG_RE.sub(" ", text)
+        for quote, replacement in self.QUOTES:
+            if quote in text:
+                text = text.replace(quote, replacement)
+        if "—" in text or "–" in text:
+            text = self.DASH_RE.sub("-", text)
+        # То же, что re.sub(r"[^\S\n\t]+", " ", text): редкие пробельные
+        # символы заменяются регуляркой, а серии пробелов схлопываются str.replace.
+        text = self.ODD_SPACE_RE.sub(" ", text)
+        while "  " in text:
+            text = text.replace("  ", " ")
+        text = self.NEWLINES_RE.sub("\n\n", text)
+        text = text.strip()
+
+        return text
+
+    def normalize_personal(self, text: str) -> str:
+        if "://" in text:
+            text = self.URL_RE.sub('[URL удалён]', text)
+        if any(marker in text for marker in self.PHONE_MARKERS):
+            text = self.PHONE_RE.sub('[телефон удалён]', text)
+        if "@" in text:
+            text = self.EMAIL_RE.sub('[email удалён]', text)
+
+        return text
@@ -1,3 +1,4 @@
+from typing import Any, Dict, Iterator
 from chunkers.base_chunker import BaseChunker
 
 
@@ -12,8 +13,19 @@ class TokenChunker(BaseChunker):
         количеству токенов с перекрытием.
         """
 
+        return list(self.iter_chunks_by_size(text, chunk_size, overlap, with_tokens=True))
+
+    def iter_chunks_by_size(self, text: str, chunk_size: int = 600,
+                            overlap: int = 100,
+                            with_tokens: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Генератор чанков chunk_tokens_by_size.
+
+        Чанки отдаются по одному, а id токенов чанка ("tokens")
+        не сохраняются, если не запрошены with_tokens.
+        """
+
         tokens = self.tokenize(text)
-        chunks = []
         i = 0
         n = len(tokens)
         step = chunk_size - overlap
@@ -24,12 +36,12 @@ class TokenChunker(BaseChunker):
         while i < n:
             end = min(i + chunk_size, n)
             chunk_ids = tokens[i:end]
-            chunks.append({
-                "tokens": chunk_ids,
+            chunk = {
                 "text": self.detokenize(chunk_ids),
                 "start_token": i,
                 "end_token": end
-            })
+            }
+            if with_tokens:
+                chunk = {"tokens": chunk_ids, **chunk}
+            yield chunk
             i += step
-
-        return chunks
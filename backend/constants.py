@@ -6,3 +6,4 @@ EMBEDDER_VER = "1.0"
 QDRANT_COLLECTION_NAME = "legal_rag"
 
 LLM_NAME = "qwen3:8b"
+LLM_TOKENIZER_NAME = "Qwen/Qwen3-8B"
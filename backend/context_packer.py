@@ -0,0 +1,257 @@
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Tuple
+from chunkers.base_chunker import BaseChunker
+
+
+class ContextPacker:
+    """
+    Упаковывает найденные документы в контекст LLM
+    с бюджетом в реальных токенах модели.
+    """
+
+    OMISSION_MARK = "\n[...]\n"
+
+    def __init__(self,
+                 tokenizer,
+                 token_budget: int = 8192,
+                 grow_step: int = 64):
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+        self.grow_step = grow_step
+        self.chunker = BaseChunker(tokenizer)
+
+        self._omission_tokens = self.count_tokens(self.OMISSION_MARK)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.chunker.tokenize(text))
+
+    def _header(self, index: int, doc_id: str) -> str:
+        return f"<document index='{index}'>\n  <meta>\n    <id>{doc_id}</id>\n  </meta>\n  <content>\n"
+
+    def _footer(self) -> str:
+        return "\n  </content>\n</document>\n"
+
+    def _allocate(self, needs: List[int], weights: List[float], budget: int) -> List[int]:
+        """
+        Распределяет бюджет токенов между документами пропорционально
+        их скору. Неиспользованный остаток документов, которые целиком
+        помещаются в свою долю, делится между остальными.
+        """
+
+        allocation = [0] * len(needs)
+        pending = set(range(len(needs)))
+        left = budget
+
+        while pending and left > 0:
+            total_weight = sum(weights[i] for i in pending)
+            satisfied = [i for i in pending
+                         if needs[i] <= left * weights[i] / total_weight]
+
+            if not satisfied:
+                for i in pending:
+                    allocation[i] = int(left * weights[i] / total_weight)
+                break
+
+            for i in satisfied:
+                allocation[i] = needs[i]
+                left -= needs[i]
+                pending.discard(i)
+
+        return allocation
+
+    def _hit_token_ranges(self, text: str, starts: List[int], ends: List[int],
+                          hits: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """
+        Переводит символьные границы найденных чанков в диапазоны токенов.
+        """
+
+        ranges = []
+
+        for hit in sorted(hits, key=lambda h: h.get("score") or 0.0, reverse=True):
+            start_char = hit.get("start_char")
+            end_char = hit.get("end_char")
+
+            if start_char is None or end_char is None:
+                chunk_text = hit.get("text") or ""
+                start_char = text.find(chunk_text) if chunk_text else -1
+                if start_char == -1:
+                    continue
+                end_char = start_char + len(chunk_text)
+
+            lo = bisect_right(ends, start_char)
+            hi = bisect_left(starts, end_char)
+            if lo < hi:
+                ranges.append((lo, hi))
+
+        return ranges
+
+    def _covered(self, spans: List[List[int]]) -> List[Tuple[int, int]]:
+        merged = []
+        for lo, hi in sorted(spans):
+            if merged and lo <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+            else:
+                merged.append((lo, hi))
+        return merged
+
+    def _select_spans(self, n_tokens: int, hits: List[Tuple[int, int]],
+                      budget: int) -> List[Tuple[int, int]]:
+        """
+        Набирает в бюджет сначала самые релевантные чанки,
+        затем расширяет их соседним текстом в обе стороны.
+        """
+
+        spans: List[List[int]] = []
+        remaining = budget
+
+        # Покрытые токены отмечаются в маске, чтобы каждый шаг
+        # списывал из бюджета только новые токены без пересчёта всех отрезков.
+        coverage = bytearray(n_tokens)
+
+        def cover(lo: int, hi: int) -> int:
+            added = coverage.count(0, lo, hi)
+            coverage[lo:hi] = b"\x01" * (hi - lo)
+            return added
+
+        for lo, hi in hits:
+            if remaining <= 0:
+                break
+
+            if hi - lo > remaining:
+                center = (lo + hi) // 2
+                lo = max(lo, center - remaining // 2)
+                hi = lo + remaining
+            spans.append([lo, hi])
+            remaining -= cover(lo, hi)
+
+        grown = True
+        while remaining > 0 and grown:
+            grown = False
+            for span in spans:
+                for side in (0, 1):
+                    if remaining <= 0:
+                        break
+
+                    step = min(self.grow_step, remaining)
+                    if side == 0 and span[0] > 0:
+                        lo, hi = max(0, span[0] - step), span[0]
+                        span[0] = lo
+                    elif side == 1 and span[1] < n_tokens:
+                        lo, hi = span[1], min(n_tokens, span[1] + step)
+                        span[1] = hi
+                    else:
+                        continue
+
+                    grown = True
+                    remaining -= cover(lo, hi)
+
+        return self._covered(spans)
+
+    def _token_offsets(self, text: str) -> Tuple[List[int], List[int]]:
+        """
+        Символьные границы токенов текста: начала и концы.
+        """
+
+        encoding = self.tokenizer(
+            text, add_special_tokens=False, return_offsets_mapping=True)
+        offsets = encoding["offset_mapping"]
+
+        return [s for s, _ in offsets], [e for _, e in offsets]
+
+    def _pack_document(self, text: str, starts: List[int], ends: List[int],
+                       hits: List[Dict[str, Any]], budget: int) -> Tuple[str, int]:
+        """
+        Вырезает из текста документа фрагменты, которые помещаются в бюджет.
+
+        Возвращает текст и число токенов в нём, посчитанное по разбиению
+        всего документа: фрагменты плюс отметки пропусков.
+        """
+
+        n_tokens = len(starts)
+
+        if n_tokens <= budget:
+            return text, n_tokens
+
+        hit_ranges = self._hit_token_ranges(text, starts, ends, hits)
+        content_budget = budget - self._omission_tokens * (len(hit_ranges) + 1)
+        if content_budget <= 0:
+            return "", 0
+
+        if not hit_ranges:
+            hit_ranges = [(0, min(n_tokens, content_budget))]
+
+        spans = self._select_spans(n_tokens, hit_ranges, content_budget)
+        packed = self.OMISSION_MARK.join(
+            text[starts[lo]:ends[hi - 1]] for lo, hi in spans)
+        tokens = sum(hi - lo for lo, hi in spans) + self._omission_tokens * (len(spans) - 1)
+
+        if spans[0][0] > 0:
+            packed = self.OMISSION_MARK.lstrip("\n") + packed
+            tokens += self._omission_tokens
+        if spans[-1][1] < n_tokens:
+            packed = packed + self.OMISSION_MARK.rstrip("\n")
+            tokens += self._omission_tokens
+
+        return packed, tokens
+
+    def pack(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Формирует блоки документов для контекста.
+
+        Возвращает список словарей с ID документа, готовым блоком
+        и количеством символов и токенов в нём.
+        """
+
+        texts = []
+        token_offsets = []
+        hits = []
+        wrappers = []
+        needs = []
+
+        for i, doc in enumerate(documents, 1):
+            doc_id = doc.get("doc_id", "unknown")
+            full_text = doc.get("full_text")
+
+            if full_text:
+                text = self.chunker.normalize_text(full_text)
+                doc_hits = doc.get("chunks") or [
+                    {"text": doc.get("best_chunk"), "score": doc.get("score")}]
+            else:
+                text = doc.get("best_chunk") or ""
+                doc_hits = []
+
+            header = self._header(i, doc_id)
+            footer = self._footer()
+            wrapper_tokens = self.count_tokens(header) + self.count_tokens(footer)
+
+            starts, ends = self._token_offsets(text)
+
+            texts.append(text)
+            token_offsets.append((starts, ends))
+            hits.append(doc_hits)
+            wrappers.append((header, footer, wrapper_tokens))
+            needs.append(wrapper_tokens + len(starts))
+
+        weights = [max(doc.get("score") or 0.0, 0.0) + 1e-3 for doc in documents]
+        allocation = self._allocate(needs, weights, self.token_budget)
+
+        packed = []
+        for doc, text, (starts, ends), doc_hits, (header, footer, wrapper_tokens), budget in zip(
+                documents, texts, token_offsets, hits, wrappers, allocation):
+            content_budget = budget - wrapper_tokens
+            if content_budget <= 0 or not text:
+                continue
+
+            content, content_tokens = self._pack_document(text, starts, ends, doc_hits, content_budget)
+            if not content:
+                continue
+
+            block = f"{header}{content}{footer}"
+            packed.append({
+                "doc_id": doc.get("doc_id", "unknown"),
+                "block": block,
+                "chars": len(content),
+                "tokens": content_tokens,
+            })
+
+        return packed
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+def page_fingerprint(cases_urls: List[str]) -> str:
+    """Отпечаток страницы списка дел: хэш ссылок на дела в порядке их следования"""
+
+    return hashlib.blake2b("\n".join(cases_urls).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class CrawlState:
+    """
+    Состояние инкрементального обхода базы ФАС, сохраняемое в JSON между запусками.
+
+    frontier - следующая страница незавершённого обхода: прерванный запуск
+    продолжается с неё, а не с первой страницы, где все дела уже известны.
+    page_fingerprints - отпечатки полностью разобранных страниц: если
+    страница не изменилась, все её дела уже в БД. last_case - самое новое
+    из разобранных дел. failed_cases - дела, которые не удалось разобрать
+    или сохранить целиком (включая упавшие страницы документов): обход
+    останавливается на известных страницах и сам до них не дойдёт,
+    поэтому они повторяются отдельно (cases_to_retry).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frontier: Optional[int] = None
+        self.page_fingerprints: Dict[str, str] = {}
+        self.last_case: Optional[Dict[str, Any]] = None
+        self.last_run_finished_at: Optional[str] = None
+        self.failed_cases: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as state_file:
+                state = json.load(state_file)
+
+            self.frontier = state.get("frontier")
+            self.page_fingerprints = state.get("page_fingerprints", {})
+            self.last_case = state.get("last_case")
+            self.last_run_finished_at = state.get("last_run_finished_at")
+            self.failed_cases = state.get("failed_cases", {})
+
+    def save(self) -> None:
+        state = {
+            "frontier": self.frontier,
+            "page_fingerprints": self.page_fingerprints,
+            "last_case": self.last_case,
+            "last_run_finished_at": self.last_run_finished_at,
+            "failed_cases": self.failed_cases,
+        }
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Запись через временный файл, чтобы прерванный запуск не оставил битый JSON.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def start_page(self) -> int:
+        return self.frontier or 1
+
+    def page_unchanged(self, page: int, fingerprint: str) -> bool:
+        return self.page_fingerprints.get(str(page)) == fingerprint
+
+    def record_case(self, case: Dict[str, Any]) -> None:
+        case_date = case.get("case_date") or ""
+        if self.last_case is None or case_date >= (self.last_case.get("case_date") or ""):
+            self.last_case = {
+                "case_url": case["case_url"],
+                "raw_id": case["raw_id"],
+                "case_date": case.get("case_date"),
+            }
+
+    def record_failure(self, case_url: str, page: Optional[int], error: Any) -> None:
+        failure = self.failed_cases.setdefault(case_url, {"page": page, "attempts": 0})
+        if page is not None:
+            failure["page"] = page
+        failure["attempts"] += 1
+        failure["error"] = str(error)[:500]
+        self.save()
+
+    def record_success(self, case: Dict[str, Any]) -> None:
+        self.failed_cases.pop(case["case_url"], None)
+        self.record_case(case)
+
+    def cases_to_retry(self, max_attempts: int) -> List[str]:
+        return [case_url for case_url, failure in self.failed_cases.items()
+                if failure["attempts"] < max_attempts]
+
+    def finish_page(self, page: int, fingerprint: Optional[str]) -> None:
+        """
+        Отмечает страницу разобранной. Отпечаток сохраняется только для
+        страниц без ошибок, чтобы страница с упавшими делами не считалась
+        неизменной; сами упавшие дела повторяются через failed_cases.
+        """
+
+        if fingerprint is not None:
+            self.page_fingerprints[str(page)] = fingerprint
+        else:
+            self.page_fingerprints.pop(str(page), None)
+
+        self.frontier = page + 1
+        self.save()
+
+    def finish_run(self) -> None:
+        self.frontier = None
+        self.last_run_finished_at = datetime.now().isoformat(timespec="seconds")
+        self.save()
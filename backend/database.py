@@ -1,7 +1,7 @@
 import os
 from datetime import datetime
 from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy import create_engine, delete, select, func, MetaData
+from sqlalchemy import create_engine, delete, select, func, text, MetaData
 from models import Base, Case, Participant, CaseParticipant, Document
 from sqlalchemy.exc import DataError
 from dotenv import load_dotenv
@@ -28,6 +28,20 @@ def create_metadata(engine):
     return metadata
 
 
+# create_all не добавляет индексы в уже существующие таблицы, поэтому индексы
+# для поиска известных дел и документов по URL создаются явно (имена как у index=True в models.py).
+URL_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_cases_url ON cases (url)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_url ON documents (url)",
+]
+
+
+def ensure_url_indexes(engine):
+    with engine.begin() as conn:
+        for statement in URL_INDEXES:
+            conn.execute(text(statement))
+
+
 def convert_to_date(date_str):
     if not date_str:
         return None
@@ -49,6 +63,8 @@ async def init_db():
     
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for statement in URL_INDEXES:
+            await conn.execute(text(statement))
 
     await engine.dispose()
     print("Database tables checked/created.")
@@ -169,6 +185,62 @@ def save_to_db(case: dict, linked_documents: list, engine, metadata):
                     print(f"Document saving error {doc['document_id']}: {e}")
 
 
+def get_known_case_urls(case_urls: list, engine, metadata) -> set:
+    """Возвращает те ссылки на дела из case_urls, что уже сохранены в БД, одним запросом"""
+    if not case_urls:
+        return set()
+
+    cases = metadata.tables['cases']
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(cases.c.url).where(cases.c.url.in_(case_urls))
+        )
+        return {row.url for row in rows}
+
+
+def get_known_document_urls(doc_urls: list, engine, metadata) -> set:
+    """
+    Возвращает те ссылки на документы из doc_urls, что уже сохранены в БД, одним запросом.
+    Сюда входят и документы, ещё не загруженные в Qdrant: их текст уже в БД,
+    и в Qdrant их догружает parser.process_case (см. get_unindexed_documents).
+    """
+    if not doc_urls:
+        return set()
+
+    documents = metadata.tables['documents']
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(documents.c.url).where(documents.c.url.in_(doc_urls))
+        )
+        return {row.url for row in rows}
+
+
+def get_unindexed_documents(engine, metadata, case_raw_id=None) -> list:
+    """
+    Возвращает сохранённые документы, которых нет в Qdrant (added_to_qdrant не true),
+    в виде словарей с document_id, document_text и url.
+    С case_raw_id - только документы этого дела.
+    """
+    documents = metadata.tables['documents']
+    cases = metadata.tables['cases']
+
+    query = select(documents.c.doc_id, documents.c.full_text, documents.c.url).where(
+        documents.c.added_to_qdrant.is_not(True),
+        documents.c.full_text.is_not(None))
+    if case_raw_id is not None:
+        query = query.select_from(
+            documents.join(cases, cases.c.id == documents.c.case_id)
+        ).where(cases.c.raw_id == case_raw_id)
+
+    with engine.connect() as conn:
+        rows = conn.execute(query).all()
+
+    return [{'document_id': row.doc_id, 'document_text': row.full_text, 'url': row.url}
+            for row in rows]
+
+
 def update_document_qdrant_status(doc_id: str, success: bool, version: str, engine, metadata):
     documents = metadata.tables['documents']
 
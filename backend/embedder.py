@@ -1,21 +1,29 @@
 from collections import defaultdict
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List
 from qdrant_client import QdrantClient, models
-from FlagEmbedding import BGEM3FlagModel
 from tqdm import tqdm
-from transformers import AutoTokenizer
 from uuid import uuid4
 from constants import EMBEDDER_VER
 
+if TYPE_CHECKING:
+    from FlagEmbedding import BGEM3FlagModel
+    from transformers import AutoTokenizer
+
 
 class Embedder:
+    # Поля компактного payload: текст чанка не хранится, ретривер
+    # восстанавливает его по смещениям из текста документа в Postgres.
+    COMPACT_PAYLOAD_FIELDS = ("doc_id", "index", "start_char", "end_char", "token_count", "url")
+
     def __init__(self, client: QdrantClient,
-                 model: BGEM3FlagModel,
-                 tokenizer: AutoTokenizer):
+                 model: "BGEM3FlagModel",
+                 tokenizer: "AutoTokenizer",
+                 compact_payload: bool = False):
         self.client: QdrantClient = client
-        self.model: BGEM3FlagModel = model
-        self.tokenizer: AutoTokenizer = tokenizer
+        self.model: "BGEM3FlagModel" = model
+        self.tokenizer: "AutoTokenizer" = tokenizer
         self.version: str = EMBEDDER_VER
+        self.compact_payload = compact_payload
 
     def create_qdrant_collection(self,
                                  collection_name: str = "legal_rag") -> None:
@@ -108,6 +116,77 @@ class Embedder:
             values=sparse_values
         )
 
+    def _build_point(self, chunk: Dict[str, Any], dense_vector, sparse_weights,
+                     colbert_vectors) -> models.PointStruct:
+        converted_sparse = self.convert_sparse_vector(sparse_weights)
+
+        id = uuid4()
+
+        if self.compact_payload:
+            payload = {field: chunk[field] for field in self.COMPACT_PAYLOAD_FIELDS if field in chunk}
+        else:
+            payload = chunk
+
+        return models.PointStruct(
+            id=id,
+            payload=payload,
+            vector={
+                "dense": dense_vector,
+                "sparse": converted_sparse,
+                "colbert": colbert_vectors
+            }
+        )
+
+    def insert_chunks(self, chunks: Iterable[Dict[str, Any]],
+                      collection_name: str = "legal_rag",
+                      batch_size: int = 25) -> int:
+        """
+        Эмбеддит и загружает в Qdrant поток чанков пачками по batch_size.
+
+        Чанки читаются из итератора по мере надобности, а эмбеддинги
+        пачки освобождаются после upsert, поэтому память не зависит
+        от размера документа. Возвращает число загруженных чанков.
+        """
+
+        total = 0
+        batch = []
+
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                total += self._insert_chunk_batch(batch, collection_name)
+                batch = []
+
+        if batch:
+            total += self._insert_chunk_batch(batch, collection_name)
+
+        print(f"Загружено {total} чанков в коллекцию {collection_name}")
+
+        return total
+
+    def _insert_chunk_batch(self, chunks: List[Dict[str, Any]], collection_name: str) -> int:
+        model_output = self.model.encode([chunk.get("text") for chunk in chunks],
+                                         batch_size=len(chunks),
+                                         return_dense=True,
+                                         return_sparse=True,
+                                         return_colbert_vecs=True)
+
+        points = [
+            self._build_point(chunk, dense_vector, sparse_weights, colbert_vectors)
+            for chunk, dense_vector, sparse_weights, colbert_vectors in zip(
+                chunks,
+                model_output.get("dense_vecs"),
+                model_output.get("lexical_weights"),
+                model_output.get("colbert_vecs"))
+        ]
+
+        self.client.upsert(
+            collection_name=collection_name,
+            points=points
+        )
+
+        return len(points)
+
     def insert_to_qdrant(self, embeddings: List[Dict[str, Any]],
                          collection_name: str = "legal_rag",
                          batch_size: int = 25) -> None:
@@ -123,19 +202,7 @@ class Embedder:
             sparse_weights = embedding.get("sparse_weights")
             colbert_vectors = embedding.get("colbert_vectors")
 
-            converted_sparse = self.convert_sparse_vector(sparse_weights)
-
-            id = uuid4()
-
-            point = models.PointStruct(
-                id=id,
-                payload=chunk,
-                vector={
-                    "dense": dense_vector,
-                    "sparse": converted_sparse,
-                    "colbert": colbert_vectors
-                }
-            )
+            point = self._build_point(chunk, dense_vector, sparse_weights, colbert_vectors)
             points_batch.append(point)
 
             if len(points_batch) >= batch_size:
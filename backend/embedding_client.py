@@ -0,0 +1,230 @@
+import json
+import os
+import socket
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from constants import EMBEDDING_MODEL
+
+# Кадр протокола: размер JSON-заголовка и размер бинарной части (по 4 байта,
+# big-endian), затем JSON и сырые float32-буферы векторов. Формат только с данными:
+# в отличие от pickle, кадр от чужого клиента не может исполнить код.
+FRAME_HEADER = struct.Struct("!II")
+# Запрос - только тексты, ответ может содержать ColBERT-векторы всего батча.
+MAX_REQUEST_SIZE = int(os.getenv("EMBEDDING_MAX_REQUEST_BYTES", 64 * 1024 * 1024))
+MAX_RESPONSE_SIZE = int(os.getenv("EMBEDDING_MAX_RESPONSE_BYTES", 1024 * 1024 * 1024))
+
+
+def pack_frame(message: Dict[str, Any], buffers: Optional[List[bytes]] = None) -> bytes:
+    header = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    binary = b"".join(buffers or [])
+    return FRAME_HEADER.pack(len(header), len(binary)) + header + binary
+
+
+def check_frame_size(header_size: int, binary_size: int, max_size: int) -> None:
+    if header_size + binary_size > max_size:
+        raise ValueError(f"Embedding frame of {header_size + binary_size} bytes exceeds {max_size}")
+
+
+def _pack_array(array, buffers: List[bytes], offset: int) -> Tuple[Dict[str, Any], int]:
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    buffers.append(array.tobytes())
+    return {"shape": list(array.shape), "offset": offset}, offset + array.nbytes
+
+
+def _unpack_array(meta: Dict[str, Any], binary: memoryview) -> np.ndarray:
+    shape = tuple(meta["shape"])
+    size = int(np.prod(shape)) * 4
+    start = meta["offset"]
+    if start < 0 or start + size > len(binary):
+        raise ValueError("Embedding frame buffer is out of range")
+    return np.frombuffer(binary[start:start + size], dtype=np.float32).reshape(shape).copy()
+
+
+def pack_output(output: Dict[str, Any], single: bool) -> Tuple[Dict[str, Any], List[bytes]]:
+    """
+    Переводит ответ BGEM3FlagModel.encode в JSON-описание и список
+    float32-буферов: плотные и ColBERT-векторы - массивы, лексические
+    веса - списки индексов и значений.
+    """
+
+    buffers: List[bytes] = []
+    offset = 0
+    meta: Dict[str, Any] = {"single": single, "dense_vecs": None,
+                            "lexical_weights": None, "colbert_vecs": None}
+
+    if output.get("dense_vecs") is not None:
+        meta["dense_vecs"], offset = _pack_array(output["dense_vecs"], buffers, offset)
+
+    if output.get("lexical_weights") is not None:
+        weights = [output["lexical_weights"]] if single else output["lexical_weights"]
+        meta["lexical_weights"] = [{"indices": [str(index) for index in item],
+                                    "values": [float(value) for value in item.values()]}
+                                   for item in weights]
+
+    if output.get("colbert_vecs") is not None:
+        vecs = [output["colbert_vecs"]] if single else output["colbert_vecs"]
+        meta["colbert_vecs"] = []
+        for vec in vecs:
+            vec_meta, offset = _pack_array(vec, buffers, offset)
+            meta["colbert_vecs"].append(vec_meta)
+
+    return meta, buffers
+
+
+def unpack_output(meta: Dict[str, Any], binary: bytes) -> Dict[str, Any]:
+    """Восстанавливает из pack_output ответ в формате BGEM3FlagModel.encode"""
+
+    binary = memoryview(binary)
+    single = meta["single"]
+    result: Dict[str, Any] = {"dense_vecs": None, "lexical_weights": None, "colbert_vecs": None}
+
+    if meta["dense_vecs"] is not None:
+        result["dense_vecs"] = _unpack_array(meta["dense_vecs"], binary)
+
+    if meta["lexical_weights"] is not None:
+        weights = [dict(zip(item["indices"], item["values"])) for item in meta["lexical_weights"]]
+        result["lexical_weights"] = weights[0] if single else weights
+
+    if meta["colbert_vecs"] is not None:
+        vecs = [_unpack_array(vec_meta, binary) for vec_meta in meta["colbert_vecs"]]
+        result["colbert_vecs"] = vecs[0] if single else vecs
+
+    return result
+
+
+def parse_address(address: str) -> Tuple[str, Union[str, Tuple[str, int]]]:
+    """
+    Разбирает адрес сервиса эмбеддингов.
+
+    "unix:/path/to.sock" - unix-сокет, "host:port" - TCP.
+    """
+
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+
+    host, port = address.rsplit(":", 1)
+    return "tcp", (host, int(port))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        part = sock.recv(size - len(buffer))
+        if not part:
+            raise ConnectionError("Embedding service closed the connection")
+        buffer.extend(part)
+    return bytes(buffer)
+
+
+class RemoteBGEM3Model:
+    """
+    Тонкий клиент к процессу, который держит BGE-M3.
+
+    Повторяет интерфейс BGEM3FlagModel.encode, поэтому подставляется
+    вместо модели в AsyncRetriever и Embedder без изменений.
+    Каждый поток использует своё соединение.
+    """
+
+    def __init__(self, address: str, timeout: float = 60.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        family, target = parse_address(self.address)
+        if family == "unix":
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.timeout)
+        sock.connect(target)
+        return sock
+
+    def _get_socket(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._connect()
+            self._local.sock = sock
+        return sock
+
+    def _drop_socket(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            finally:
+                self._local.sock = None
+
+    def _call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        payload = pack_frame(request)
+
+        for attempt in range(2):
+            sock = self._get_socket()
+            try:
+                sock.sendall(payload)
+                header_size, binary_size = FRAME_HEADER.unpack(
+                    _recv_exactly(sock, FRAME_HEADER.size))
+                check_frame_size(header_size, binary_size, MAX_RESPONSE_SIZE)
+                response = json.loads(_recv_exactly(sock, header_size))
+                binary = _recv_exactly(sock, binary_size)
+                break
+            except (ConnectionError, OSError, ValueError):
+                # Соединение могло быть закрыто после рестарта сервиса
+                # или рассинхронизировано битым кадром.
+                self._drop_socket()
+                if attempt == 1:
+                    raise
+
+        if "error" in response:
+            raise RuntimeError(f"Embedding service error: {response['error']}")
+
+        if request.get("ping"):
+            return response["result"]
+
+        return unpack_output(response["result"], binary)
+
+    def encode(self,
+               sentences: Union[str, List[str]],
+               batch_size: int = 256,
+               max_length: int = 8192,
+               return_dense: bool = True,
+               return_sparse: bool = False,
+               return_colbert_vecs: bool = False) -> Dict[str, Any]:
+        return self._call({
+            "texts": sentences,
+            "batch_size": batch_size,
+            "max_length": max_length,
+            "return_dense": return_dense,
+            "return_sparse": return_sparse,
+            "return_colbert_vecs": return_colbert_vecs,
+        })
+
+    def ping(self) -> bool:
+        return self._call({"ping": True}) == "pong"
+
+    def close(self) -> None:
+        self._drop_socket()
+
+
+def load_embedding_model(device: str = 'cuda'):
+    """
+    Возвращает модель эмбеддингов.
+
+    Если задан EMBEDDING_SERVICE_ADDRESS, возвращает клиента к общему
+    процессу с моделью, иначе загружает BGE-M3 в текущий процесс.
+    """
+
+    address = os.getenv("EMBEDDING_SERVICE_ADDRESS")
+    if address:
+        model = RemoteBGEM3Model(address)
+        model.ping()
+        return model
+
+    from FlagEmbedding import BGEM3FlagModel
+
+    return BGEM3FlagModel(EMBEDDING_MODEL, use_fp16=True, device=device)
@@ -0,0 +1,258 @@
+"""
+Отдельный процесс с моделью BGE-M3.
+
+Держит единственную копию модели в памяти GPU и обслуживает запросы
+на эмбеддинги от нескольких воркеров API и от ингеста.
+Запросы, пришедшие почти одновременно, склеиваются в один батч.
+
+Запуск:
+    python embedding_server.py --address unix:/tmp/fas_embedder.sock
+    python embedding_server.py --address 127.0.0.1:8100
+
+Сервис не проверяет, кто к нему подключается, поэтому его не стоит
+открывать наружу: в compose.yml он слушает unix-сокет в общем томе.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from constants import EMBEDDING_MODEL
+from embedding_client import (FRAME_HEADER, MAX_REQUEST_SIZE, check_frame_size, pack_frame,
+                              pack_output, parse_address)
+
+REQUEST_FLAGS = ("return_dense", "return_sparse", "return_colbert_vecs")
+
+
+def validate_request(request: Any) -> Dict[str, Any]:
+    """
+    Проверяет запрос на эмбеддинги и возвращает его с параметрами по умолчанию.
+    """
+
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+
+    texts = request.get("texts")
+    if not isinstance(texts, str) and not (
+            isinstance(texts, list) and all(isinstance(text, str) for text in texts)):
+        raise ValueError("texts must be a string or a list of strings")
+
+    validated = {"texts": texts}
+    for flag in REQUEST_FLAGS:
+        validated[flag] = bool(request.get(flag, flag == "return_dense"))
+    for key, default in (("batch_size", 256), ("max_length", 8192)):
+        value = request.get(key, default)
+        if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            raise ValueError(f"{key} must be a positive integer")
+        validated[key] = value
+
+    return validated
+
+
+class EmbeddingServer:
+    def __init__(self, model, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # Модель обслуживается одним потоком: GPU всё равно последовательна.
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def _read_frame(self, reader: asyncio.StreamReader) -> Any:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        header_size, binary_size = FRAME_HEADER.unpack(header)
+        # Размер проверяется до чтения, чтобы один кадр не мог занять всю память.
+        check_frame_size(header_size, binary_size, MAX_REQUEST_SIZE)
+        message = await reader.readexactly(header_size)
+        await reader.readexactly(binary_size)
+        return json.loads(message)
+
+    def _write_frame(self, writer: asyncio.StreamWriter, message: Dict[str, Any],
+                     buffers: List[bytes] = None) -> None:
+        writer.write(pack_frame(message, buffers))
+
+    async def _handle_client(self, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await self._read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                except ValueError as e:
+                    # Слишком большой или битый кадр: поток рассинхронизирован, соединение закрывается.
+                    print(f"Rejected embedding request: {e}")
+                    self._write_frame(writer, {"error": str(e)})
+                    await writer.drain()
+                    break
+
+                if isinstance(request, dict) and request.get("ping"):
+                    self._write_frame(writer, {"result": "pong"})
+                    await writer.drain()
+                    continue
+
+                try:
+                    request = validate_request(request)
+                except ValueError as e:
+                    self._write_frame(writer, {"error": str(e)})
+                    await writer.drain()
+                    continue
+
+                future = loop.create_future()
+                await self._queue.put((request, future))
+                buffers = None
+                try:
+                    result, buffers = pack_output(await future, isinstance(request["texts"], str))
+                    response = {"result": result}
+                except Exception as e:
+                    response = {"error": str(e)}
+
+                self._write_frame(writer, response, buffers)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def _encode(self, texts: List[str], batch_size: int, max_length: int) -> Dict[str, Any]:
+        return self.model.encode(texts,
+                                 batch_size=batch_size,
+                                 max_length=max_length,
+                                 return_dense=True,
+                                 return_sparse=True,
+                                 return_colbert_vecs=True)
+
+    async def _collect_batch(self) -> List[Tuple[Dict[str, Any], asyncio.Future]]:
+        """
+        Ждёт первый запрос и добирает к нему те, что придут
+        в течение max_wait, пока не наберётся max_batch_size текстов.
+        """
+
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        n_texts = self._count_texts(batch[0][0])
+        deadline = loop.time() + self.max_wait
+
+        while n_texts < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            n_texts += self._count_texts(item[0])
+
+        return batch
+
+    @staticmethod
+    def _count_texts(request: Dict[str, Any]) -> int:
+        texts = request["texts"]
+        return 1 if isinstance(texts, str) else len(texts)
+
+    @staticmethod
+    def _slice_output(output: Dict[str, Any], request: Dict[str, Any],
+                      offset: int, count: int) -> Dict[str, Any]:
+        """
+        Вырезает из общего ответа модели часть одного запроса
+        в том же формате, что вернул бы BGEM3FlagModel.encode.
+        """
+
+        single = isinstance(request["texts"], str)
+        result = {}
+
+        for key, flag in (("dense_vecs", "return_dense"),
+                          ("lexical_weights", "return_sparse"),
+                          ("colbert_vecs", "return_colbert_vecs")):
+            if not request.get(flag):
+                result[key] = None
+                continue
+            values = output[key][offset:offset + count]
+            result[key] = values[0] if single else values
+
+        return result
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect_batch()
+
+            # Запросы с разным max_length кодируются отдельно, чтобы каждый
+            # получил ту же обрезку, что и при локальном вызове модели.
+            groups: Dict[int, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+            for item in batch:
+                groups.setdefault(item[0]["max_length"], []).append(item)
+
+            for max_length, group in groups.items():
+                await self._encode_group(loop, group, max_length)
+
+    async def _encode_group(self, loop: asyncio.AbstractEventLoop,
+                            group: List[Tuple[Dict[str, Any], asyncio.Future]],
+                            max_length: int) -> None:
+        texts: List[str] = []
+        for request, _ in group:
+            request_texts = request["texts"]
+            texts.extend([request_texts] if isinstance(request_texts, str) else request_texts)
+
+        batch_size = min([self.max_batch_size] + [request["batch_size"] for request, _ in group])
+
+        try:
+            output = await loop.run_in_executor(self._executor, self._encode,
+                                                texts, batch_size, max_length)
+        except Exception as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for request, future in group:
+            count = self._count_texts(request)
+            if not future.done():
+                future.set_result(self._slice_output(output, request, offset, count))
+            offset += count
+
+    async def serve(self, address: str) -> None:
+        family, target = parse_address(address)
+
+        if family == "unix":
+            if os.path.exists(target):
+                os.unlink(target)
+            server = await asyncio.start_unix_server(self._handle_client, path=target)
+        else:
+            host, port = target
+            server = await asyncio.start_server(self._handle_client, host=host, port=port)
+
+        print(f"Embedding service listening on {address}")
+
+        batch_task = asyncio.create_task(self._batch_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="BGE-M3 embedding service")
+    arg_parser.add_argument("--address",
+                            default=os.getenv("EMBEDDING_SERVICE_ADDRESS", "unix:/tmp/fas_embedder.sock"))
+    arg_parser.add_argument("--device", default="cuda")
+    arg_parser.add_argument("--max-batch-size", type=int, default=64)
+    arg_parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = arg_parser.parse_args()
+
+    from FlagEmbedding import BGEM3FlagModel
+
+    print("Loading embedding model...")
+    model = BGEM3FlagModel(EMBEDDING_MODEL, use_fp16=True, device=args.device)
+
+    server = EmbeddingServer(model,
+                             max_batch_size=args.max_batch_size,
+                             max_wait_ms=args.max_wait_ms)
+    asyncio.run(server.serve(args.address))
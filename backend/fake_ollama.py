@@ -0,0 +1,168 @@
+"""
+Локальная имитация сервера Ollama для тестов без GPU.
+
+Поддерживает эндпоинты, которыми пользуется бэкенд:
+/api/chat (со стримингом), /api/generate, /api/ps, /api/tags, /api/version.
+"""
+
+import argparse
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import AsyncGenerator
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from constants import LLM_NAME
+
+
+DEFAULT_REPLY = ("Согласно предоставленным документам, антимонопольный орган "
+                 "установил нарушение и выдал предписание об его устранении.")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def create_app(tokens_per_second: float = 50.0,
+               reply: str = DEFAULT_REPLY,
+               fail: bool = False,
+               prefill_delay: float = 0.0,
+               max_parallel: int = 1,
+               reply_words: int = 0) -> FastAPI:
+    """
+    Создаёт приложение, которое стримит ответ по словам
+    с заданной скоростью.
+
+    Как и настоящий Ollama на одной GPU, одновременно обслуживает
+    не больше max_parallel генераций, остальные ждут.
+
+    При fail=True все эндпоинты генерации отвечают ошибкой 500,
+    что удобно для проверки отказоустойчивости.
+    reply_words > 0 задаёт длину ответа: reply повторяется до нужного числа слов.
+    """
+
+    app = FastAPI(title="fake-ollama")
+    app.state.requests = 0
+    slots = asyncio.Semaphore(max_parallel)
+    tokens = [word + " " for word in reply.split()]
+    if reply_words > 0:
+        tokens = [tokens[i % len(tokens)] for i in range(reply_words)]
+
+    def error_response() -> JSONResponse:
+        return JSONResponse({"error": "fake backend failure"}, status_code=500)
+
+    async def stream_chat(model: str, prompt_chars: int) -> AsyncGenerator[str, None]:
+        async with slots:
+            started = asyncio.get_running_loop().time()
+            if prefill_delay:
+                await asyncio.sleep(prefill_delay)
+            prefill_done = asyncio.get_running_loop().time()
+
+            for token in tokens:
+                if tokens_per_second > 0:
+                    await asyncio.sleep(1 / tokens_per_second)
+                yield json.dumps({
+                    "model": model,
+                    "created_at": _now(),
+                    "message": {"role": "assistant", "content": token},
+                    "done": False,
+                }, ensure_ascii=False) + "\n"
+
+            finished = asyncio.get_running_loop().time()
+
+        yield json.dumps({
+            "model": model,
+            "created_at": _now(),
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((finished - started) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_chars // 4,
+            "prompt_eval_duration": int((prefill_done - started) * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int((finished - prefill_done) * 1e9),
+        }) + "\n"
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        if fail:
+            return error_response()
+
+        app.state.requests += 1
+        body = await request.json()
+        model = body.get("model", LLM_NAME)
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+
+        return StreamingResponse(stream_chat(model, prompt_chars),
+                                 media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        if fail:
+            return error_response()
+
+        body = await request.json()
+        return {
+            "model": body.get("model", LLM_NAME),
+            "created_at": _now(),
+            "response": "",
+            "done": True,
+        }
+
+    @app.get("/api/ps")
+    async def ps():
+        if fail:
+            return error_response()
+        return {"models": []}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": LLM_NAME, "model": LLM_NAME}]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    return app
+
+
+async def serve(port: int, host: str = "127.0.0.1", **app_kwargs) -> uvicorn.Server:
+    """
+    Запускает фейковый сервер в текущем event loop.
+    Возвращает сервер, остановить его можно через server.should_exit = True.
+    """
+
+    config = uvicorn.Config(create_app(**app_kwargs), host=host, port=port,
+                            lifespan="off", log_level="warning")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+
+    while not server.started:
+        if task.done():
+            raise RuntimeError(f"Fake Ollama failed to start on port {port}")
+        await asyncio.sleep(0.01)
+
+    return server
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Fake Ollama server")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=11434)
+    arg_parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    arg_parser.add_argument("--prefill-delay", type=float, default=0.0)
+    arg_parser.add_argument("--max-parallel", type=int, default=1)
+    arg_parser.add_argument("--reply-words", type=int, default=0)
+    arg_parser.add_argument("--fail", action="store_true")
+    args = arg_parser.parse_args()
+
+    uvicorn.run(create_app(tokens_per_second=args.tokens_per_second,
+                           prefill_delay=args.prefill_delay,
+                           max_parallel=args.max_parallel,
+                           reply_words=args.reply_words,
+                           fail=args.fail),
+                host=args.host, port=args.port)
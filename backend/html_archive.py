@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional, Union
+
+
+class HtmlArchive:
+    """
+    Сжатый архив загруженных страниц дел и документов ФАС в одном файле SQLite.
+
+    Таблица pages хранит для каждого URL тип страницы, время загрузки
+    и хэш содержимого, сами страницы лежат сжатыми zlib в таблице blobs
+    по хэшу, так что одинаковые страницы хранятся один раз. Повторная
+    загрузка URL заменяет запись. Страницы, пришедшие по HTTP, хранятся
+    байтами в исходной кодировке, а page_source браузера - текстом (encoding='utf-8').
+
+    Один объект можно использовать из нескольких потоков.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            fetched_at TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            encoding TEXT
+        );
+        CREATE INDEX IF NOT EXISTS pages_kind ON pages (kind);
+        CREATE TABLE IF NOT EXISTS blobs (
+            content_hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, compression_level: int = 6, readonly: bool = False):
+        self.path = path
+        self.compression_level = compression_level
+
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(self.SCHEMA)
+
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "HtmlArchive":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM pages").fetchone()[0]
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    def put(self, url: str, page: Union[str, bytes], kind: str) -> str:
+        """
+        Сохраняет страницу и возвращает хэш её содержимого.
+        """
+
+        encoding = None
+        if isinstance(page, str):
+            page = page.encode("utf-8")
+            encoding = "utf-8"
+
+        content_hash = self.content_hash(page)
+        fetched_at = datetime.now().isoformat(timespec="seconds")
+
+        with self._lock, self._conn:
+            exists = self._conn.execute("SELECT 1 FROM blobs WHERE content_hash = ?",
+                                        (content_hash,)).fetchone()
+            if not exists:
+                self._conn.execute("INSERT INTO blobs (content_hash, data) VALUES (?, ?)",
+                                   (content_hash, zlib.compress(page, self.compression_level)))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, kind, fetched_at, content_hash, encoding) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, kind, fetched_at, content_hash, encoding))
+
+        return content_hash
+
+    def get(self, url: str) -> Optional[Union[str, bytes]]:
+        """
+        Страница по URL: текст для page_source браузера, байты для
+        ответов по HTTP (кодировку определит парсер по <meta>). None, если её нет в архиве.
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blobs.data, pages.encoding FROM pages "
+                "JOIN blobs ON blobs.content_hash = pages.content_hash WHERE pages.url = ?",
+                (url,)).fetchone()
+
+        if row is None:
+            return None
+
+        data, encoding = row
+        page = zlib.decompress(data)
+
+        return page.decode(encoding) if encoding else page
+
+    def urls(self, kind: Optional[str] = None) -> Iterator[str]:
+        with self._lock:
+            if kind is None:
+                rows = self._conn.execute("SELECT url FROM pages ORDER BY url").fetchall()
+            else:
+                rows = self._conn.execute("SELECT url FROM pages WHERE kind = ? ORDER BY url",
+                                          (kind,)).fetchall()
+
+        return (row[0] for row in rows)
@@ -0,0 +1,97 @@
+"""
+Файл для локальной проверки архива страниц и повторного разбора без сайта ФАС.
+
+Загружает сохранённые страницы из fixtures/fas_documents через PageFetcher
+с архивом во временном каталоге, кладёт туда страницу дела, как её отдал бы
+браузер, и проверяет, что replay_case восстанавливает из архива те же
+document_record, что и загрузка по HTTP. Затем разбирает архив с тысячами
+копий дела в пуле процессов и печатает, сколько дел в секунду получается.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from html_archive import HtmlArchive
+from page_fetcher import PageFetcher
+from page_fetcher_test import FIXTURES_DIR, PORT, serve_fixtures
+from replay_archive import _init_worker, _replay_in_worker, replay_case
+
+BASE_URL = f"http://127.0.0.1:{PORT}"
+CASE_URL = f"{BASE_URL}/case.html"
+CASE_ID = "fas_077_07_00-1234_2024"
+DOCUMENTS = ["decision.html", "letter_without_title.html"]
+COPIES = 2000
+
+
+def fill_archive(archive: HtmlArchive) -> list:
+    with open(os.path.join(FIXTURES_DIR, "case.html"), encoding="utf-8") as case_file:
+        archive.put(CASE_URL, case_file.read(), kind="case")
+
+    server = serve_fixtures()
+    try:
+        with PageFetcher(archive=archive) as fetcher:
+            return fetcher.fetch_documents(CASE_ID, [f"{BASE_URL}/{name}" for name in DOCUMENTS])
+    finally:
+        server.shutdown()
+
+
+def check_replay(archive: HtmlArchive, fetched: list) -> int:
+    failures = 0
+
+    for name in DOCUMENTS:
+        with open(os.path.join(FIXTURES_DIR, name), "rb") as page_file:
+            ok = archive.get(f"{BASE_URL}/{name}") == page_file.read()
+        print(f"{'OK  ' if ok else 'FAIL'} {name} stored byte for byte")
+        failures += not ok
+
+    result = replay_case(archive, CASE_URL)
+    case = result["case"]
+
+    ok = case is not None and case["case_id"] == CASE_ID and len(case["participants"]) == 2
+    print(f"{'OK  ' if ok else 'FAIL'} case record: {case and case['case_id']}, "
+          f"{case and len(case['participants'])} participants")
+    failures += not ok
+
+    ok = result["documents"] == fetched
+    print(f"{'OK  ' if ok else 'FAIL'} {len(result['documents'])} documents match the HTTP fetch")
+    failures += not ok
+
+    ok = result["missing"] == [f"{BASE_URL}/fixtures/no_such_page.html"]
+    print(f"{'OK  ' if ok else 'FAIL'} missing documents: {result['missing']}")
+    failures += not ok
+
+    return failures
+
+
+def measure_replay(archive: HtmlArchive, archive_path: str) -> None:
+    case_page = archive.get(CASE_URL)
+    for i in range(COPIES):
+        archive.put(f"{CASE_URL}?copy={i}", case_page, kind="case")
+
+    case_urls = list(archive.urls(kind="case"))
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(archive_path,)) as executor:
+            replayed = sum(1 for _ in executor.map(_replay_in_worker, case_urls, chunksize=16))
+        elapsed = time.perf_counter() - start
+        print(f"{workers} worker(s): {replayed / elapsed:.0f} cases/sec")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive_path = os.path.join(tmp_dir, "html_archive.sqlite")
+
+        with HtmlArchive(archive_path) as archive:
+            fetched = fill_archive(archive)
+            failures = check_replay(archive, fetched)
+            measure_replay(archive, archive_path)
+            print(f"{len(archive)} pages, {os.path.getsize(archive_path) / 1024:.0f} KB on disk")
+
+    print("Archive replay matches" if not failures else f"{failures} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
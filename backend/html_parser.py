@@ -0,0 +1,119 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urljoin
+
+import lxml.html
+
+from parser import build_case_record, build_document_record
+
+# Те же элементы, что ищет parse_document_with_driver через CSS-селекторы.
+TITLE_XPATH = "//*[contains(concat(' ', normalize-space(@class), ' '), ' col-sm-12 ')]//h3"
+TEXT_CONTAINER_XPATH = "//*[@id='document_text_container']"
+CASE_DETAILS_XPATH = "//*[contains(concat(' ', normalize-space(@class), ' '), ' col-sm-12 ')]"
+PARTICIPANTS_XPATH = "//*[contains(concat(' ', normalize-space(@class), ' '), ' col-sm-10 ')]"
+DOCUMENT_LINKS_XPATH = "//a[@href]"
+DOCUMENT_LINK_TEXT = "перейти >>"
+CATEGORY_XPATH = ("//*[contains(concat(' ', normalize-space(@class), ' '), ' container-fluid ')]"
+                  "//a[contains(@href, 'category=')]")
+
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "caption", "center", "dd", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "tbody",
+    "tfoot", "thead", "tr", "ul",
+}
+SKIP_TAGS = {"head", "script", "style", "noscript", "template", "title"}
+CELL_TAGS = {"td", "th"}
+
+INLINE_SPACES_RE = re.compile(r"[ \t\n\r\f\v\u00a0]+")
+LINE_SPACES_RE = re.compile(r"[ \t\r\f\v\u00a0]+")
+
+
+def _collect_text(element, parts: List[str], in_pre: bool = False) -> None:
+    tag = element.tag if isinstance(element.tag, str) else None
+    tag = tag.lower() if tag else None
+
+    if tag is not None and tag not in SKIP_TAGS and element.get("hidden") is None:
+        in_pre = in_pre or tag == "pre"
+        block = tag in BLOCK_TAGS
+
+        if tag == "br":
+            parts.append("\n")
+        if block:
+            parts.append("\n")
+        if tag in CELL_TAGS:
+            parts.append(" ")
+
+        if element.text:
+            parts.append(element.text if in_pre else INLINE_SPACES_RE.sub(" ", element.text))
+        for child in element:
+            _collect_text(child, parts, in_pre)
+
+        if block:
+            parts.append("\n")
+
+    if element.tail:
+        parts.append(INLINE_SPACES_RE.sub(" ", element.tail))
+
+
+def element_text(element) -> str:
+    """
+    Видимый текст элемента в том виде, в каком его отдаёт WebElement.text:
+    блочные элементы и <br> дают перевод строки, пробелы внутри строки
+    схлопываются, неразрывный пробел становится обычным, пустые строки убираются.
+    """
+
+    parts: List[str] = []
+    if element.text:
+        parts.append(INLINE_SPACES_RE.sub(" ", element.text))
+    for child in element:
+        _collect_text(child, parts)
+
+    lines = (LINE_SPACES_RE.sub(" ", line).strip() for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def parse_document_page(html: Union[str, bytes], case_id: str, doc_idx: int,
+                        doc_url: str) -> Optional[Dict[str, Any]]:
+    """
+    Разбирает HTML страницы документа ФАС в document_record,
+    как parse_document_with_driver. None, если на странице
+    нет текста документа или ссылки на категорию.
+    """
+
+    tree = lxml.html.fromstring(html)
+
+    title_elements = tree.xpath(TITLE_XPATH)
+    title_text = element_text(title_elements[1]) if len(
+        title_elements) > 1 else f"Документ_{doc_idx}"
+
+    containers = tree.xpath(TEXT_CONTAINER_XPATH)
+    categories = tree.xpath(CATEGORY_XPATH)
+    if not containers or not categories:
+        return None
+
+    return build_document_record(case_id, doc_idx, doc_url, title_text,
+                                 element_text(containers[0]), element_text(categories[0]))
+
+
+def parse_case_page(html: Union[str, bytes], case_url: str) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Разбирает HTML страницы дела, как parse_one_case: возвращает
+    case_record и ссылки на документы дела.
+    """
+
+    tree = lxml.html.fromstring(html)
+
+    case_details = tree.xpath(CASE_DETAILS_XPATH)[4:]
+
+    participants_elements = tree.xpath(PARTICIPANTS_XPATH)
+    participants_text = element_text(participants_elements[-2]) if len(participants_elements) > 1 else None
+
+    case_record = build_case_record(case_url, element_text(case_details[0]),
+                                    element_text(case_details[1]), participants_text)
+
+    # By.LINK_TEXT ищет ссылки по видимому тексту, get_attribute('href') отдаёт абсолютный URL.
+    doc_urls = [urljoin(case_url, link.get("href")) for link in tree.xpath(DOCUMENT_LINKS_XPATH)
+                if element_text(link) == DOCUMENT_LINK_TEXT]
+
+    return case_record, doc_urls
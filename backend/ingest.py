@@ -1,19 +1,23 @@
 import os
+from functools import partial
 from transformers import AutoTokenizer
 from chunkers.sentence_chunker import SentenceChunker
 from constants import TOKENIZER_NAME
-from FlagEmbedding import BGEM3FlagModel
 from qdrant_client import QdrantClient
-from constants import EMBEDDING_MODEL
+from embedding_client import load_embedding_model
 from embedder import Embedder
 
-from database import count_cases, clear_all_tables, load_database_url, create_db_engine, create_metadata
-from parser import parse_data, create_chrome_driver, create_firefox_driver
+from database import (count_cases, clear_all_tables, load_database_url, create_db_engine, create_metadata,
+                      get_known_document_urls, ensure_url_indexes)
+from parser import parse_data, parse_new_data, parse_one_case, create_chrome_driver, create_firefox_driver
+from crawl_state import CrawlState
+from page_fetcher import PageFetcher
+from html_archive import HtmlArchive
+from scraper_pool import ScraperPool
 
 if __name__ == '__main__':
     try:
-        model = BGEM3FlagModel(EMBEDDING_MODEL, use_fp16=True,
-                               device='cuda')
+        model = load_embedding_model(device='cuda')
 
         tokenizer = AutoTokenizer.from_pretrained(
             TOKENIZER_NAME, trust_remote_code=True)
@@ -28,9 +32,10 @@ if __name__ == '__main__':
             timeout=100
         )
 
-        chunker = SentenceChunker(tokenizer)
+        chunker = SentenceChunker(tokenizer, single_pass=True)
 
-        embedder = Embedder(client=client, model=model, tokenizer=tokenizer)
+        embedder = Embedder(client=client, model=model, tokenizer=tokenizer,
+                            compact_payload=os.getenv("QDRANT_COMPACT_PAYLOAD", "0") == "1")
 
         driver = create_chrome_driver()
 
@@ -39,12 +44,58 @@ if __name__ == '__main__':
         engine = create_db_engine(DATABASE_URL, logging=False)
 
         metadata = create_metadata(engine)
+        ensure_url_indexes(engine)
 
         # clear_all_tables(engine, metadata)
-        parse_data(driver, chunker, embedder, engine, metadata, start_page=50, last_page=1)
+        chunk_workers = int(os.getenv("CHUNK_WORKERS", os.cpu_count() or 1))
+
+        # Загруженные страницы архивируются, чтобы разбирать их заново без сайта (replay_archive.py).
+        archive = None
+        if os.getenv("HTML_ARCHIVE", "1") == "1":
+            archive = HtmlArchive(os.getenv("HTML_ARCHIVE_PATH", "data/html_archive.sqlite"))
+
+        # Страницы документов читаются по HTTP, Selenium - только если так не вышло.
+        page_fetcher = None
+        if os.getenv("HTTP_FETCH", "1") == "1":
+            page_fetcher = PageFetcher(
+                max_connections=int(os.getenv("HTTP_FETCH_CONNECTIONS", 8)),
+                min_delay=float(os.getenv("HTTP_FETCH_MIN_DELAY", 0.25)),
+                archive=archive).start()
+
+        # Каждому потоку пула нужна своя сессия Selenium, плюс сессия driver (SE_NODE_MAX_SESSIONS в compose.yml).
+        scraper_workers = int(os.getenv("SCRAPER_WORKERS", 1))
+        scraper_pool = None
+        if scraper_workers > 1:
+            scraper_pool = ScraperPool(workers=scraper_workers,
+                                       parse_case=partial(
+                                           parse_one_case, page_fetcher=page_fetcher, archive=archive,
+                                           known_document_urls=partial(get_known_document_urls,
+                                                                       engine=engine, metadata=metadata)),
+                                       min_delay=float(os.getenv("SCRAPER_MIN_DELAY", 1.0))).start()
+
+        try:
+            # По умолчанию загружаются только новые дела: обход идёт от первой страницы
+            # и останавливается на уже известных. CRAWL_INCREMENTAL=0 - обход фиксированного диапазона.
+            if os.getenv("CRAWL_INCREMENTAL", "1") == "1":
+                crawl_state = CrawlState(os.getenv("CRAWL_STATE_PATH", "data/crawl_state.json"))
+                parse_new_data(driver, chunker, embedder, engine, metadata, crawl_state,
+                               chunk_workers=chunk_workers, scraper_pool=scraper_pool,
+                               page_fetcher=page_fetcher, archive=archive)
+            else:
+                parse_data(driver, chunker, embedder, engine, metadata, start_page=50, last_page=1,
+                           chunk_workers=chunk_workers, scraper_pool=scraper_pool,
+                           page_fetcher=page_fetcher, archive=archive)
+        finally:
+            if scraper_pool is not None:
+                scraper_pool.close()
+            if page_fetcher is not None:
+                page_fetcher.close()
+            if archive is not None:
+                archive.close()
 
         print('-' * 50)
         print(f'Number of cases in the db: {count_cases(engine=engine, metadata=metadata)}')
 
     finally:
         driver.quit()
+        chunker.close()
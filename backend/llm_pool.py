@@ -0,0 +1,199 @@
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+import httpx
+from ollama import AsyncClient, ResponseError
+
+
+class NoBackendAvailableError(Exception):
+    """
+    Ни один из бэкендов Ollama не смог начать генерацию.
+    """
+
+
+def is_backend_error(error: Exception) -> bool:
+    """
+    Ошибка самого бэкенда (недоступен, таймаут, 5xx), а не запроса.
+    Ошибки запроса (неизвестная модель, неверные опции) повторятся
+    на любом бэкенде, поэтому не должны выводить его из пула.
+    """
+
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+
+    return isinstance(error, (ConnectionError, httpx.TransportError, asyncio.TimeoutError))
+
+
+class OllamaBackend:
+    """
+    Один инстанс Ollama и его текущее состояние.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.client = AsyncClient(host)
+        self.outstanding = 0
+        self.healthy = True
+        self.last_error: Optional[str] = None
+        self.last_preload = 0.0
+
+    def mark_failed(self, error: Exception) -> None:
+        if self.healthy:
+            print(f"Ollama backend {self.host} marked unhealthy: {error}")
+        self.healthy = False
+        self.last_error = str(error)
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "last_error": self.last_error,
+        }
+
+
+class LLMBackendPool:
+    """
+    Пул инстансов Ollama.
+
+    Запрос уходит на здоровый бэкенд с наименьшим числом активных
+    генераций. Если бэкенд недоступен до первого токена, запрос
+    прозрачно переотправляется на следующий. Ошибки самого запроса
+    пробрасываются вызывающему без переключения.
+    """
+
+    def __init__(self,
+                 hosts: List[str],
+                 health_interval: float = 10.0,
+                 health_timeout: float = 3.0):
+        if not hosts:
+            raise ValueError("At least one Ollama host is required")
+
+        self.backends = [OllamaBackend(host) for host in hosts]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+
+        self._health_task: Optional[asyncio.Task] = None
+        self._rotation = 0
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    async def start(self) -> None:
+        """
+        Проверяет бэкенды и запускает фоновую проверку здоровья.
+        """
+
+        await self.check_health()
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    async def _check_backend(self, backend: OllamaBackend) -> None:
+        try:
+            await asyncio.wait_for(backend.client.ps(), timeout=self.health_timeout)
+        except Exception as e:
+            backend.mark_failed(e)
+            return
+
+        if not backend.healthy:
+            print(f"Ollama backend {backend.host} is healthy again")
+        backend.healthy = True
+        backend.last_error = None
+
+    async def check_health(self) -> None:
+        await asyncio.gather(*(self._check_backend(b) for b in self.backends))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
+
+    def _candidates(self) -> List[OllamaBackend]:
+        """
+        Порядок попыток: сначала здоровые бэкенды по возрастанию
+        нагрузки, затем остальные на случай устаревшего статуса.
+        При равной нагрузке бэкенды чередуются.
+        """
+
+        self._rotation = (self._rotation + 1) % len(self.backends)
+        rotated = self.backends[self._rotation:] + self.backends[:self._rotation]
+
+        return sorted(rotated, key=lambda b: (not b.healthy, b.outstanding))
+
+    def state(self) -> List[Dict[str, Any]]:
+        return [backend.state() for backend in self.backends]
+
+    async def _preload_backend(self, backend: OllamaBackend, model: str,
+                               options: Dict[str, Any], keep_alive: str) -> None:
+        backend.last_preload = time.monotonic()
+        try:
+            await backend.client.generate(model=model, options=options,
+                                          keep_alive=keep_alive)
+        except Exception as e:
+            if is_backend_error(e):
+                backend.mark_failed(e)
+            else:
+                print(f"Ollama preload failed on {backend.host}: {e}")
+
+    async def preload(self, model: str, options: Dict[str, Any], keep_alive: str,
+                      min_interval: float = 60.0) -> None:
+        """
+        Просит здоровые бэкенды держать модель загруженной.
+
+        Пустой запрос к /api/generate загружает модель без генерации.
+        Опции передаются те же, что и при генерации: другой num_ctx
+        заставил бы Ollama перезагрузить модель.
+        """
+
+        now = time.monotonic()
+        targets = [b for b in self.backends
+                   if b.healthy and now - b.last_preload >= min_interval]
+
+        await asyncio.gather(*(self._preload_backend(b, model, options, keep_alive)
+                               for b in targets))
+
+    async def chat_stream(self, **chat_kwargs) -> AsyncGenerator[Any, None]:
+        """
+        Стримит чанки ответа от выбранного бэкенда.
+
+        Аргументы передаются в AsyncClient.chat как есть, stream=True.
+        """
+
+        last_error: Optional[Exception] = None
+
+        for backend in self._candidates():
+            backend.outstanding += 1
+            stream = None
+            try:
+                try:
+                    stream = await backend.client.chat(stream=True, **chat_kwargs)
+                    first_chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    if not is_backend_error(e):
+                        raise
+                    backend.mark_failed(e)
+                    last_error = e
+                    continue
+
+                yield first_chunk
+                async for chunk in stream:
+                    yield chunk
+                return
+            finally:
+                backend.outstanding -= 1
+                # Брошенный поток закрывается, чтобы не держать соединение с бэкендом.
+                if stream is not None:
+                    await stream.aclose()
+
+        raise NoBackendAvailableError(f"No Ollama backend available: {last_error}")
@@ -0,0 +1,78 @@
+"""
+Файл для локальной проверки пула бэкендов LLM без GPU.
+
+Поднимает несколько фейковых серверов Ollama (один из них всегда падает),
+прогоняет через пул параллельные генерации и печатает,
+как запросы распределились по бэкендам и какой получился throughput.
+"""
+
+import asyncio
+import time
+
+from constants import LLM_NAME
+from fake_ollama import serve
+from llm_pool import LLMBackendPool
+
+BASE_PORT = 11500
+REQUESTS = 24
+TOKENS_PER_SECOND = 40
+
+
+async def run_load(pool: LLMBackendPool, requests: int) -> float:
+    async def one_chat() -> int:
+        tokens = 0
+        async for chunk in pool.chat_stream(
+                model=LLM_NAME,
+                messages=[{"role": "user", "content": "Тестовый вопрос"}]):
+            if chunk["message"]["content"]:
+                tokens += 1
+        return tokens
+
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(one_chat() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return sum(counts) / elapsed
+
+
+async def main():
+    healthy_servers = [
+        await serve(BASE_PORT + i, tokens_per_second=TOKENS_PER_SECOND)
+        for i in range(3)
+    ]
+    failing_server = await serve(BASE_PORT + 3, fail=True)
+    servers = healthy_servers + [failing_server]
+
+    try:
+        for n_backends in (1, 3):
+            hosts = [f"127.0.0.1:{BASE_PORT + i}" for i in range(n_backends)]
+            pool = LLMBackendPool(hosts)
+            await pool.start()
+            throughput = await run_load(pool, REQUESTS)
+            await pool.close()
+            print(f"{n_backends} backend(s): {throughput:.1f} tokens/sec")
+
+        for server in healthy_servers:
+            server.config.app.state.requests = 0
+
+        # Упавший бэкенд стоит первым и считается здоровым до первой ошибки.
+        hosts = [f"127.0.0.1:{BASE_PORT + 3}"] + \
+            [f"127.0.0.1:{BASE_PORT + i}" for i in range(3)]
+        pool = LLMBackendPool(hosts)
+        await run_load(pool, REQUESTS)
+
+        print("\nFailover distribution:")
+        for backend in pool.state():
+            print(f"- {backend['host']}: healthy={backend['healthy']}")
+        for i, server in enumerate(healthy_servers):
+            print(f"- 127.0.0.1:{BASE_PORT + i} served "
+                  f"{server.config.app.state.requests} requests")
+
+    finally:
+        for server in servers:
+            server.should_exit = True
+        await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from collections import deque
+from typing import AsyncGenerator, Deque, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """
+    Очередь на генерацию заполнена.
+    """
+
+
+class RateLimitError(Exception):
+    """
+    Клиент превысил допустимую частоту запросов.
+    """
+
+
+class GenerationScheduler:
+    """
+    Допускает к LLM не больше max_concurrent генераций одновременно.
+    Остальные запросы ждут в ограниченной FIFO-очереди.
+    """
+
+    def __init__(self,
+                 max_concurrent: int = 1,
+                 max_queue: int = 32,
+                 rate_limit: int = 20,
+                 rate_period: float = 60.0,
+                 position_interval: float = 1.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.position_interval = position_interval
+
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._requests: Dict[str, Deque[float]] = {}
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _check_rate(self, client_id: Optional[str]) -> None:
+        """
+        Проверяет лимит запросов клиента в скользящем окне.
+        Сам запрос не учитывается, это делает _record_request.
+        """
+
+        if not client_id or self.rate_limit <= 0:
+            return
+
+        now = time.monotonic()
+        window_start = now - self.rate_period
+
+        for key in [k for k, stamps in self._requests.items()
+                    if not stamps or stamps[-1] < window_start]:
+            del self._requests[key]
+
+        stamps = self._requests.get(client_id)
+        if not stamps:
+            return
+        while stamps and stamps[0] < window_start:
+            stamps.popleft()
+
+        if len(stamps) >= self.rate_limit:
+            retry_after = stamps[0] + self.rate_period - now
+            raise RateLimitError(
+                f"Слишком много запросов. Повторите через {retry_after:.0f} с.")
+
+    def _record_request(self, client_id: Optional[str]) -> None:
+        if not client_id or self.rate_limit <= 0:
+            return
+
+        self._requests.setdefault(client_id, deque()).append(time.monotonic())
+
+    def _slot_free(self) -> bool:
+        return self._active < self.max_concurrent and not self._waiters
+
+    def check(self, client_id: Optional[str] = None) -> None:
+        """
+        Проверяет лимит клиента и место в очереди, ничего не занимая.
+        Вызывается до поиска, чтобы отклонённый запрос не тратил
+        эмбеддинг, Qdrant и Postgres; admit проверяет всё ещё раз.
+        """
+
+        self._check_rate(client_id)
+
+        if not self._slot_free() and len(self._waiters) >= self.max_queue:
+            raise QueueFullError("Очередь на генерацию заполнена, попробуйте позже.")
+
+    async def admit(self, client_id: Optional[str] = None) -> AsyncGenerator[int, None]:
+        """
+        Ждёт свободный слот генерации.
+
+        Пока запрос стоит в очереди, отдаёт его позицию (начиная с 1)
+        при каждом её изменении. Завершается, когда слот получен;
+        после этого вызывающий обязан вызвать release().
+        """
+
+        self._check_rate(client_id)
+
+        if self._slot_free():
+            self._record_request(client_id)
+            self._active += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            raise QueueFullError("Очередь на генерацию заполнена, попробуйте позже.")
+
+        # В лимит идут только допущенные или поставленные в очередь запросы.
+        self._record_request(client_id)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        granted = False
+
+        try:
+            last_position = None
+            while not waiter.done():
+                position = self._waiters.index(waiter) + 1
+                if position != last_position:
+                    last_position = position
+                    yield position
+                await asyncio.wait({waiter}, timeout=self.position_interval)
+            granted = True
+        finally:
+            if not granted:
+                if waiter.done() and not waiter.cancelled():
+                    # Слот уже передан этому запросу, но он ушёл из очереди.
+                    self.release()
+                else:
+                    waiter.cancel()
+                    try:
+                        self._waiters.remove(waiter)
+                    except ValueError:
+                        pass
+
+    def release(self) -> None:
+        """
+        Освобождает слот и передаёт его первому в очереди.
+        """
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._active -= 1
@@ -1,18 +1,83 @@
 import asyncio
-from typing import AsyncGenerator, Dict, List
-from ollama import AsyncClient
-
+from typing import AsyncGenerator, Dict, List, Optional, Union
 from constants import LLM_NAME
+from context_packer import ContextPacker
+from llm_pool import LLMBackendPool
+from llm_scheduler import GenerationScheduler
+from metrics import ERRORS, TOKENS_PER_SECOND, stage_timer
 
 
 class AsyncLLMService:
+    KEEP_ALIVE = "1h"
+    QUERY_PREFIX = "ВОПРОС ПОЛЬЗОВАТЕЛЯ: "
+    # Токены чат-шаблона вокруг сообщения с вопросом.
+    QUERY_TEMPLATE_MARGIN = 16
+
     def __init__(self,
-                 llm_host: str,
+                 llm_hosts: List[str],
+                 tokenizer,
                  model_name: str = LLM_NAME,
-                 context_window_size: int = 60000):
-        self.client = AsyncClient(llm_host)
+                 context_token_budget: int = 8192,
+                 query_token_allowance: int = 512,
+                 history_token_budget: int = 1024,
+                 answer_token_reserve: int = 4096,
+                 max_num_ctx: int = 32768,
+                 num_ctx_step: int = 1024,
+                 score_band_ratio: float = 0.05,
+                 max_concurrent: int = 1,
+                 max_queue: int = 32,
+                 rate_limit: int = 20):
+        self.pool = LLMBackendPool(llm_hosts)
+        self.tokenizer = tokenizer
         self.model_name = model_name
-        self.context_window_size = context_window_size
+        self.history_token_budget = history_token_budget
+        self.query_token_allowance = query_token_allowance
+        self.answer_token_reserve = answer_token_reserve
+        self.max_num_ctx = max_num_ctx
+        self.num_ctx_step = num_ctx_step
+        self.score_band_ratio = score_band_ratio
+        self.packer = ContextPacker(tokenizer, token_budget=context_token_budget)
+        self.scheduler = GenerationScheduler(
+            max_concurrent=max_concurrent,
+            max_queue=max_queue,
+            rate_limit=rate_limit)
+
+        # Системный промпт и опции не меняются между запросами:
+        # любое их изменение сбрасывает KV-кэш Ollama для общего префикса.
+        self.system_prompt = self._build_system_prompt()
+        static_tokens = self._count_prompt_tokens(
+            [{"role": "system", "content": self.system_prompt}])
+        self.options = {
+            "num_ctx": self._fit_num_ctx(
+                static_tokens + context_token_budget
+                + history_token_budget + query_token_allowance),
+            "temperature": 0.3,
+        }
+
+    async def start(self) -> None:
+        """
+        Проверяет доступность бэкендов Ollama и запускает их мониторинг.
+        """
+
+        await self.pool.start()
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    def check_admission(self, client_id: Optional[str] = None) -> None:
+        """
+        Бросает RateLimitError или QueueFullError, если запрос
+        клиента сейчас не будет допущен к генерации.
+        """
+
+        self.scheduler.check(client_id)
+
+    async def warm_up(self) -> None:
+        """
+        Не даёт модели выгрузиться, пока идёт поиск и сборка промпта.
+        """
+
+        await self.pool.preload(self.model_name, self.options, self.KEEP_ALIVE)
 
     def _build_system_prompt(self) -> str:
         #TODO: Move prompt to a separate file.
@@ -25,94 +90,203 @@ class AsyncLLMService:
             "3. Если в документах НЕТ прямого ответа, но есть информация по смежной теме — напиши: «Прямого ответа в документах нет, однако упоминается следующее...» и приведи факты.\n"
             "4. Не выдумывай номера законов и статей, если их нет в тексте. Используй общие юридические формулировки, если нужно связать факты.\n"
             "5. Ответ должен быть на русском языке, структурированным и вежливым.\n"
+            "6. Единственные источники истины — тексты между строками «--- НАЧАЛО ДОКУМЕНТОВ ---» и «--- КОНЕЦ ДОКУМЕНТОВ ---». "
+            "Если ответ требует знаний вне этих документов, напиши, что информации недостаточно.\n"
+            "7. Фрагменты, пропущенные из-за объёма, отмечены как «[...]». Не додумывай их содержание.\n"
             "ФОРМАТ ОТВЕТА:\n"
             "- Ссылайся на документ, используя его ID или название, указанное в контексте.\n"
             "- Используй Markdown для оформления."
         )
 
-    def _build_messages(self, query: str, context: str) -> List[Dict]:
+    def _build_messages(self, query: str, context: str,
+                        history: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        Собирает сообщения так, чтобы неизменная часть промпта шла первой:
+        системные инструкции, затем документы, история диалога
+        и только в конце вопрос.
+        """
+
         #TODO: Move prompt to a separate file.
-        user_content = (
-            f"Ниже приведены единственные источники истины, которыми ты должен пользоваться:\n"
+        documents_content = (
             f"--- НАЧАЛО ДОКУМЕНТОВ ---\n"
             f"{context}\n"
-            f"--- КОНЕЦ ДОКУМЕНТОВ ---\n\n"
-            f"ВОПРОС ПОЛЬЗОВАТЕЛЯ: {query}\n\n"
-            f"Напиши ответ, основываясь ТОЛЬКО на тексте внутри 'НАЧАЛО ДОКУМЕНТОВ' и 'КОНЕЦ ДОКУМЕНТОВ'. "
-            f"Если ответ требует знаний вне этих документов, напиши, что информации недостаточно."
+            f"--- КОНЕЦ ДОКУМЕНТОВ ---"
         )
 
         return [
-            {"role": "system", "content": self._build_system_prompt()},
-            {"role": "user", "content": user_content}
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": documents_content},
+            *(history or []),
+            {"role": "user", "content": f"{self.QUERY_PREFIX}{query}"}
         ]
 
-    def _prepare_context(self, documents: List[Dict]) -> str:
+    def _truncate_query(self, query: str) -> str:
+        """
+        Обрезает вопрос до query_token_allowance, заложенного в num_ctx.
+        Иначе Ollama молча отбросит начало промпта: системные инструкции и документы.
+        """
+
+        limit = (self.query_token_allowance - self.QUERY_TEMPLATE_MARGIN
+                 - len(self.tokenizer.encode(self.QUERY_PREFIX, add_special_tokens=False)))
+        token_ids = self.tokenizer.encode(query, add_special_tokens=False)
+        if len(token_ids) <= limit:
+            return query
+
+        return self.tokenizer.decode(token_ids[:limit], skip_special_tokens=True)
+
+    def _trim_history(self, query: str, history: Optional[List[Dict]]) -> List[Dict]:
         """
-        Формирует строку контекста.
+        Оставляет последние сообщения диалога, которые помещаются
+        в бюджет токенов истории.
+
+        Фронт кладёт текущий вопрос в конец истории, он отбрасывается:
+        вопрос и так идёт последним сообщением. Системные сообщения
+        от клиента не принимаются.
         """
 
-        context_parts = []
-        current_length = 0
+        messages = [m for m in (history or []) if m["role"] in ("user", "assistant")]
+        if messages and messages[-1]["role"] == "user" and messages[-1]["content"] == query:
+            messages = messages[:-1]
 
-        for i, doc in enumerate(documents, 1):
-            doc_id = doc.get("doc_id", "unknown")
+        trimmed: List[Dict] = []
+        used_tokens = 0
 
-            header = f"<document index='{i}'>\n  <meta>\n    <id>{doc_id}</id>\n  </meta>\n  <content>\n"
-            footer = f"\n  </content>\n</document>\n"
-            wrapper_len = len(header) + len(footer)
-            
-            remaining_space = self.context_window_size - current_length - wrapper_len
-            
-            if remaining_space <= 0:
+        for message in reversed(messages):
+            n_tokens = len(self.tokenizer.encode(message["content"], add_special_tokens=False))
+            if used_tokens + n_tokens > self.history_token_budget:
                 break
+            trimmed.append({"role": message["role"], "content": message["content"]})
+            used_tokens += n_tokens
+
+        # История должна начинаться с вопроса пользователя.
+        while trimmed and trimmed[-1]["role"] != "user":
+            trimmed.pop()
+
+        trimmed.reverse()
+        return trimmed
+
+    def _order_documents(self, documents: List[Dict]) -> List[Dict]:
+        """
+        Упорядочивает документы детерминированно: по полосам скора,
+        а внутри полосы по doc_id. Небольшие колебания скора между
+        запросами не меняют порядок блоков в промпте.
+
+        Скор colbert - сумма MaxSim по токенам вопроса, его масштаб
+        зависит от длины вопроса, поэтому ширина полосы берётся
+        долей (score_band_ratio) от скора лучшего документа.
+        """
+
+        if not documents:
+            return []
+
+        top_score = max(doc.get("score") or 0.0 for doc in documents)
+        band_width = abs(top_score) * self.score_band_ratio
+
+        def band(doc: Dict) -> int:
+            if band_width <= 0:
+                return 0
+            return int((top_score - (doc.get("score") or 0.0)) // band_width)
+
+        return sorted(documents, key=lambda doc: (band(doc), str(doc.get("doc_id"))))
+
+    def _prepare_context(self, documents: List[Dict]) -> List[Dict]:
+        """
+        Упаковывает документы в блоки контекста в пределах бюджета токенов.
+        """
+
+        return self.packer.pack(self._order_documents(documents))
+
+    def _count_prompt_tokens(self, messages: List[Dict]) -> int:
+        """
+        Считает токены промпта с учётом чат-шаблона модели.
+        """
+
+        return len(self.tokenizer.apply_chat_template(
+            messages, tokenize=True, add_generation_prompt=True))
 
-            text = doc.get("full_text") or ""
-            
-            if not text or len(text) > remaining_space:
-                best_chunk = doc.get("best_chunk")
-                
-                if best_chunk and len(best_chunk) <= remaining_space:
-                    text = best_chunk + "\n(полный текст скрыт из-за объема, показан релевантный фрагмент)"
-                else:
-                    source_text = text if text else (doc.get("best_chunk") or "")
-                    text = source_text[:remaining_space] + "...(обрезано лимитом контекста)"
+    def _fit_num_ctx(self, prompt_tokens: int) -> int:
+        """
+        Подбирает размер окна Ollama под промпт и резерв на ответ,
+        округляя вверх до шага.
+        """
 
-            if len(text) > remaining_space:
-                 text = text[:remaining_space]
+        needed = prompt_tokens + self.answer_token_reserve
+        num_ctx = -(-needed // self.num_ctx_step) * self.num_ctx_step
+
+        return min(num_ctx, self.max_num_ctx)
+
+    async def generate_stream(self, query: str, documents: List[Dict],
+                              client_id: Optional[str] = None,
+                              history: Optional[List[Dict]] = None
+                              ) -> AsyncGenerator[Union[str, Dict], None]:
+        """
+        Стримит ответ LLM.
 
-            doc_block = f"{header}{text}{footer}"
-            
-            context_parts.append(doc_block)
-            current_length += len(doc_block)
+        history - предыдущие сообщения диалога в виде {"role", "content"},
+        обрезаются по бюджету токенов.
 
-        return "\n".join(context_parts)
+        Отдаёт строки с токенами, а пока запрос ждёт своей очереди
+        на генерацию, словари вида {"type": "queued", "position": n}.
+        Последним идёт словарь {"type": "stats", ...} с размером контекста
+        по документам и статистикой prefill/decode от Ollama.
+        """
 
-    async def generate_stream(self, query: str, documents: List[Dict]) -> AsyncGenerator[str, None]:
         if not documents:
             yield "Документы не найдены."
             return
 
-        context_str = self._prepare_context(documents)
+        # Токенизация документов занимает заметное время, поэтому
+        # упаковка идёт в пуле потоков и не блокирует event loop.
+        loop = asyncio.get_running_loop()
+        timings: Dict[str, float] = {}
+        with stage_timer("context", timings):
+            packed = await loop.run_in_executor(None, self._prepare_context, documents)
+            history = await loop.run_in_executor(None, self._trim_history, query, history)
+            prompt_query = self._truncate_query(query)
+
+        context_str = "\n".join(doc["block"] for doc in packed)
+        messages = self._build_messages(prompt_query, context_str, history)
 
-        messages = self._build_messages(query, context_str)
+        stats = {
+            "type": "stats",
+            "context_seconds": timings["context"],
+            "documents": [{"doc_id": doc["doc_id"], "chars": doc["chars"], "tokens": doc["tokens"]}
+                          for doc in packed],
+        }
+
+        admission = self.scheduler.admit(client_id)
+        try:
+            async for position in admission:
+                yield {"type": "queued", "position": position}
+        finally:
+            await admission.aclose()
 
-        #TODO: Move options to a separate file.
         try:
-            stream = await self.client.chat(
+            stream = self.pool.chat_stream(
                 model=self.model_name,
                 messages=messages,
-                options={
-                    "num_ctx": 32768,
-                    "temperature": 0.3,
-                },
-                stream=True,
-                keep_alive="1h"
+                options=self.options,
+                keep_alive=self.KEEP_ALIVE
             )
 
             async for chunk in stream:
                 content = chunk['message']['content']
-                yield content
+                if content:
+                    yield content
+
+                if chunk.get('done'):
+                    for key in ("prompt_eval_count", "prompt_eval_duration",
+                                "eval_count", "eval_duration"):
+                        stats[key] = chunk.get(key)
+                    if chunk.get('eval_count') and chunk.get('eval_duration'):
+                        TOKENS_PER_SECOND.observe(
+                            chunk['eval_count'] / (chunk['eval_duration'] / 1e9))
 
         except Exception as e:
+            ERRORS.inc(stage="llm")
             yield f"\n[Ollama Error: {e}]"
+
+        finally:
+            self.scheduler.release()
+
+        yield stats
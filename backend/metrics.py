@@ -0,0 +1,204 @@
+"""
+Метрики сервиса в формате Prometheus.
+
+Метрики хранятся в памяти процесса: при нескольких воркерах
+API каждый воркер отдаёт на /metrics только свои значения.
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                       1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: счётчики по корзинам (+Inf последней), сумма.
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = ([0] * (len(self.buckets) + 1), [0.0])
+            self._series[key] = series
+
+        counts, total = series
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} histogram"]
+
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labelnames, key, ("le", le))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "fas_stage_seconds",
+    "Duration of request processing stages in seconds.",
+    labelnames=("stage",))
+
+TOKENS_PER_SECOND = Histogram(
+    "fas_llm_tokens_per_second",
+    "LLM decode speed reported by Ollama.",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300))
+
+ERRORS = Counter(
+    "fas_errors_total",
+    "Errors by processing stage.",
+    labelnames=("stage",))
+
+CACHE_REQUESTS = Counter(
+    "fas_cache_requests_total",
+    "Cache lookups by cache and result (hit, partial, miss).",
+    labelnames=("cache", "result"))
+
+REGISTRY = [STAGE_SECONDS, TOKENS_PER_SECOND, ERRORS, CACHE_REQUESTS]
+
+# Тайминги текущего HTTP-запроса для заголовка Server-Timing.
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_timings", default=None)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+def observe_stage(stage: str, seconds: float,
+                  timings: Optional[Dict[str, float]] = None) -> None:
+    """
+    Записывает длительность этапа в гистограмму
+    и в тайминги текущего запроса.
+
+    timings - необязательный словарь, куда этап тоже добавляется
+    (например, для итоговой статистики ответа).
+    """
+
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+    for target in (_request_timings.get(), timings):
+        if target is not None:
+            target[stage] = target.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start_time, timings)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware, добавляющий заголовок Server-Timing.
+
+    Заголовки придерживаются до первого куска тела ответа:
+    для стримов это событие с источниками, так что в заголовок
+    попадают этапы поиска, завершившиеся к этому моменту.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        pending_start = None
+
+        async def send_with_timing(message):
+            nonlocal pending_start
+
+            if message["type"] == "http.response.start":
+                pending_start = message
+                return
+
+            if pending_start is not None:
+                entries = [f"{stage};dur={seconds * 1000:.1f}"
+                           for stage, seconds in timings.items()]
+                entries.append(f"app;dur={(time.perf_counter() - start_time) * 1000:.1f}")
+
+                headers = list(pending_start.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                await send({**pending_start, "headers": headers})
+                pending_start = None
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
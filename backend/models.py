@@ -27,7 +27,7 @@ class Case(Base):
     title = Column(Text, nullable=False)
     open_date = Column(Date)
     closing_date = Column(Date)
-    url = Column(Text)
+    url = Column(Text, index=True)
     procedure_type = Column(Text)
     department = Column(Text)
     activity_sphere = Column(Text)
@@ -57,7 +57,7 @@ class Document(Base):
     raw_doc_id = Column(Text)
     title = Column(Text)
     publish_date = Column(Date)
-    url = Column(Text)
+    url = Column(Text, index=True)
     full_text = Column(Text)
     text_length = Column(Integer, default=0)
     doc_type = Column(Text)
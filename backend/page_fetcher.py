@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from html_archive import HtmlArchive
+from html_parser import parse_document_page
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "ru-RU,ru;q=0.9",
+}
+
+
+class PageFetcher:
+    """
+    Загрузка страниц документов ФАС по HTTP без браузера.
+
+    Один httpx.AsyncClient с пулом keep-alive соединений работает
+    в собственном потоке с event loop, поэтому fetch_documents можно
+    вызывать синхронно из потоков ScraperPool, а соединения
+    переиспользуются между всеми делами. Страница, которую не удалось
+    загрузить или разобрать, отдаётся как None, и её разбирает Selenium.
+
+    Запросы к одному хосту начинаются не чаще раза в min_delay секунд,
+    сколько бы потоков ни загружали документы одновременно.
+    """
+
+    def __init__(self, max_connections: int = 8, timeout: float = 30.0,
+                 verify: bool = False, headers: Optional[Dict[str, str]] = None,
+                 archive: Optional[HtmlArchive] = None, min_delay: float = 0.25):
+        self.max_connections = max_connections
+        self.min_delay = min_delay
+        self.timeout = timeout
+        # Сертификат сайта ФАС не всегда проходит проверку, Chrome тоже запускается с --ignore-certificate-errors.
+        self.verify = verify
+        self.headers = headers or DEFAULT_HEADERS
+        # Загруженные страницы сохраняются как есть, в исходной кодировке.
+        self.archive = archive
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Время, с которого можно начать следующий запрос к хосту.
+        self._next_request_at: Dict[str, float] = {}
+
+    def start(self) -> "PageFetcher":
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name="page-fetcher", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+
+        return self
+
+    async def _open(self) -> None:
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            timeout=self.timeout,
+            verify=self.verify,
+            headers=self.headers,
+            follow_redirects=True,
+        )
+        self._semaphore = asyncio.Semaphore(self.max_connections)
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self) -> "PageFetcher":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    async def _wait_for_host(self, url: str) -> None:
+        """
+        Занимает ближайшее свободное время запроса к хосту и ждёт его.
+        Вызывается только из потока event loop, блокировка не нужна.
+        """
+
+        if self.min_delay <= 0:
+            return
+
+        host = httpx.URL(url).host
+        now = time.monotonic()
+        start_at = max(now, self._next_request_at.get(host, 0.0))
+        self._next_request_at[host] = start_at + self.min_delay
+
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def fetch_document(self, case_id: str, doc_idx: int,
+                             doc_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Загружает и разбирает страницу документа. None, если страница
+        недоступна, не разобралась или текст документа пуст.
+        """
+
+        try:
+            async with self._semaphore:
+                await self._wait_for_host(doc_url)
+                response = await self._client.get(doc_url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"HTTP fetch failed for {doc_url}: {type(e).__name__}: {e}")
+            return None
+
+        if self.archive is not None:
+            # Сжатие и коммит SQLite под блокировкой архива не должны
+            # останавливать цикл событий с остальными загрузками.
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.archive.put, doc_url, response.content, "document")
+
+        try:
+            record = parse_document_page(response.content, case_id, doc_idx, doc_url)
+        except Exception as e:
+            print(f"HTML parsing failed for {doc_url}: {e}")
+            return None
+
+        # Пустой текст может означать, что страница собирается скриптом.
+        if record is None or not record["document_text"]:
+            return None
+
+        return record
+
+    async def fetch_documents_async(self, case_id: str, doc_urls: List[str],
+                                    doc_indices: Optional[List[int]] = None
+                                    ) -> List[Optional[Dict[str, Any]]]:
+        if doc_indices is None:
+            doc_indices = list(range(len(doc_urls)))
+
+        return await asyncio.gather(*(self.fetch_document(case_id, doc_idx, doc_url)
+                                      for doc_idx, doc_url in zip(doc_indices, doc_urls)))
+
+    def fetch_documents(self, case_id: str, doc_urls: List[str],
+                        doc_indices: Optional[List[int]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Синхронная обёртка над fetch_documents_async для потоков парсера:
+        document_record или None для каждой ссылки, в том же порядке.
+        doc_indices - номера документов на странице дела, если загружаются не все.
+        """
+
+        future = asyncio.run_coroutine_threadsafe(
+            self.fetch_documents_async(case_id, doc_urls, doc_indices), self._loop)
+        return future.result()
@@ -0,0 +1,129 @@
+"""
+Файл для локальной проверки загрузки документов по HTTP без браузера.
+
+Поднимает локальный HTTP-сервер с сохранёнными страницами документов
+из fixtures/fas_documents, загружает их через PageFetcher и сравнивает
+document_record с ожидаемыми. Страницы, которые должен разбирать Selenium
+(нет категории, текст собирается скриптом, 404), должны вернуться как None.
+"""
+
+import functools
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from page_fetcher import PageFetcher
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "fas_documents")
+PORT = 8765
+CASE_ID = "077_07_00-1234_2024"
+REPEATS = 50
+
+EXPECTED = {
+    "decision.html": {
+        "title": "Решение по делу №077/07/00-1234/2024 от 15 марта 2024 г.",
+        "raw_doc_id": "077/07/00-1234/2024",
+        "document_date": "2024-03-15",
+        "document_type": "Решения",
+        "document_text": "РЕШЕНИЕ\n"
+                         "по делу № 077/07/00-1234/2024\n"
+                         "Комиссия Московского УФАС России по контролю в сфере закупок "
+                         "(далее — Комиссия) рассмотрела жалобу ООО «Ромашка», на действия "
+                         "ГБУ «Дирекция заказчика».\n"
+                         "Согласно ч. 1 ст. 18.1 Закона о защите конкуренции комиссия решила:\n"
+                         "Признать жалобу обоснованной.\n"
+                         "Выдать заказчику обязательное для исполнения предписание.\n"
+                         "Председатель Комиссии И.И. Иванов\n"
+                         "Решение может быть обжаловано в арбитражный суд.",
+    },
+    # Страница в windows-1251 без второго заголовка и с пустой ссылкой на категорию.
+    "letter_without_title.html": {
+        "title": "Документ_1",
+        "raw_doc_id": f"doc_1_{CASE_ID}",
+        "document_date": None,
+        "document_type": "Другое",
+        "document_text": "Письмо ФАС России\n"
+                         "о разъяснении порядка применения\n"
+                         "Федеральная антимонопольная служба рассмотрела обращение.",
+    },
+    "no_category.html": None,
+    "rendered_by_script.html": None,
+    "missing.html": None,
+}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures() -> ThreadingHTTPServer:
+    handler = functools.partial(QuietHandler, directory=FIXTURES_DIR)
+    server = ThreadingHTTPServer(("127.0.0.1", PORT), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def check_records(fetcher: PageFetcher) -> int:
+    names = list(EXPECTED)
+    urls = [f"http://127.0.0.1:{PORT}/{name}" for name in names]
+    records = fetcher.fetch_documents(CASE_ID, urls)
+    failures = 0
+
+    for doc_idx, (name, url, record) in enumerate(zip(names, urls, records)):
+        expected = EXPECTED[name]
+
+        if expected is None:
+            ok = record is None
+            print(f"{'OK  ' if ok else 'FAIL'} {name}: "
+                  f"{'fallback to Selenium' if ok else 'expected None, got a record'}")
+            failures += not ok
+            continue
+
+        if record is None:
+            print(f"FAIL {name}: got None")
+            failures += 1
+            continue
+
+        expected = dict(expected, case_id=CASE_ID, url=url,
+                        text_length=len(expected["document_text"]))
+        mismatched = [key for key, value in expected.items() if record[key] != value]
+        if mismatched:
+            failures += 1
+            print(f"FAIL {name}:")
+            for key in mismatched:
+                print(f"    {key}: {record[key]!r} != {expected[key]!r}")
+        else:
+            print(f"OK   {name}: {record['document_id']}, {record['text_length']} chars")
+
+    return failures
+
+
+def measure_throughput(fetcher: PageFetcher) -> float:
+    urls = [f"http://127.0.0.1:{PORT}/decision.html"] * REPEATS
+
+    start = time.perf_counter()
+    fetcher.fetch_documents(CASE_ID, urls)
+    elapsed = time.perf_counter() - start
+
+    return REPEATS / elapsed
+
+
+def main():
+    server = serve_fixtures()
+
+    try:
+        # Локальный сервер, пауза между запросами не нужна.
+        with PageFetcher(max_connections=8, min_delay=0) as fetcher:
+            failures = check_records(fetcher)
+            print(f"{measure_throughput(fetcher):.1f} pages/sec over keep-alive connections")
+    finally:
+        server.shutdown()
+
+    print("All records match" if not failures else f"{failures} record(s) differ")
+
+
+if __name__ == "__main__":
+    main()
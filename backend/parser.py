@@ -2,8 +2,11 @@ import re
 import os
 import json
 import math
+from functools import partial
 
-from database import save_to_db, update_document_qdrant_status
+from crawl_state import page_fingerprint
+from database import (save_to_db, update_document_qdrant_status, count_cases,
+                      get_known_case_urls, get_known_document_urls, get_unindexed_documents)
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -240,56 +243,309 @@ def normalize_id(raw_id):
     return normalized
 
 
-def parse_data(driver, chunker, embedder, engine, metadata, start_page=2, last_page=1, step=-1):
-    """Функция парсит данные из базы ФАС"""
+def parse_data(driver, chunker, embedder, engine, metadata, start_page=2, last_page=1, step=-1,
+               chunk_workers=None, scraper_pool=None, page_fetcher=None, archive=None):
+    """
+    Функция парсит данные из базы ФАС.
+
+    Списки дел на страницах читает driver. Если передан scraper_pool,
+    сами дела разбираются параллельно его драйверами, иначе по очереди тем же driver.
+    page_fetcher (PageFetcher) загружает страницы документов по HTTP
+    в последовательном режиме, пулу его передают через parse_case.
+    archive (HtmlArchive) сохраняет загруженные страницы для replay_archive.py.
+    """
 
     embedder.create_qdrant_collection()
 
     for page in range(start_page, last_page, step):
-        driver.get(f"https://br.fas.gov.ru/?page={page}&")
+        cases_urls = get_cases_urls(driver, page)
+        parse_cases(driver, cases_urls, chunker, embedder, engine, metadata,
+                    chunk_workers, scraper_pool, page_fetcher, archive=archive)
+
+
+def parse_new_data(driver, chunker, embedder, engine, metadata, crawl_state, max_pages=None,
+                   chunk_workers=None, scraper_pool=None, page_fetcher=None, archive=None,
+                   max_attempts=5):
+    """
+    Инкрементальный парсинг базы ФАС: страницы обходятся от самых новых дел,
+    уже сохранённые дела пропускаются, а обход останавливается на первой
+    странице, где все дела известны или отпечаток которой не изменился
+    с прошлого запуска (crawl_state, CrawlState).
+
+    Без max_pages верхняя граница обхода оценивается через count_new_pages.
+    Прерванный обход продолжается со страницы crawl_state.frontier.
+    Дела, которые не удалось разобрать или сохранить целиком в этом или прошлых
+    запусках, повторяются в конце обхода, до max_attempts попыток на дело.
+    """
+
+    embedder.create_qdrant_collection()
+
+    page = crawl_state.start_page()
+    if max_pages is None:
+        max_pages = page - 1 + estimate_new_pages(driver, engine, metadata)
+    print(f"Incremental crawl: pages {page}..{max_pages}, last case: {crawl_state.last_case}")
+
+    known_document_urls = partial(get_known_document_urls, engine=engine, metadata=metadata)
+
+    while page <= max_pages:
+        cases_urls = get_cases_urls(driver, page)
+        if not cases_urls:
+            break
+
+        fingerprint = page_fingerprint(cases_urls)
+        if crawl_state.page_unchanged(page, fingerprint):
+            print(f"Page {page} is unchanged since the last crawl, stopping")
+            break
+
+        known_urls = get_known_case_urls(cases_urls, engine, metadata)
+        new_urls = [case_url for case_url in cases_urls if case_url not in known_urls]
+        if not new_urls:
+            crawl_state.finish_page(page, fingerprint)
+            print(f"Page {page}: all {len(cases_urls)} cases are already in the db, stopping")
+            break
+
+        print(f"Page {page}: {len(new_urls)} new of {len(cases_urls)} cases")
+        failed = parse_cases(driver, new_urls, chunker, embedder, engine, metadata,
+                             chunk_workers, scraper_pool, page_fetcher,
+                             known_document_urls, crawl_state, archive, page)
 
-        cases_on_page = driver.find_elements(
-            By.CSS_SELECTOR, "a[href*='/cases/']")
-        cases_urls = [case.get_attribute('href') for case in cases_on_page]
+        crawl_state.finish_page(page, fingerprint if not failed else None)
+        page += 1
 
+    # Упавшие дела уже известны по URL, и обход до их страниц не доходит:
+    # они повторяются по списку, а сохранённые документы при этом не загружаются заново.
+    retry_urls = crawl_state.cases_to_retry(max_attempts)
+    if retry_urls:
+        print(f"Retrying {len(retry_urls)} failed cases")
+        parse_cases(driver, retry_urls, chunker, embedder, engine, metadata,
+                    chunk_workers, scraper_pool, page_fetcher,
+                    known_document_urls, crawl_state, archive)
+
+    # Документы, сохранённые в БД, но не загруженные в Qdrant (например, запуск
+    # прервался между save_to_db и insert_chunks), догружаются по тексту из БД.
+    unindexed = get_unindexed_documents(engine, metadata)
+    if unindexed:
+        print(f"Adding {len(unindexed)} saved documents to Qdrant")
+        index_documents(unindexed, chunker, embedder, engine, metadata, chunk_workers)
+
+    abandoned = len(crawl_state.failed_cases) - len(crawl_state.cases_to_retry(max_attempts))
+    if abandoned:
+        print(f"{abandoned} cases failed {max_attempts} times and are no longer retried, "
+              f"see failed_cases in {crawl_state.path}")
+
+    crawl_state.finish_run()
+
+
+def get_cases_urls(driver, page):
+    """Возвращает ссылки на дела со страницы списка дел без повторов"""
+
+    driver.get(f"https://br.fas.gov.ru/?page={page}&")
+
+    cases_on_page = driver.find_elements(
+        By.CSS_SELECTOR, "a[href*='/cases/']")
+    return list(dict.fromkeys(case.get_attribute('href') for case in cases_on_page))
+
+
+def parse_cases(driver, cases_urls, chunker, embedder, engine, metadata, chunk_workers=None,
+                scraper_pool=None, page_fetcher=None, known_document_urls=None, crawl_state=None,
+                archive=None, page=None):
+    """
+    Разбирает и сохраняет дела по ссылкам, возвращает число дел, разобрать
+    или сохранить которые целиком не удалось. С crawl_state такие дела
+    запоминаются для повтора (page - страница списка, с которой они взяты).
+    Пулу known_document_urls и archive, как и page_fetcher, передают через parse_case.
+    """
+
+    failed = 0
+
+    if scraper_pool is not None:
+        for result in scraper_pool.map_cases(cases_urls):
+            failed += not handle_parsed_case(result['case_url'], result['case'], result['documents'],
+                                             result['error'], chunker, embedder, engine, metadata,
+                                             chunk_workers, crawl_state, page)
+    else:
         for case_url in cases_urls:
-            case, linked_documents = parse_one_case(driver, case_url)
-            save_to_db(case, linked_documents, engine, metadata)
-            for doc in linked_documents:
-                try:
-                    text = doc['document_text']
-                    chunks = chunker.chunk(text, doc_id=doc['document_id'])
-
-                    print("Чанков:", len(chunks))
-                    for i in range(len(chunks)):
-                        print(f"Токенов в {i}-ом:", chunks[i]["token_count"])
-                    print()
-
-                    embeddings = embedder.generate_chunk_embeddings(chunks)
-                    embedder.insert_to_qdrant(embeddings)
-
-                    update_document_qdrant_status(doc['document_id'],
-                                                  True,
-                                                  embedder.version,
-                                                  engine,
-                                                  metadata)
-                except Exception as e:
-                    print(
-                        f"Qdrant insertion error for document: {doc['document_id']}")
-                    update_document_qdrant_status(doc['document_id'], False,
-                                                  embedder.version,
-                                                  engine,
-                                                  metadata)
-
-
-def parse_one_case(driver, case_url):
+            case, linked_documents, error = None, None, None
+            try:
+                case, linked_documents = parse_one_case(driver, case_url, page_fetcher,
+                                                        known_document_urls, archive)
+            except Exception as e:
+                if crawl_state is None:
+                    raise
+                error = e
+            failed += not handle_parsed_case(case_url, case, linked_documents, error, chunker,
+                                             embedder, engine, metadata, chunk_workers,
+                                             crawl_state, page)
+
+    return failed
+
+
+def handle_parsed_case(case_url, case, linked_documents, error, chunker, embedder, engine, metadata,
+                       chunk_workers=None, crawl_state=None, page=None):
+    """
+    Сохраняет разобранное дело и отмечает результат в crawl_state.
+    Возвращает False, если дело не разобралось, не сохранилось,
+    часть его документов загрузить не удалось или они не попали в Qdrant.
+    """
+
+    if error is None:
+        try:
+            not_indexed = process_case(case, linked_documents, chunker, embedder,
+                                       engine, metadata, chunk_workers)
+        except Exception as e:
+            if crawl_state is None:
+                raise
+            error = e
+        else:
+            if not_indexed:
+                error = f"{len(not_indexed)} documents were not added to Qdrant: {not_indexed}"
+
+    if error is None and case.get('failed_document_urls'):
+        error = f"{len(case['failed_document_urls'])} documents failed: {case['failed_document_urls']}"
+
+    if error is not None:
+        print(f"Case parsing error: {case_url}: {error}")
+        if crawl_state is not None:
+            crawl_state.record_failure(case_url, page, error)
+        return False
+
+    if crawl_state is not None:
+        crawl_state.record_success(case)
+    return True
+
+
+def process_case(case, linked_documents, chunker, embedder, engine, metadata, chunk_workers=None):
+    """
+    Сохраняет дело в БД, чанкует его документы и загружает их в Qdrant.
+
+    Документы для Qdrant берутся из БД: кроме новых, это сохранённые раньше,
+    но так и не загруженные документы дела (например, после ошибки Qdrant).
+    Возвращает document_id документов, загрузить которые не удалось.
+    """
+
+    save_to_db(case, linked_documents, engine, metadata)
+
+    return index_documents(get_unindexed_documents(engine, metadata, case['raw_id']),
+                           chunker, embedder, engine, metadata, chunk_workers)
+
+
+def index_documents(documents, chunker, embedder, engine, metadata, chunk_workers=None):
+    """
+    Чанкует документы и загружает их в Qdrant, отмечая результат в БД.
+    Возвращает document_id документов, загрузить которые не удалось.
+    """
+
+    failed = []
+
+    # Документы чанкуются параллельно в пуле процессов чанкера.
+    chunked = chunker.chunk_many(
+        ((doc['document_text'], doc['document_id']) for doc in documents),
+        workers=chunk_workers, return_exceptions=True)
+
+    for doc, chunks in zip(documents, chunked):
+        try:
+            if isinstance(chunks, Exception):
+                raise chunks
+
+            for chunk in chunks:
+                chunk['url'] = doc['url']
+
+            print("Чанков:", len(chunks))
+            for i in range(len(chunks)):
+                print(f"Токенов в {i}-ом:", chunks[i]["token_count"])
+            print()
+
+            # Эмбеддинги считаются и загружаются пачками, а не для всего документа сразу.
+            embedder.insert_chunks(chunks)
+
+            update_document_qdrant_status(doc['document_id'],
+                                          True,
+                                          embedder.version,
+                                          engine,
+                                          metadata)
+        except Exception as e:
+            print(
+                f"Qdrant insertion error for document: {doc['document_id']}: {e}")
+            failed.append(doc['document_id'])
+            update_document_qdrant_status(doc['document_id'], False,
+                                          embedder.version,
+                                          engine,
+                                          metadata)
+
+    return failed
+
+
+def parse_one_case(driver, case_url, page_fetcher=None, known_document_urls=None, archive=None):
+    """
+    Разбирает страницу дела и его документы.
+
+    known_document_urls - функция, возвращающая по списку ссылок на документы
+    уже сохранённые из них (например, get_known_document_urls), такие документы не загружаются.
+    archive (HtmlArchive) сохраняет загруженные браузером страницы для повторного разбора.
+    """
+
     driver.get(case_url)
+    if archive is not None:
+        archive.put(case_url, driver.page_source, kind="case")
 
     # Парсим детали дела
     case_details = driver.find_elements(By.CLASS_NAME, "col-sm-12")[4:]
 
-    case_name = case_details[0].text
-    other_details = case_details[1].text.split('\n')
+    participants_elements = driver.find_elements(By.CLASS_NAME, "col-sm-10")
+    participants_text = participants_elements[-2].text if len(participants_elements) > 1 else None
+
+    case_record = build_case_record(case_url, case_details[0].text, case_details[1].text,
+                                    participants_text)
+    case_id = case_record['case_id']
+
+    # Парсим связанные документы
+    documents = []
+
+    linked_documents = driver.find_elements(By.LINK_TEXT, "перейти >>")
+    doc_urls = [doc.get_attribute('href') for doc in linked_documents]
+
+    # Уже сохранённые документы отсекаются одним запросом до загрузки их страниц.
+    known_urls = known_document_urls(doc_urls) if known_document_urls is not None else set()
+    new_indices = [doc_idx for doc_idx, doc_url in enumerate(doc_urls) if doc_url not in known_urls]
+    if known_urls:
+        print(f"Case {case_id}: {len(doc_urls) - len(new_indices)} of {len(doc_urls)} documents already in the db")
+
+    # Страницы документов сначала читаются лёгким HTTP-запросом,
+    # Selenium нужен только для тех, что так разобрать не удалось.
+    records = dict.fromkeys(new_indices)
+    if page_fetcher is not None and new_indices:
+        fetched = page_fetcher.fetch_documents(
+            case_id, [doc_urls[doc_idx] for doc_idx in new_indices], new_indices)
+        records.update(zip(new_indices, fetched))
+
+    # Документы, которые не удалось загрузить ни по HTTP, ни браузером:
+    # по ним parse_new_data повторяет дело в следующий раз.
+    case_record['failed_document_urls'] = []
+
+    for doc_idx in new_indices:
+        doc_url = doc_urls[doc_idx]
+        document_record = records[doc_idx]
+        if document_record is None:
+            document_record = parse_document_with_driver(driver, case_id, doc_idx, doc_url, archive)
+        if document_record is None:
+            case_record['failed_document_urls'].append(doc_url)
+            continue
+
+        if document_record['document_text']:
+            documents.append(document_record)
+        else:
+            print(f"Empty document: {doc_url}")
+
+    return case_record, documents
+
+
+def build_case_record(case_url, case_name, details_text, participants_text):
+    """
+    Собирает case_record из заголовка дела, блока с деталями и блока с участниками.
+    Общая часть для разбора через Selenium и из архива страниц (html_parser).
+    """
+
+    other_details = details_text.split('\n')
 
     case_id_match = re.search(r'№([^ ]+)', case_name)
     raw_case_id = case_id_match.group(
@@ -343,12 +599,11 @@ def parse_one_case(driver, case_url):
             case_record[field_mapping[key]] = value
 
     # Парсим участников дела
-    participants_elements = driver.find_elements(By.CLASS_NAME, "col-sm-10")
     case_record['participants'] = []
 
-    if participants_elements:
+    if participants_text is not None:
         try:
-            participants_text = participants_elements[-2].text.split('\n')
+            participants_text = participants_text.split('\n')
 
             i = 1
             while i < len(participants_text) - 2:
@@ -382,109 +637,112 @@ def parse_one_case(driver, case_url):
         except Exception as e:
             print(f"Partitipant {case_id} parsing error: {e}")
 
-    # Парсим связанные документы
-    documents = []
+    return case_record
 
-    linked_documents = driver.find_elements(By.LINK_TEXT, "перейти >>")
-    doc_urls = [doc.get_attribute('href') for doc in linked_documents]
 
-    for doc_idx, doc_url in enumerate(doc_urls):
-        driver.get(doc_url)
+def parse_document_with_driver(driver, case_id, doc_idx, doc_url, archive=None):
+    """Открывает страницу документа в браузере и собирает document_record"""
+
+    driver.get(doc_url)
+    if archive is not None:
+        archive.put(doc_url, driver.page_source, kind="document")
+    try:
+        title_elements = driver.find_elements(
+            By.CSS_SELECTOR, ".col-sm-12 h3")
+        title_text = title_elements[1].text if len(
+            title_elements) > 1 else f"Документ_{doc_idx}"
+
+        container = driver.find_element(By.ID, "document_text_container")
+        full_document_text = container.text
+
+        doc_type_element = driver.find_element(
+            By.CSS_SELECTOR, ".container-fluid a[href*='category=']").text
+
+        return build_document_record(case_id, doc_idx, doc_url, title_text,
+                                     full_document_text, doc_type_element)
+
+    # except NoSuchElementException as e:
+    #     documents.append({
+    #         'case_id': case_id,
+    #         'document_id': f"unavailable_{doc_idx}",
+    #         'raw_doc_id': f"unavailable_{doc_idx}",
+    #         'title': f"Недоступный документ {doc_idx}",
+    #         'document_date': "",
+    #         'url': doc_url,
+    #         'document_text': "Документ недоступен",
+    #         'text_length': 0,
+    #         'document_type': "Недоступен"
+    #     })
+    except Exception as e:
+        return None
+
+
+def build_document_record(case_id, doc_idx, doc_url, title_text, full_document_text, doc_type_element):
+    """
+    Собирает document_record из заголовка, текста и категории страницы документа.
+    Общая часть для разбора через Selenium и через HTTP (html_parser).
+    """
+
+    doc_id_match = re.search(r'№([^ ]+)', title_text)
+    raw_doc_id = doc_id_match.group(
+        1) if doc_id_match else f"doc_{doc_idx}_{case_id}"
+
+    doc_id = normalize_id(raw_doc_id)
+
+    doc_date_match = re.search(
+        r'от (\d{1,2} \w+ \d{4}) г\.', title_text)
+    doc_date_raw = doc_date_match.group(1) if doc_date_match else ""
+
+    if doc_date_raw:
         try:
-            title_elements = driver.find_elements(
-                By.CSS_SELECTOR, ".col-sm-12 h3")
-            title_text = title_elements[1].text if len(
-                title_elements) > 1 else f"Документ_{doc_idx}"
-
-            doc_id_match = re.search(r'№([^ ]+)', title_text)
-            raw_doc_id = doc_id_match.group(
-                1) if doc_id_match else f"doc_{doc_idx}_{case_id}"
-
-            doc_id = normalize_id(raw_doc_id)
-
-            doc_date_match = re.search(
-                r'от (\d{1,2} \w+ \d{4}) г\.', title_text)
-            doc_date_raw = doc_date_match.group(1) if doc_date_match else ""
-
-            if doc_date_raw:
-                try:
-                    doc_date = normalize_date(doc_date_raw)
-                except:
-                    doc_date = None
-            else:
-                doc_date = None
-
-            container = driver.find_element(By.ID, "document_text_container")
-            full_document_text = container.text
-
-            lines = full_document_text.split('\n')
-            cleaned_lines = []
-
-            for line in lines:
-                # Убираем множественные пробелы
-                cleaned_line = re.sub(r' +', ' ', line)
-                # Убираем множественные запятые
-                cleaned_line = re.sub(r',+', ',', cleaned_line)
-                cleaned_line = cleaned_line.strip()
-                if cleaned_line:
-                    cleaned_lines.append(cleaned_line)
-
-            cleaned_text = '\n'.join(cleaned_lines)
-
-            text_length = len(cleaned_text)
-
-            doc_type_element = driver.find_element(
-                By.CSS_SELECTOR, ".container-fluid a[href*='category=']").text
-
-            if doc_type_element:
-                document_type = doc_type_element
-            else:
-                document_type = "Другое"
-                if "письмо" in title_text.lower():
-                    document_type = "Письмо"
-                elif "уведомление" in title_text.lower():
-                    document_type = "Уведомление"
-                elif "решение" in title_text.lower():
-                    document_type = "Решение"
-                elif "предписание" in title_text.lower():
-                    document_type = "Предписание"
-
-            document_record = {
-                'case_id': case_id,  # Связь с основным делом
-                'document_id': doc_id,
-                'raw_doc_id': raw_doc_id,
-                'title': title_text,
-                'document_date': doc_date,
-                'url': doc_url,
-                'document_text': cleaned_text if cleaned_text.strip() else None,
-                'text_length': text_length if cleaned_text.strip() else 0,
-                'document_type': document_type,
-                'added_to_qdrant': False,
-                'embedder_version': None
-            }
+            doc_date = normalize_date(doc_date_raw)
+        except:
+            doc_date = None
+    else:
+        doc_date = None
 
-            if cleaned_text.strip():
-                documents.append(document_record)
-
-            else:
-                print(f"Empty document: {doc_url}")
-
-        # except NoSuchElementException as e:
-        #     documents.append({
-        #         'case_id': case_id,
-        #         'document_id': f"unavailable_{doc_idx}",
-        #         'raw_doc_id': f"unavailable_{doc_idx}",
-        #         'title': f"Недоступный документ {doc_idx}",
-        #         'document_date': "",
-        #         'url': doc_url,
-        #         'document_text': "Документ недоступен",
-        #         'text_length': 0,
-        #         'document_type': "Недоступен"
-        #     })
-        except Exception as e:
-            continue
+    lines = full_document_text.split('\n')
+    cleaned_lines = []
 
-    return case_record, documents
+    for line in lines:
+        # Убираем множественные пробелы
+        cleaned_line = re.sub(r' +', ' ', line)
+        # Убираем множественные запятые
+        cleaned_line = re.sub(r',+', ',', cleaned_line)
+        cleaned_line = cleaned_line.strip()
+        if cleaned_line:
+            cleaned_lines.append(cleaned_line)
+
+    cleaned_text = '\n'.join(cleaned_lines)
+
+    text_length = len(cleaned_text)
+
+    if doc_type_element:
+        document_type = doc_type_element
+    else:
+        document_type = "Другое"
+        if "письмо" in title_text.lower():
+            document_type = "Письмо"
+        elif "уведомление" in title_text.lower():
+            document_type = "Уведомление"
+        elif "решение" in title_text.lower():
+            document_type = "Решение"
+        elif "предписание" in title_text.lower():
+            document_type = "Предписание"
+
+    return {
+        'case_id': case_id,  # Связь с основным делом
+        'document_id': doc_id,
+        'raw_doc_id': raw_doc_id,
+        'title': title_text,
+        'document_date': doc_date,
+        'url': doc_url,
+        'document_text': cleaned_text if cleaned_text.strip() else None,
+        'text_length': text_length if cleaned_text.strip() else 0,
+        'document_type': document_type,
+        'added_to_qdrant': False,
+        'embedder_version': None
+    }
 
 
 def parse_pages_count(driver):
@@ -500,7 +758,6 @@ def parse_pages_count(driver):
         By.XPATH, "//span[contains(text(), 'Всего:')]")
     total_text = int(total_element.text.split()[-1])
 
-    driver.close()
     return total_text
 
 
@@ -519,6 +776,18 @@ def parse_count_of_cases_from_first_page(driver):
     return count_of_cases
 
 
+def estimate_new_pages(driver, engine, metadata):
+    """Оценивает, сколько страниц с начала списка содержат ещё не сохранённые дела"""
+
+    pages_count = parse_pages_count(driver)
+    count_of_cases_at_first_page = parse_count_of_cases_from_first_page(driver)
+    new_pages = count_new_pages(pages_count, count_cases(engine, metadata),
+                                count_of_cases_at_first_page)
+
+    # Запас в одну страницу: пока идёт обход, в начало списка добавляются новые дела.
+    return min(pages_count, max(new_pages, 0) + 1)
+
+
 def save_to_json(cases: dict, documents: dict, file_for_cases='cases.json', file_for_docs='docs.json', mode='w'):
     with open(file=file_for_cases, mode=mode, encoding='utf-8') as data_file:
         json.dump(cases, data_file, ensure_ascii=False, indent=4)
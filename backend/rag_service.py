@@ -1,17 +1,46 @@
+import asyncio
 import os
+import re
 import time
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Awaitable, Dict, List, Optional, Tuple, Union
 from qdrant_client import AsyncQdrantClient
 from database import load_database_url
 from document_fetcher import AsyncDocumentFetcher
-from FlagEmbedding import BGEM3FlagModel
-from constants import EMBEDDING_MODEL
+from constants import LLM_NAME, LLM_TOKENIZER_NAME, QDRANT_COLLECTION_NAME
+from embedding_client import load_embedding_model
 from llm_service import AsyncLLMService
+from metrics import CACHE_REQUESTS, ERRORS, observe_stage
 from retriever import AsyncRetriever
-from schemas import DocumentMetadata, ErrorEvent, SourcesEvent, SourcesEventData, TokenEvent
+from session_store import SessionStore
+from schemas import (BaseStreamEvent, DocumentMetadata, ErrorEvent, QueuedEvent,
+                     QueuedEventData, SearchHit, SearchResultData, SearchResultEvent,
+                     SourcesEvent, SourcesEventData, StatsEvent, StatsEventData, StreamOptions)
+from stream_writer import NDJSONStreamWriter
+
+
+def load_llm_tokenizer():
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(LLM_TOKENIZER_NAME)
 
 
 class AsyncRAG:
+    CRITICAL_COMPONENTS = ("postgres", "embedding_model", "qdrant", "llm")
+
+    # Короткий вопрос с отсылкой к предыдущему ответу может быть уточнением:
+    # он ищется вместе с последними вопросами диалога.
+    FOLLOW_UP_MAX_WORDS = 12
+    FOLLOW_UP_MARKERS = frozenset({
+        "это", "этом", "этого", "этой", "эта", "этот", "эти", "этих",
+        "там", "тогда", "он", "она", "оно", "они", "его", "её", "ее", "их",
+        "нём", "нем", "ней", "них", "ним", "нему",
+        "ещё", "еще", "подробнее", "данном", "данной", "указанном",
+    })
+    # Вопрос, начинающийся с союза («а что было в предписании?»), тоже уточнение.
+    FOLLOW_UP_LEADING = frozenset({"а", "и"})
+    SESSION_CONTEXT_QUESTIONS = 2
+    SESSION_MAX_DOCUMENTS = 8
+
     def __init__(self):
         self.db_url = load_database_url()
         self.doc_fetcher = None
@@ -19,42 +48,147 @@ class AsyncRAG:
         self.model = None
         self.retriever = None
         self.llm = None
+        self.llm_preload = os.getenv("LLM_PRELOAD", "1") == "1"
+        self.sessions = SessionStore(
+            max_sessions=int(os.getenv("SESSION_MAX", 1000)),
+            ttl=float(os.getenv("SESSION_TTL", 1800)),
+            max_queries=self.SESSION_CONTEXT_QUESTIONS)
 
-    async def initialize(self):
+        self.components: Dict[str, Dict[str, Any]] = {
+            name: {"state": "pending", "seconds": None, "error": None}
+            for name in self.CRITICAL_COMPONENTS + ("warm_up",)
+        }
+
+    @property
+    def ready(self) -> bool:
         """
-        Инициализирует все подключения и модели.
+        Готов ли сервис обрабатывать запросы.
+        Неудачный прогрев не делает сервис неготовым.
+        """
+
+        return all(self.components[name]["state"] == "ready"
+                   for name in self.CRITICAL_COMPONENTS)
+
+    async def _run_step(self, name: str, step: Awaitable) -> None:
+        """
+        Выполняет шаг инициализации и записывает его состояние и время.
         """
 
-        print(" [1/4] Connecting to PostgreSQL", end=" ", flush=True)
+        component = self.components[name]
+        component["state"] = "initializing"
+        start_time = time.perf_counter()
+
+        try:
+            await step
+        except Exception as e:
+            component["state"] = "failed"
+            component["error"] = str(e)
+            print(f" [{name}] FAILED: {e}")
+            raise
+        finally:
+            component["seconds"] = round(time.perf_counter() - start_time, 3)
+
+        component["state"] = "ready"
+        print(f" [{name}] OK in {component['seconds']} s")
+
+    async def _init_postgres(self) -> None:
         self.doc_fetcher = AsyncDocumentFetcher(self.db_url)
         await self.doc_fetcher._get_table()
-        print("OK")
 
-        print(" [2/4] Loading embedding model", end=" ", flush=True)
-        self.model = BGEM3FlagModel(
-            EMBEDDING_MODEL, use_fp16=True, device='cuda')
-        print("OK")
+    async def _init_embedding_model(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.model = await loop.run_in_executor(None, load_embedding_model)
 
-        print(" [3/4] Connecting to Qdrant", end=" ", flush=True)
+    async def _init_qdrant(self) -> None:
         qdrant_host = os.getenv("QDRANT_HOST")
         qdrant_port = int(os.getenv("QDRANT_PORT"))
         self.client = AsyncQdrantClient(
             host=qdrant_host, port=qdrant_port, prefer_grpc=True)
-        self.retriever = AsyncRetriever(
-            self.client, self.model, self.doc_fetcher)
-        print("OK")
+        await self.client.collection_exists(QDRANT_COLLECTION_NAME)
 
-        print(" [4/4] Initializing Ollama", end=" ", flush=True)
-        ollama_host = os.getenv("OLLAMA_HOST")
-        ollama_port = os.getenv("OLLAMA_PORT")
+    async def _init_llm(self) -> None:
+        loop = asyncio.get_running_loop()
+        llm_hosts = self._load_ollama_hosts()
+        llm_tokenizer = await loop.run_in_executor(None, load_llm_tokenizer)
         self.llm = AsyncLLMService(
-            llm_host=f"{ollama_host}:{ollama_port}",
-            model_name="qwen3:8b",
-            context_window_size=20000
+            llm_hosts=llm_hosts,
+            tokenizer=llm_tokenizer,
+            model_name=LLM_NAME,
+            context_token_budget=8192,
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", len(llm_hosts))),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", 32)),
+            rate_limit=int(os.getenv("LLM_RATE_LIMIT", 20))
+        )
+        await self.llm.start()
+
+    async def _warm_up(self) -> None:
+        """
+        Прогревает модели до первого запроса: прогоняет пробный эмбеддинг
+        (CUDA-ядра, аллокатор) и загружает LLM в память Ollama.
+        """
+
+        loop = asyncio.get_running_loop()
+        warm_up_encode = loop.run_in_executor(
+            None,
+            lambda: self.model.encode("Прогрев модели",
+                                      return_dense=True,
+                                      return_sparse=True,
+                                      return_colbert_vecs=True))
+
+        await asyncio.gather(warm_up_encode, self.llm.warm_up())
+
+    async def initialize(self):
+        """
+        Инициализирует все подключения и модели.
+
+        Независимые компоненты поднимаются параллельно,
+        затем модели прогреваются.
+        """
+
+        start_time = time.perf_counter()
+
+        await asyncio.gather(
+            self._run_step("postgres", self._init_postgres()),
+            self._run_step("embedding_model", self._init_embedding_model()),
+            self._run_step("qdrant", self._init_qdrant()),
+            self._run_step("llm", self._init_llm()),
         )
-        print("OK")
+
+        self.retriever = AsyncRetriever(
+            self.client, self.model, self.doc_fetcher,
+            text_cache_size=int(os.getenv("DOC_TEXT_CACHE_SIZE", 256)))
+
+        try:
+            await self._run_step("warm_up", self._warm_up())
+        except Exception:
+            pass
+
+        print(f"Initialized in {time.perf_counter() - start_time:.2f} s")
         print("-" * 50)
 
+    def readiness(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "components": self.components,
+            "llm_backends": self.llm.pool.state() if self.llm else [],
+        }
+
+    def _load_ollama_hosts(self) -> List[str]:
+        """
+        Возвращает адреса инстансов Ollama.
+
+        Список через запятую берётся из OLLAMA_HOSTS,
+        иначе используется пара OLLAMA_HOST и OLLAMA_PORT.
+        """
+
+        hosts = os.getenv("OLLAMA_HOSTS")
+        if hosts:
+            return [host.strip() for host in hosts.split(",") if host.strip()]
+
+        ollama_host = os.getenv("OLLAMA_HOST")
+        ollama_port = os.getenv("OLLAMA_PORT")
+        return [f"{ollama_host}:{ollama_port}"]
+
     async def terminal_stream(self, query: str) -> None:
         """
         Обрабатывает один запрос через терминал.
@@ -90,6 +224,10 @@ class AsyncRAG:
         full_response = ""
         try:
             async for chunk in self.llm.generate_stream(query=query, documents=search_results):
+                if isinstance(chunk, dict):
+                    if chunk["type"] == "queued":
+                        print(f"[queued: {chunk['position']}]", flush=True)
+                    continue
                 print(chunk, end="", flush=True)
                 full_response += chunk
         except Exception as e:
@@ -99,48 +237,246 @@ class AsyncRAG:
         total_time = time.time() - start_time
         print(f"Total time elapsed: {total_time}")
 
-    async def chat_stream(self, query: str) -> AsyncGenerator[str, None]:
+    async def chat_stream(self, query: str,
+                          client_id: Optional[str] = None,
+                          stream_options: Optional[StreamOptions] = None,
+                          session_id: Optional[str] = None,
+                          history: Optional[List[Dict]] = None) -> AsyncGenerator[str, None]:
         """
         Обрабатывает запрос для API.
         Сначала возвращает источники, потом стрим токенов от LLM.
         """
 
+        stream_options = stream_options or StreamOptions()
+        writer = NDJSONStreamWriter(window_ms=stream_options.coalesce_ms,
+                                    max_bytes=stream_options.coalesce_bytes)
+
+        # Сессия привязана к клиенту, чтобы чужой session_id не открывал документы.
+        session_key = f"{client_id}:{session_id}" if session_id else None
+
+        async for line in writer.stream(self._chat_events(query, client_id, session_key, history)):
+            yield line
+
+    def _is_follow_up(self, query: str) -> bool:
+        words = re.findall(r"\w+", query.lower())
+
+        if not words or len(words) > self.FOLLOW_UP_MAX_WORDS:
+            return False
+
+        return (words[0] in self.FOLLOW_UP_LEADING
+                or any(word in self.FOLLOW_UP_MARKERS for word in words))
+
+    def _retrieval_query(self, query: str, session: Optional[Dict[str, Any]]) -> str:
+        """
+        Запрос для поиска. Уточнение («а что было в предписании?») само
+        по себе ищется плохо, поэтому к нему добавляются последние
+        вопросы диалога.
+        """
+
+        if not session or not self._is_follow_up(query):
+            return query
+
+        return " ".join(session["queries"][-self.SESSION_CONTEXT_QUESTIONS:] + [query])
+
+    def _merge_documents(self, cached: List[Dict[str, Any]],
+                         found: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Дополняет документы сессии новыми результатами поиска.
+
+        Скоры colbert разных запросов несравнимы: сумма MaxSim растёт
+        с длиной вопроса. Поэтому скоры документов сессии переводятся
+        в масштаб текущего поиска (доля от лучшего скора своего поиска),
+        а у найденных снова документов берётся новый скор.
+        """
+
+        found_top = max(doc["score"] for doc in found)
+        cached_top = max((doc["score"] for doc in cached), default=0.0)
+        scale = found_top / cached_top if cached_top > 0 else 0.0
+
+        merged = {doc["doc_id"]: doc for doc in found}
+        for doc in cached:
+            if doc["doc_id"] not in merged:
+                merged[doc["doc_id"]] = {**doc, "score": doc["score"] * scale}
+
+        return sorted(merged.values(), key=lambda x: x["score"],
+                      reverse=True)[:self.SESSION_MAX_DOCUMENTS]
+
+    async def _find_for_turn(self, query: str, session_key: Optional[str],
+                             timings: Optional[Dict[str, float]] = None
+                             ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Решает, как получить документы для хода диалога. Уточняющий
+        вопрос ищется вместе с предыдущими вопросами, а режим выбирается
+        по пересечению найденного с документами сессии:
+        - reuse: всё найденное уже есть в сессии, документы сессии берутся
+          как есть - промпт не меняется, и Ollama переиспользует KV-кэш;
+        - extend: пересечение частичное, документы объединяются;
+        - retrieve: первый вопрос или смена темы, обычный поиск.
+
+        Возвращает документы и выбранный режим.
+        """
+
+        session = self.sessions.get(session_key) if session_key else None
+        cached = self.sessions.documents(session) if session else []
+
+        found = await self.retriever.find_documents(
+            query=self._retrieval_query(query, session), timings=timings)
+        cached_ids = {doc["doc_id"] for doc in cached}
+        overlap = sum(doc["doc_id"] in cached_ids for doc in found)
+
+        if found and overlap == len(found):
+            mode, documents = "reuse", cached
+        elif overlap:
+            mode, documents = "extend", self._merge_documents(cached, found)
+        else:
+            mode, documents = "retrieve", found
+
+        if session_key:
+            result = {"reuse": "hit", "extend": "partial"}.get(mode, "miss")
+            CACHE_REQUESTS.inc(cache="session", result=result)
+
+        return documents, mode
+
+    @staticmethod
+    def _build_stats(mode: Optional[str], timings: Dict[str, float],
+                     llm_stats: Dict[str, Any], ttft: Optional[float],
+                     total: float) -> StatsEvent:
+        def to_ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        def ns_to_ms(nanoseconds: Optional[int]) -> Optional[float]:
+            return round(nanoseconds / 1e6, 1) if nanoseconds is not None else None
+
+        return StatsEvent(data=StatsEventData(
+            retrieval_mode=mode,
+            retrieval_ms={stage: to_ms(seconds) for stage, seconds in timings.items()},
+            context_ms=to_ms(llm_stats.get("context_seconds")),
+            documents=llm_stats.get("documents", []),
+            prompt_eval_count=llm_stats.get("prompt_eval_count"),
+            prompt_eval_ms=ns_to_ms(llm_stats.get("prompt_eval_duration")),
+            eval_count=llm_stats.get("eval_count"),
+            eval_ms=ns_to_ms(llm_stats.get("eval_duration")),
+            ttft_ms=to_ms(ttft),
+            total_ms=to_ms(total),
+        ))
+
+    async def _chat_events(self, query: str,
+                           client_id: Optional[str] = None,
+                           session_key: Optional[str] = None,
+                           history: Optional[List[Dict]] = None
+                           ) -> AsyncGenerator[Union[str, BaseStreamEvent], None]:
+        """
+        Поток событий чата: токены LLM строками, остальное схемами событий.
+        Завершается событием stats.
+        """
+
+        warm_up_task = None
+        start_time = time.perf_counter()
+        ttft = None
+        mode = None
+        timings: Dict[str, float] = {}
+        llm_stats: Dict[str, Any] = {}
+
         try:
-            search_results = await self.retriever.search(query=query)
+            try:
+                # Лимит клиента и очередь проверяются до поиска: отклонённый
+                # запрос не должен тратить эмбеддинг, Qdrant и Postgres.
+                self.llm.check_admission(client_id)
 
-            sources_schemas = []
-            for doc in search_results:
-                sources_schemas.append(
-                    DocumentMetadata(
-                        doc_id=doc.get("doc_id"),
-                        url=doc.get("url"),
-                        best_chunk=doc.get("best_chunk", ""),
-                        score=doc.get("score")
+                search_results, mode = await self._find_for_turn(query, session_key, timings)
+
+                sources_schemas = []
+                for doc in search_results:
+                    sources_schemas.append(
+                        DocumentMetadata(
+                            doc_id=doc.get("doc_id"),
+                            url=doc.get("url"),
+                            best_chunk=doc.get("best_chunk", ""),
+                            score=doc.get("score")
+                        )
                     )
-                )
 
-            event = SourcesEvent(data=SourcesEventData(items=sources_schemas))
-            yield event.model_dump_json(ensure_ascii=False) + "\n"
+                yield SourcesEvent(data=SourcesEventData(items=sources_schemas))
 
-            if not search_results:
-                no_docs_event = TokenEvent(
-                    data="К сожалению, релевантные документы не найдены.")
-                yield no_docs_event.model_dump_json(ensure_ascii=False) + "\n"
+                if not search_results:
+                    yield "К сожалению, релевантные документы не найдены."
+                else:
+                    if self.llm_preload:
+                        warm_up_task = asyncio.create_task(self.llm.warm_up())
 
-            async for chunk in self.llm.generate_stream(query=query, documents=search_results):
-                token_event = TokenEvent(data=chunk)
-                yield token_event.model_dump_json(ensure_ascii=False) + "\n"
+                    # Тексты документов (и сессии тоже) берутся из кэша ретривера или Postgres,
+                    # там же восстанавливаются тексты чанков компактного payload.
+                    await self.retriever.fetch_texts(search_results, timings)
+
+                    if session_key:
+                        self.sessions.put(session_key, search_results, query)
+
+                async for chunk in self.llm.generate_stream(query=query,
+                                                            documents=search_results,
+                                                            client_id=client_id,
+                                                            history=history):
+                    if isinstance(chunk, dict):
+                        if chunk["type"] == "queued":
+                            yield QueuedEvent(
+                                data=QueuedEventData(position=chunk["position"]))
+                        elif chunk["type"] == "stats":
+                            llm_stats = chunk
+                        continue
+
+                    if ttft is None:
+                        ttft = time.perf_counter() - start_time
+                        observe_stage("ttft", ttft)
+
+                    yield chunk
+
+            except Exception as e:
+                print(f"Error in chat stream: {e}")
+                ERRORS.inc(stage="chat")
+                yield ErrorEvent(data=str(e))
+
+            yield self._build_stats(mode, timings, llm_stats, ttft,
+                                    time.perf_counter() - start_time)
+
+        finally:
+            if warm_up_task and not warm_up_task.done():
+                warm_up_task.cancel()
+            observe_stage("total", time.perf_counter() - start_time)
+
+    async def search_stream(self, queries: List[str], limit: int = 5,
+                            with_texts: bool = False) -> AsyncGenerator[str, None]:
+        """
+        Пакетный поиск для API: по строке NDJSON на каждый запрос.
+        """
+
+        try:
+            async for index, results in self.retriever.iter_search_batch(
+                    queries, limit=limit, with_texts=with_texts):
+                items = [
+                    SearchHit(
+                        doc_id=doc.get("doc_id"),
+                        url=doc.get("url") or "",
+                        best_chunk=doc.get("best_chunk", ""),
+                        score=doc.get("score"),
+                        full_text=doc.get("full_text") if with_texts else None
+                    )
+                    for doc in results
+                ]
+
+                yield NDJSONStreamWriter.dump_event(SearchResultEvent(
+                    data=SearchResultData(index=index, query=queries[index], items=items)))
 
         except Exception as e:
-            error_event = ErrorEvent(data=str(e))
-            print(f"Error in chat stream: {e}")
-            yield error_event.model_dump_json(ensure_ascii=False) + "\n"
+            print(f"Error in search stream: {e}")
+            ERRORS.inc(stage="search")
+            yield NDJSONStreamWriter.dump_event(ErrorEvent(data=str(e)))
 
     async def close(self) -> None:
         """
         Закрывает все подключения.
         """
 
+        if self.llm:
+            await self.llm.close()
         if self.client:
             await self.client.close()
         if self.doc_fetcher:
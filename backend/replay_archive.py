@@ -0,0 +1,127 @@
+"""
+Повторный разбор архива страниц (HtmlArchive) без обращения к сайту ФАС.
+
+Страницы дел и документов, сохранённые ingest.py, разбираются
+теми же правилами, что и при парсинге (build_case_record,
+build_document_record), в пуле процессов. Результат пишется в JSONL:
+одна строка на дело с его документами. С --save-to-db новые дела
+и документы сохраняются в БД через save_to_db.
+
+Запуск из каталога backend:
+    python replay_archive.py --archive data/html_archive.sqlite --output data/replay.jsonl --workers 8
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from html_archive import HtmlArchive
+from html_parser import parse_case_page, parse_document_page
+
+_worker_archive: Optional[HtmlArchive] = None
+
+
+def _init_worker(archive_path: str) -> None:
+    global _worker_archive
+    _worker_archive = HtmlArchive(archive_path, readonly=True)
+
+
+def replay_case(archive: HtmlArchive, case_url: str) -> Dict[str, Any]:
+    """
+    Разбирает дело и его документы из архива. Документы, которых
+    нет в архиве или которые не разобрались, перечисляются в missing.
+    """
+
+    result = {"case_url": case_url, "case": None, "documents": [], "missing": [], "error": None}
+
+    try:
+        case, doc_urls = parse_case_page(archive.get(case_url), case_url)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    result["case"] = case
+
+    for doc_idx, doc_url in enumerate(doc_urls):
+        html = archive.get(doc_url)
+        record = None
+        if html is not None:
+            try:
+                record = parse_document_page(html, case["case_id"], doc_idx, doc_url)
+            except Exception as e:
+                print(f"HTML parsing failed for {doc_url}: {e}")
+
+        if record is None:
+            result["missing"].append(doc_url)
+        elif record["document_text"]:
+            result["documents"].append(record)
+
+    return result
+
+
+def _replay_in_worker(case_url: str) -> Dict[str, Any]:
+    return replay_case(_worker_archive, case_url)
+
+
+def main(args: argparse.Namespace) -> None:
+    with HtmlArchive(args.archive, readonly=True) as archive:
+        case_urls = list(archive.urls(kind="case"))
+    if args.limit:
+        case_urls = case_urls[:args.limit]
+    print(f"Replaying {len(case_urls)} cases from {args.archive} with {args.workers} workers")
+
+    engine = metadata = None
+    if args.save_to_db:
+        from database import load_database_url, create_db_engine, create_metadata, save_to_db
+
+        engine = create_db_engine(load_database_url(), logging=False)
+        metadata = create_metadata(engine)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    cases = documents = failed = missing = 0
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.archive,)) as executor, \
+            open(args.output, "w", encoding="utf-8") as output:
+        for result in executor.map(_replay_in_worker, case_urls, chunksize=args.chunksize):
+            if result["error"] is not None:
+                print(f"Case parsing error: {result['case_url']}: {result['error']}")
+                failed += 1
+                continue
+
+            cases += 1
+            documents += len(result["documents"])
+            missing += len(result["missing"])
+
+            output.write(json.dumps({"case": result["case"], "documents": result["documents"]},
+                                    ensure_ascii=False) + "\n")
+
+            if engine is not None:
+                save_to_db(result["case"], result["documents"], engine, metadata)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"{cases} cases, {documents} documents in {elapsed:.1f} s "
+          f"({cases / elapsed if elapsed else 0:.1f} cases/s); "
+          f"{failed} cases failed, {missing} documents missing or unparsed")
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Re-parse archived FAS pages")
+    arg_parser.add_argument("--archive", default=os.getenv("HTML_ARCHIVE_PATH", "data/html_archive.sqlite"))
+    arg_parser.add_argument("--output", default="data/replay.jsonl", help="Путь к JSONL с результатами")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    arg_parser.add_argument("--chunksize", type=int, default=16,
+                            help="Дел на одну задачу процесса")
+    arg_parser.add_argument("--limit", type=int, default=None, help="Разобрать только первые N дел")
+    arg_parser.add_argument("--save-to-db", action="store_true",
+                            help="Сохранить новые дела и документы в БД")
+
+    main(arg_parser.parse_args())
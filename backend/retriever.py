@@ -1,21 +1,34 @@
 import asyncio
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import TYPE_CHECKING, AsyncGenerator, List, Dict, Any, Optional, Tuple, Union
 from qdrant_client import AsyncQdrantClient, models
-from FlagEmbedding import BGEM3FlagModel
+from chunkers.text_normalizer import TextNormalizer
 from constants import QDRANT_COLLECTION_NAME
 from document_fetcher import AsyncDocumentFetcher
+from metrics import stage_timer
+
+if TYPE_CHECKING:
+    from FlagEmbedding import BGEM3FlagModel
 
 
 class AsyncRetriever:
     def __init__(self,
                  qdrant_client: AsyncQdrantClient,
-                 model: BGEM3FlagModel,
-                 doc_fetcher: AsyncDocumentFetcher):
+                 model: "BGEM3FlagModel",
+                 doc_fetcher: AsyncDocumentFetcher,
+                 text_cache_size: int = 256):
         self.client = qdrant_client
         self.model = model
         self.doc_fetcher = doc_fetcher
         self.collection_name = QDRANT_COLLECTION_NAME
 
+        # Тексты документов для чанков из компактного payload (без text):
+        # doc_id -> (full_text, нормализованный текст), в порядке LRU.
+        # find_documents берёт тексты только отсюда, fetch_texts дополняет кэш.
+        self.normalizer = TextNormalizer(max_cached=0)
+        self.text_cache_size = text_cache_size
+        self._text_cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
     def _convert_sparse_vector(self, sparse_weights: dict) -> models.SparseVector:
         """
         Конвертирует sparse веса, полученные из модели BGE
@@ -40,84 +53,303 @@ class AsyncRetriever:
             values=sparse_values
         )
 
-    async def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """
-        Ищет релевантные документы по запросу.
-        """
-
-        loop = asyncio.get_running_loop()
-        query_embedding = await loop.run_in_executor(
-            None,
-            lambda: self.model.encode(
-                query,
-                return_dense=True,
-                return_sparse=True,
-                return_colbert_vecs=True
-            )
+    def _encode(self, queries: Union[str, List[str]]) -> Dict[str, Any]:
+        return self.model.encode(
+            queries,
+            return_dense=True,
+            return_sparse=True,
+            return_colbert_vecs=True
         )
 
-        dense_vec = query_embedding["dense_vecs"].tolist()
-        sparse_vec = self._convert_sparse_vector(query_embedding["lexical_weights"])
-        colbert_vecs = [vec.tolist() for vec in query_embedding["colbert_vecs"]]
+    def _build_query(self, dense_vec, sparse_weights: dict, colbert_vecs,
+                     limit: int) -> Dict[str, Any]:
+        """
+        Параметры гибридного запроса: dense и sparse кандидаты,
+        переранжированные по colbert.
+        """
 
         prefetch_limit = limit * 3
 
-        search_result = await self.client.query_points(
-            collection_name=self.collection_name,
-            prefetch=[
+        return {
+            "prefetch": [
                 models.Prefetch(
-                    query=dense_vec,
+                    query=dense_vec.tolist(),
                     using="dense",
                     limit=prefetch_limit
                 ),
                 models.Prefetch(
-                    query=sparse_vec,
+                    query=self._convert_sparse_vector(sparse_weights),
                     using="sparse",
                     limit=prefetch_limit
                 )
             ],
-            query=colbert_vecs,
-            using="colbert",
-            limit=prefetch_limit,
-            with_payload=True
-        )
+            "query": [vec.tolist() for vec in colbert_vecs],
+            "using": "colbert",
+            "limit": prefetch_limit,
+            "with_payload": True
+        }
+
+    def _group_points(self, points, limit: int) -> List[Dict[str, Any]]:
+        """
+        Группирует найденные чанки по документам.
+        """
 
         unique_docs: Dict[str, Dict] = {}
 
-        for point in search_result.points:
+        for point in points:
             payload = point.payload
             doc_id = payload.get("doc_id")
-
-            if doc_id in unique_docs:
-                if point.score > unique_docs[doc_id]["score"]:
-                    unique_docs[doc_id]["score"] = point.score
-                    unique_docs[doc_id]["best_chunk"] = payload.get("text", "")
+            if "text" in payload:
+                text = payload["text"]
+            elif "start_char" in payload:
+                # Компактный payload: текст восстановит _fill_chunk_texts.
+                text = None
             else:
+                text = ""
+
+            if doc_id not in unique_docs:
+                if len(unique_docs) >= limit:
+                    continue
+
                 unique_docs[doc_id] = {
                     "doc_id": doc_id,
                     "score": point.score,
                     # "title": payload.get("title", ""),
-                    "best_chunk": payload.get("text", ""),
-                    "url": None,
+                    "best_chunk": text,
+                    "chunks": [],
+                    "url": payload.get("url"),
                     "full_text": None
                 }
+            elif point.score > unique_docs[doc_id]["score"]:
+                unique_docs[doc_id]["score"] = point.score
+                unique_docs[doc_id]["best_chunk"] = text
 
-            if len(unique_docs) >= limit:
-                break
+            unique_docs[doc_id]["chunks"].append({
+                "text": text,
+                "score": point.score,
+                "index": payload.get("index"),
+                "start_char": payload.get("start_char"),
+                "end_char": payload.get("end_char")
+            })
 
-        sorted_results = sorted(
+        return sorted(
             unique_docs.values(),
             key=lambda x: x["score"],
             reverse=True
         )[:limit]
 
-        doc_ids_to_fetch = [doc["doc_id"] for doc in sorted_results]
+    @staticmethod
+    def _is_compact(doc: Dict[str, Any]) -> bool:
+        return any(chunk["text"] is None for chunk in doc["chunks"])
 
-        docs_data_map = await self.doc_fetcher.get_texts_and_urls_by_ids(doc_ids_to_fetch)
+    async def _fill_chunk_texts(self, results: List[Dict[str, Any]],
+                                timings: Optional[Dict[str, float]] = None,
+                                cached_only: bool = False) -> None:
+        """
+        Восстанавливает тексты чанков из компактного payload.
 
-        for result in sorted_results:
-            doc_data = docs_data_map.get(result["doc_id"])
-            result["url"] = doc_data.get("url")
-            result["full_text"] = doc_data.get("full_text")
+        Чанкер режет нормализованный текст документа, поэтому текст
+        чанка - срез normalize(full_text)[start_char:end_char].
+        Нормализованный текст берётся из кэша, иначе считается по уже
+        загруженному full_text. С cached_only используется только кэш:
+        документы без текста в кэше остаются с text=None и пустым best_chunk.
+        """
+
+        compact_docs = [doc for doc in results if self._is_compact(doc)]
+        if not compact_docs:
+            return
+
+        # Тексты для этого вызова собираются в локальный словарь: LRU нужен
+        # только между запросами и может вытеснить документы текущего батча.
+        texts: Dict[str, Tuple[str, str]] = {}
+        to_normalize: Dict[str, str] = {}
+        for doc in compact_docs:
+            doc_id = doc["doc_id"]
+            if doc_id in texts or doc_id in to_normalize:
+                continue
+
+            cached = self._text_cache.get(doc_id)
+            if cached is not None:
+                self._text_cache.move_to_end(doc_id)
+                texts[doc_id] = cached
+            elif doc["full_text"] is not None and not cached_only:
+                to_normalize[doc_id] = doc["full_text"]
+
+        if to_normalize:
+            loop = asyncio.get_running_loop()
+            with stage_timer("normalize", timings):
+                for doc_id, full_text in to_normalize.items():
+                    normalized = await loop.run_in_executor(
+                        None, self.normalizer.normalize, full_text)
+                    texts[doc_id] = (full_text, normalized)
+                    self._cache_text(doc_id, full_text, normalized)
+
+        for doc in compact_docs:
+            if doc["doc_id"] not in texts:
+                doc["best_chunk"] = doc["best_chunk"] or ""
+                continue
+
+            full_text, normalized = texts[doc["doc_id"]]
+            for chunk in doc["chunks"]:
+                if chunk["text"] is None:
+                    chunk["text"] = normalized[chunk["start_char"]:chunk["end_char"]]
+
+            best = max(doc["chunks"], key=lambda chunk: chunk["score"])
+            doc["best_chunk"] = best["text"]
+            doc["full_text"] = doc["full_text"] or full_text
+
+    def _cache_text(self, doc_id: str, full_text: str, normalized: str) -> None:
+        self._text_cache[doc_id] = (full_text, normalized)
+        self._text_cache.move_to_end(doc_id)
+        while len(self._text_cache) > self.text_cache_size:
+            self._text_cache.popitem(last=False)
+
+    async def _fill_missing_urls(self, results: List[Dict[str, Any]],
+                                 timings: Optional[Dict[str, float]] = None) -> None:
+        """
+        Чанки, загруженные до появления url в payload, добираем лёгким запросом.
+        """
+
+        missing_urls = list(dict.fromkeys(doc["doc_id"] for doc in results if not doc["url"]))
+        if not missing_urls:
+            return
+
+        with stage_timer("postgres", timings):
+            urls_map = await self.doc_fetcher.get_urls_by_ids(missing_urls)
+        for result in results:
+            if not result["url"]:
+                result["url"] = urls_map.get(result["doc_id"])
+
+    async def find_documents(self, query: str, limit: int = 5,
+                             timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Первая фаза поиска: эмбеддинг запроса и поиск в Qdrant.
+
+        Возвращает документы с лучшим чанком, скором и URL,
+        но без полного текста (full_text=None). Postgres здесь не
+        используется: у чанков компактного payload текст есть, только если
+        документ в кэше текстов, остальные заполнит fetch_texts.
+        Длительности этапов добавляются в timings, если он передан.
+        """
+
+        loop = asyncio.get_running_loop()
+        with stage_timer("encode", timings):
+            query_embedding = await loop.run_in_executor(None, self._encode, query)
+
+        with stage_timer("qdrant", timings):
+            search_result = await self.client.query_points(
+                collection_name=self.collection_name,
+                **self._build_query(query_embedding["dense_vecs"],
+                                    query_embedding["lexical_weights"],
+                                    query_embedding["colbert_vecs"],
+                                    limit)
+            )
+
+        sorted_results = self._group_points(search_result.points, limit)
+        await self._fill_chunk_texts(sorted_results, cached_only=True)
+        await self._fill_missing_urls(sorted_results, timings)
 
         return sorted_results
+
+    async def fetch_texts(self, results: List[Dict[str, Any]],
+                          timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Вторая фаза поиска: подгружает полные тексты найденных документов
+        и по ним восстанавливает тексты чанков из компактного payload.
+        Документы, текст которых уже загружен (full_text), пропускаются.
+        """
+
+        # Тексты из кэша не нужно загружать из Postgres.
+        await self._fill_chunk_texts(results, cached_only=True)
+
+        doc_ids_to_fetch = list(dict.fromkeys(doc["doc_id"] for doc in results
+                                              if doc["full_text"] is None))
+        if doc_ids_to_fetch:
+            with stage_timer("postgres", timings):
+                docs_data_map = await self.doc_fetcher.get_texts_and_urls_by_ids(doc_ids_to_fetch)
+
+            for result in results:
+                if result["full_text"] is not None:
+                    continue
+                doc_data = docs_data_map.get(result["doc_id"], {})
+                result["url"] = result["url"] or doc_data.get("url")
+                result["full_text"] = doc_data.get("full_text")
+
+        await self._fill_chunk_texts(results, timings)
+
+        return results
+
+    async def search(self, query: str, limit: int = 5,
+                     timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Ищет релевантные документы по запросу.
+        """
+
+        results = await self.find_documents(query, limit=limit, timings=timings)
+
+        return await self.fetch_texts(results, timings)
+
+    async def _search_batch_part(self, queries: List[str], limit: int,
+                                 with_texts: bool) -> List[List[Dict[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        with stage_timer("encode_batch"):
+            embeddings = await loop.run_in_executor(None, self._encode, queries)
+
+        requests = [
+            models.QueryRequest(**self._build_query(embeddings["dense_vecs"][i],
+                                                    embeddings["lexical_weights"][i],
+                                                    embeddings["colbert_vecs"][i],
+                                                    limit))
+            for i in range(len(queries))
+        ]
+
+        with stage_timer("qdrant_batch"):
+            responses = await self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=requests
+            )
+
+        results = [self._group_points(response.points, limit) for response in responses]
+
+        # Тексты или URL всех запросов пачки добираются одним SQL-запросом.
+        # Для чанков компактного payload тексты документов нужны всегда.
+        all_docs = [doc for query_results in results for doc in query_results]
+        await self.fetch_texts(all_docs if with_texts
+                               else [doc for doc in all_docs if self._is_compact(doc)])
+        await self._fill_missing_urls(all_docs)
+
+        return results
+
+    async def iter_search_batch(self, queries: List[str], limit: int = 5,
+                                with_texts: bool = False,
+                                batch_size: int = 32
+                                ) -> AsyncGenerator[Tuple[int, List[Dict[str, Any]]], None]:
+        """
+        Ищет документы сразу для многих запросов.
+
+        Запросы обрабатываются пачками по batch_size: один батч
+        эмбеддингов, один пакетный запрос в Qdrant и один SQL-запрос
+        на пачку. Отдаёт пары (номер запроса, результаты) по мере готовности.
+        """
+
+        for start in range(0, len(queries), batch_size):
+            part = queries[start:start + batch_size]
+            results = await self._search_batch_part(part, limit, with_texts)
+
+            for offset, query_results in enumerate(results):
+                yield start + offset, query_results
+
+    async def search_batch(self, queries: List[str], limit: int = 5,
+                           with_texts: bool = False,
+                           batch_size: int = 32) -> List[List[Dict[str, Any]]]:
+        """
+        То же, что iter_search_batch, но возвращает все результаты списком.
+        """
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+
+        async for index, query_results in self.iter_search_batch(
+                queries, limit=limit, with_texts=with_texts, batch_size=batch_size):
+            results[index] = query_results
+
+        return results
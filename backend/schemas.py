@@ -1,4 +1,4 @@
-from typing import List, Optional, Literal, Union
+from typing import Dict, List, Optional, Literal, Union
 from pydantic import BaseModel, Field
 
 
@@ -10,14 +10,35 @@ class ChatMessage(BaseModel):
     role: Literal["user", "assistant", "system"]
     content: str
 
+class StreamOptions(BaseModel):
+    """
+    Настройки склейки токенов в потоке ответа.
+    Нулевое окно отключает склейку: каждый токен уходит отдельным событием.
+    """
+
+    coalesce_ms: float = Field(default=25, ge=0, le=1000, description="Окно склейки токенов, мс")
+    coalesce_bytes: int = Field(default=256, ge=0, le=65536, description="Порог размера склеенного текста, байт")
+
 class ChatRequest(BaseModel):
     """
     Главная модель для чата.
     Фронт отправляет запросы через неё.
     """
 
-    query: str = Field(..., min_length=5, description="Вопрос пользователя")
+    # Грубый предел по символам; точная обрезка по токенам - в AsyncLLMService.
+    query: str = Field(..., min_length=5, max_length=4000, description="Вопрос пользователя")
     history: List[ChatMessage] = Field(default=[], description="История диалога для контекста")
+    session_id: Optional[str] = Field(default=None, max_length=128, description="ID диалога для переиспользования найденных документов")
+    stream_options: StreamOptions = Field(default_factory=StreamOptions, description="Настройки потока ответа")
+
+class SearchRequest(BaseModel):
+    """
+    Модель для пакетного поиска без генерации ответа.
+    """
+
+    queries: List[str] = Field(..., min_length=1, max_length=10000, description="Поисковые запросы")
+    limit: int = Field(default=5, ge=1, le=50, description="Число документов на запрос")
+    with_texts: bool = Field(default=False, description="Возвращать полные тексты документов")
 
 class DocumentMetadata(BaseModel):
     """
@@ -29,6 +50,13 @@ class DocumentMetadata(BaseModel):
     best_chunk: str = Field(..., description="Наиболее релевантный фрагмент текста")
     score: float
 
+class SearchHit(DocumentMetadata):
+    """
+    Найденный документ в ответе пакетного поиска.
+    """
+
+    full_text: Optional[str] = None
+
 
 class SourcesEventData(BaseModel):
     """
@@ -46,6 +74,51 @@ class TokenEventData(BaseModel):
 
     text: str
 
+class DocumentContextStats(BaseModel):
+    """
+    Сколько текста документа попало в контекст LLM.
+    """
+
+    doc_id: str
+    chars: int
+    tokens: int
+
+class StatsEventData(BaseModel):
+    """
+    Данные итогового события со статистикой ответа.
+    type='stats'
+    Времена в миллисекундах.
+    """
+
+    retrieval_mode: Optional[str] = Field(default=None, description="reuse, extend или retrieve")
+    retrieval_ms: Dict[str, float] = Field(default_factory=dict, description="Этапы поиска: encode, qdrant, postgres")
+    context_ms: Optional[float] = None
+    documents: List[DocumentContextStats] = Field(default_factory=list)
+    prompt_eval_count: Optional[int] = Field(default=None, description="Токенов промпта, посчитанных Ollama (prefill)")
+    prompt_eval_ms: Optional[float] = None
+    eval_count: Optional[int] = Field(default=None, description="Сгенерированных токенов (decode)")
+    eval_ms: Optional[float] = None
+    ttft_ms: Optional[float] = Field(default=None, description="Время до первого токена ответа")
+    total_ms: float
+
+class QueuedEventData(BaseModel):
+    """
+    Данные для события ожидания в очереди на генерацию.
+    type='queued'
+    """
+
+    position: int = Field(..., description="Позиция запроса в очереди, начиная с 1")
+
+class SearchResultData(BaseModel):
+    """
+    Данные для события с результатами одного поискового запроса.
+    type='result'
+    """
+
+    index: int = Field(..., description="Номер запроса в SearchRequest.queries")
+    query: str
+    items: List[SearchHit]
+
 class ErrorEventData(BaseModel):
     """
     Данные для события с передачей ошибки.
@@ -66,6 +139,18 @@ class TokenEvent(BaseStreamEvent):
     type: Literal["token"] = "token"
     data: str
 
+class StatsEvent(BaseStreamEvent):
+    type: Literal["stats"] = "stats"
+    data: StatsEventData
+
+class QueuedEvent(BaseStreamEvent):
+    type: Literal["queued"] = "queued"
+    data: QueuedEventData
+
+class SearchResultEvent(BaseStreamEvent):
+    type: Literal["result"] = "result"
+    data: SearchResultData
+
 class ErrorEvent(BaseStreamEvent):
     type: Literal["error"] = "error"
     data: str
\ No newline at end of file
@@ -0,0 +1,185 @@
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+from parser import create_chrome_driver, parse_one_case
+
+
+class PoliteDriver:
+    """
+    Обёртка над WebDriver, выдерживающая паузу не меньше min_delay
+    (плюс случайные до jitter секунд) между загрузками страниц.
+    Остальные атрибуты проксируются в исходный драйвер.
+    """
+
+    def __init__(self, driver, min_delay: float = 1.0, jitter: float = 0.5):
+        self.driver = driver
+        self.min_delay = min_delay
+        self.jitter = jitter
+        self._last_get = 0.0
+
+    def get(self, url: str) -> None:
+        delay = self.min_delay + random.uniform(0, self.jitter)
+        wait = self._last_get + delay - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        try:
+            self.driver.get(url)
+        finally:
+            self._last_get = time.monotonic()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.driver, name)
+
+
+class ScraperPool:
+    """
+    Пул из workers драйверов Selenium, разбирающих дела из общей очереди.
+
+    У каждого потока свой драйвер (сессия standalone-chrome или локальный
+    Chrome) с паузой между загрузками страниц. Неудачное дело повторяется
+    до max_retries раз с экспоненциальной паузой, а при ошибке WebDriver
+    сессия пересоздаётся. Результаты отдаются по мере готовности, сохранение
+    и эмбеддинги остаются в вызывающем потоке.
+    """
+
+    def __init__(self,
+                 workers: int = 4,
+                 driver_factory: Callable[[], Any] = create_chrome_driver,
+                 parse_case: Callable[[Any, str], Any] = parse_one_case,
+                 max_retries: int = 2,
+                 retry_delay: float = 5.0,
+                 min_delay: float = 1.0,
+                 jitter: float = 0.5):
+        self.workers = workers
+        self.driver_factory = driver_factory
+        self.parse_case = parse_case
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.min_delay = min_delay
+        self.jitter = jitter
+
+        self._tasks: "queue.Queue[Optional[str]]" = queue.Queue()
+        # Ограниченная очередь результатов притормаживает скрейпинг,
+        # если сохранение и эмбеддинги не успевают.
+        self._results: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=workers * 2)
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+
+    def start(self) -> "ScraperPool":
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"scraper-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        return self
+
+    def close(self) -> None:
+        """
+        Останавливает потоки, даже если результаты больше никто не забирает
+        (например, обработка дела упала посреди map_cases): необработанные
+        дела отбрасываются, а потоки не ждут места в очереди результатов.
+        """
+
+        self._stop.set()
+
+        while True:
+            try:
+                self._tasks.get_nowait()
+            except queue.Empty:
+                break
+
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+        while True:
+            try:
+                self._results.get_nowait()
+            except queue.Empty:
+                break
+
+    def __enter__(self) -> "ScraperPool":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def map_cases(self, case_urls: List[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Разбирает дела и отдаёт словари case_url, case, documents, error
+        в порядке готовности. При ошибке case и documents равны None.
+        """
+
+        for case_url in case_urls:
+            self._tasks.put(case_url)
+
+        for _ in range(len(case_urls)):
+            yield self._results.get()
+
+    def _new_driver(self) -> PoliteDriver:
+        return PoliteDriver(self.driver_factory(), self.min_delay, self.jitter)
+
+    def _quit_driver(self, driver: Optional[PoliteDriver]) -> None:
+        if driver is None:
+            return
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Failed to quit driver: {e}")
+
+    def _put_result(self, result: Dict[str, Any]) -> bool:
+        """Кладёт результат в очередь, пока пул не остановлен. False, если остановлен."""
+
+        while not self._stop.is_set():
+            try:
+                self._results.put(result, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def _worker(self) -> None:
+        driver = None
+
+        try:
+            while True:
+                case_url = self._tasks.get()
+                if case_url is None or self._stop.is_set():
+                    break
+
+                result = {"case_url": case_url, "case": None, "documents": None, "error": None}
+
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        if driver is None:
+                            driver = self._new_driver()
+                        result["case"], result["documents"] = self.parse_case(driver, case_url)
+                        result["error"] = None
+                        break
+                    except Exception as e:
+                        result["error"] = e
+                        print(f"[{threading.current_thread().name}] Case {case_url} "
+                              f"attempt {attempt + 1} failed: {type(e).__name__}: {e}")
+
+                        # Сессия могла умереть: следующая попытка с новым драйвером.
+                        if isinstance(e, WebDriverException):
+                            self._quit_driver(driver)
+                            driver = None
+
+                        if attempt < self.max_retries and self._stop.wait(self.retry_delay * 2 ** attempt):
+                            break
+
+                if not self._put_result(result):
+                    break
+        finally:
+            self._quit_driver(driver)
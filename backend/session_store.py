@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class SessionStore:
+    """
+    Хранилище состояния диалогов в памяти процесса.
+
+    Для каждой сессии хранит последние вопросы и документы последнего
+    поиска: doc_id, скор, url, лучший чанк и границы чанков. Полные тексты
+    не хранятся, их заново берёт ретривер (из своего кэша текстов или
+    Postgres), поэтому сессия занимает единицы килобайт. Размер ограничен:
+    при переполнении вытесняется давно не использованная сессия,
+    устаревшие по TTL сессии удаляются при обращении.
+
+    Хранилище своё у каждого процесса, поэтому API запускается с одним
+    воркером (API_WORKERS=1). При нескольких воркерах ход диалога,
+    попавший в другой воркер, отвечается как первый вопрос; общие сессии
+    потребуют внешнего хранилища (например, Redis).
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 1800.0, max_queries: int = 4):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_queries = max_queries
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        # Сессии упорядочены по времени последнего обращения.
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session["updated_at"] < self.ttl:
+                break
+            del self._sessions[key]
+
+    @staticmethod
+    def _compact_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Документ без полного текста. Текст чанка с известными границами
+        тоже не хранится: он восстанавливается из текста документа.
+        """
+
+        chunks = []
+        for chunk in doc.get("chunks") or []:
+            chunk = dict(chunk)
+            if chunk.get("start_char") is not None and chunk.get("end_char") is not None:
+                chunk["text"] = None
+            chunks.append(chunk)
+
+        return {
+            "doc_id": doc["doc_id"],
+            "score": doc["score"],
+            "url": doc.get("url"),
+            "best_chunk": doc.get("best_chunk"),
+            "chunks": chunks,
+        }
+
+    @staticmethod
+    def documents(session: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Копии документов сессии для нового хода, full_text=None.
+        """
+
+        return [{**doc, "full_text": None, "chunks": [dict(chunk) for chunk in doc["chunks"]]}
+                for doc in session["documents"]]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self._expire()
+
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+
+        self._sessions.move_to_end(key)
+        session["updated_at"] = time.monotonic()
+        return session
+
+    def put(self, key: str, documents: List[Dict[str, Any]], query: str) -> None:
+        """
+        Сохраняет документы хода диалога и добавляет вопрос к вопросам сессии.
+        """
+
+        self._expire()
+
+        previous = self._sessions.pop(key, None)
+        queries = (previous["queries"] if previous else []) + [query]
+        self._sessions[key] = {
+            "documents": [self._compact_document(doc) for doc in documents],
+            "queries": queries[-self.max_queries:],
+            "turns": (previous["turns"] if previous else 0) + 1,
+            "updated_at": time.monotonic(),
+        }
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
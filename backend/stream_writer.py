@@ -0,0 +1,111 @@
+import asyncio
+import json
+from typing import AsyncGenerator, AsyncIterator, List, Optional, Union
+from schemas import BaseStreamEvent
+
+
+class NDJSONStreamWriter:
+    """
+    Сериализует события чата в NDJSON.
+
+    Подряд идущие токены LLM склеиваются в одно событие 'token',
+    пока не истечёт временное окно или не наберётся порог по байтам.
+    Остальные события отправляются сразу, предварительно сбросив буфер.
+    """
+
+    TOKEN_PREFIX = '{"type":"token","data":'
+    TOKEN_SUFFIX = '}\n'
+
+    def __init__(self, window_ms: float = 25.0, max_bytes: int = 256):
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def dump_token(cls, text: str) -> str:
+        """
+        Сериализует токен по готовому шаблону, без валидации pydantic.
+        Результат совпадает с TokenEvent(data=text).model_dump_json().
+        """
+
+        return cls.TOKEN_PREFIX + json.dumps(text, ensure_ascii=False) + cls.TOKEN_SUFFIX
+
+    @staticmethod
+    def dump_event(event: BaseStreamEvent) -> str:
+        return event.model_dump_json(ensure_ascii=False) + "\n"
+
+    async def stream(self, events: AsyncIterator[Union[str, BaseStreamEvent]]
+                     ) -> AsyncGenerator[str, None]:
+        """
+        Превращает поток токенов (str) и событий в строки NDJSON.
+        """
+
+        if self.window <= 0 or self.max_bytes <= 1:
+            async for item in events:
+                if isinstance(item, str):
+                    yield self.dump_token(item)
+                else:
+                    yield self.dump_event(item)
+            return
+
+        loop = asyncio.get_running_loop()
+        iterator = events.__aiter__()
+        buffer: List[str] = []
+        buffered_bytes = 0
+        deadline = 0.0
+        pending: Optional[asyncio.Future] = None
+
+        try:
+            while True:
+                if pending is None and not buffer:
+                    # Буфер пуст, ждать с таймаутом нечего.
+                    try:
+                        item = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        break
+                else:
+                    if pending is None:
+                        pending = asyncio.ensure_future(iterator.__anext__())
+
+                    timeout = max(0.0, deadline - loop.time()) if buffer else None
+                    done, _ = await asyncio.wait({pending}, timeout=timeout)
+                    if not done:
+                        yield self.dump_token("".join(buffer))
+                        buffer.clear()
+                        buffered_bytes = 0
+                        continue
+
+                    finished, pending = pending, None
+                    try:
+                        item = finished.result()
+                    except StopAsyncIteration:
+                        break
+
+                if isinstance(item, str):
+                    if not buffer:
+                        deadline = loop.time() + self.window
+                    buffer.append(item)
+                    buffered_bytes += len(item.encode("utf-8"))
+
+                    if buffered_bytes >= self.max_bytes:
+                        yield self.dump_token("".join(buffer))
+                        buffer.clear()
+                        buffered_bytes = 0
+                else:
+                    if buffer:
+                        yield self.dump_token("".join(buffer))
+                        buffer.clear()
+                        buffered_bytes = 0
+                    yield self.dump_event(item)
+
+            if buffer:
+                yield self.dump_token("".join(buffer))
+
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+                try:
+                    await pending
+                except (asyncio.CancelledError, Exception):
+                    pass
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
@@ -442,7 +442,7 @@ async function sendQuery(query) {
     const response = await fetch(API_URL, {
       method: 'POST', 
       headers: { 'Content-Type': 'application/json' }, 
-      body: JSON.stringify({ query: query, history: cleanHistory }),
+      body: JSON.stringify({ query: query, history: cleanHistory, session_id: currentSessionId }),
       signal: abortController.signal
     });
 
@@ -470,6 +470,18 @@ async function sendQuery(query) {
                 
                 // Обработка разных типов событий
                 if (data.type === 'sources') updateDocs(botMsg, data.data?.items);
+                else if (data.type === 'queued') {
+                   // Показываем позицию в очереди на генерацию до первого токена
+                   if (!botMsg.typingRemoved) {
+                       let label = botMsg.typing.querySelector('.queue-position');
+                       if (!label) {
+                           label = document.createElement('span');
+                           label.className = 'queue-position';
+                           botMsg.typing.appendChild(label);
+                       }
+                       label.textContent = `в очереди: ${data.data?.position}`;
+                   }
+                }
                 else if (data.type === 'token') {
                    // Убираем индикатор при первом токене
                    if (data.data && !botMsg.typingRemoved) { 